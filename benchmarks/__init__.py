@@ -0,0 +1,7 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Benchmarks for the discord IO - each is run as a module from the root of the repository.
+"""
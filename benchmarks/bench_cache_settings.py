@@ -0,0 +1,135 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Measures the memory and time cost of the client's cache settings.
+
+    max_messages            - memory held by the message cache, after MESSAGES new messages
+    member_cache            - memory and time to build a guild of MEMBERS members from its
+                              GUILD_CREATE, with and without the member cache
+    chunk_guilds_at_startup - memory and (parsing) time for the member chunks requested for a
+                              guild of MEMBERS members on connecting. Time spent waiting on the
+                              network for the chunks is not included - it is usually larger.
+
+Times are taken with tracemalloc running - so are only useful compared with each other.
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src python -m benchmarks.bench_cache_settings
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import gc
+import time
+import tracemalloc
+
+import discord
+
+from benchmarks.discord_payloads import FakeDiscord
+from mewbot.io.discord.intents import member_cache_flags_from_names
+
+MESSAGES = 20_000
+MEMBERS = 20_000
+# Discord sends the members of a guild in chunks of up to 1000
+CHUNK_SIZE = 1000
+
+
+def measure(run: Callable[[], Any]) -> Tuple[int, float]:
+    """
+    The memory still held once run has finished (and its result is held) - and the time taken.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    result = run()
+
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del result
+    return held, elapsed
+
+
+def message_cache(max_messages: Optional[int]) -> Tuple[int, float]:
+    """
+    Parse MESSAGES new messages, as they arrive from the gateway, with the given cache size.
+    """
+    fake = FakeDiscord(members=10, max_messages=max_messages)
+    payloads = [fake.message_payload(f"message number {index}") for index in range(MESSAGES)]
+
+    def run() -> Any:
+        for payload in payloads:
+            fake.state.parse_message_create(payload)
+        return fake
+
+    return measure(run)
+
+
+def member_cache(flags: Optional[discord.MemberCacheFlags]) -> Tuple[int, float]:
+    """
+    Build the guild from a GUILD_CREATE listing MEMBERS members, with the given cache flags.
+    """
+    payload: Any = FakeDiscord(members=MEMBERS).guild_payload()
+    options: Dict[str, Any] = {} if flags is None else {"member_cache_flags": flags}
+    state = FakeDiscord(members=0, **options).state
+
+    return measure(lambda: discord.Guild(data=payload, state=state))
+
+
+def chunking(chunk_guilds_at_startup: bool) -> Tuple[int, float]:
+    """
+    Take in the member chunks for a guild of MEMBERS members - as a cached chunk request does.
+    """
+    fake = FakeDiscord(members=1, chunk_guilds_at_startup=chunk_guilds_at_startup)
+    if not chunk_guilds_at_startup:
+        return measure(lambda: None)
+
+    chunks = [
+        fake.members_chunk_payload(start, CHUNK_SIZE)
+        for start in range(0, MEMBERS, CHUNK_SIZE)
+    ]
+
+    def run() -> Any:
+        for chunk in chunks:
+            for data in chunk["members"]:
+                member = discord.Member(data=data, guild=fake.guild, state=fake.state)
+                fake.guild._add_member(member)  # pylint: disable=protected-access
+        return fake
+
+    return measure(run)
+
+
+def report(setting: str, held: int, elapsed: float) -> None:
+    """
+    Print one line of results.
+    """
+    print(f"  {setting:<32} {held / 2 ** 20:>8.1f} MiB {elapsed * 1000:>9.0f} ms")
+
+
+def main() -> None:
+    """
+    Run each measurement with each setting, and report the results.
+    """
+    print(f"max_messages ({MESSAGES:,} messages received)")
+    for max_messages in (None, 1000, 10_000):
+        report(f"max_messages={max_messages or 0}", *message_cache(max_messages))
+
+    print(f"member_cache (a guild of {MEMBERS:,} members)")
+    cached: List[Optional[List[str]]] = [None, []]
+    for names in cached:
+        flags = None if names is None else member_cache_flags_from_names(names)
+        report(f"member_cache={names}", *member_cache(flags))
+
+    print(f"chunk_guilds_at_startup (a guild of {MEMBERS:,} members)")
+    for chunk in (False, True):
+        report(f"chunk_guilds_at_startup={chunk}", *chunking(chunk))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Compares the memory held by a queue of full and compact message creation events.
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src python -m benchmarks.bench_event_memory
+"""
+
+from __future__ import annotations
+
+from typing import Callable
+
+import asyncio
+import gc
+import tracemalloc
+
+import discord
+
+from benchmarks.discord_payloads import FakeDiscord
+from mewbot.io.discord import (
+    DiscordCompactMessageCreationEvent,
+    DiscordInputEvent,
+    DiscordMessageCreationEvent,
+    DiscordMessageSnapshot,
+)
+
+EVENTS = 100_000
+
+
+def full(message: discord.Message) -> DiscordInputEvent:
+    """
+    Build an event holding the message - as the DiscordIO does by default.
+    """
+    return DiscordMessageCreationEvent(text=message.content, message=message)
+
+
+def compact(message: discord.Message) -> DiscordInputEvent:
+    """
+    Build an event holding a snapshot of the message - as the DiscordIO does in compact mode.
+    """
+    return DiscordCompactMessageCreationEvent(
+        text=message.content, snapshot=DiscordMessageSnapshot.from_message(message)
+    )
+
+
+def queued_bytes(
+    fake: FakeDiscord, build: Callable[[discord.Message], DiscordInputEvent]
+) -> int:
+    """
+    The memory held by a queue of EVENTS events, once the messages they came from are dropped.
+
+    Each message is made, turned into an event and queued - as on_message does.
+    """
+    queue: asyncio.Queue[DiscordInputEvent] = asyncio.Queue()
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    for _ in range(EVENTS):
+        queue.put_nowait(
+            build(fake.message("hello <@100000000000001001>, how are you?", mentions=1))
+        )
+
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    assert queue.qsize() == EVENTS
+    return held
+
+
+def main() -> None:
+    """
+    Measure each mode in turn, and report the memory held.
+    """
+    fake = FakeDiscord(members=50)
+
+    results = {
+        name: queued_bytes(fake, build)
+        for name, build in (("full", full), ("compact", compact))
+    }
+
+    for name, held in results.items():
+        print(
+            f"{name:>8}: {held / 2**20:>8.1f} MiB for {EVENTS:,} events "
+            f"({held / EVENTS:>6.0f} bytes/event, {held / results['full']:.2f}x full)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Measures the connector's hot paths - the baseline for judging any change to its performance.
+
+    on_message                 - new messages handled and put on the InputQueue, per second
+    message_edit               - edits of cached messages handled, per second
+    message_delete             - deletes of cached messages handled, per second
+    raw_message_edit           - edits handled from the raw gateway payloads, per second
+    raw_message_delete         - deletes handled from the raw gateway payloads, per second
+    output_dispatch            - output events through DiscordOutput.output to a no-op handler
+    output_send                - posts sent through DiscordOutput.output to the fake discord
+    startup_backfill           - seconds for retrieve_old_message over CHANNELS x HISTORY
+    queued_event_bytes         - memory held per event on the InputQueue
+    queued_compact_event_bytes - the same, with compact events
+
+The handlers are called directly with genuine py-cord objects - gateway parsing is not included.
+Output and backfill go through py-cord's HTTP client to the in-process fake discord, so they
+include real request handling over the loopback interface - but no network latency.
+Memory is that traced by tracemalloc for the queued events (and whatever they keep alive),
+rather than the resident size of the process - which is too coarse to see single events in.
+
+Run with the package on the path - storing the results, then comparing a later run with them:
+    PYTHONPATH=src python -m benchmarks.bench_hot_paths --output baseline.json
+    PYTHONPATH=src python -m benchmarks.bench_hot_paths --baseline baseline.json
+
+benchmarks/baseline.json is a committed reference run - its meta says what it was measured on.
+"""
+
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Sequence, Tuple
+
+import asyncio
+import contextlib
+import dataclasses
+import gc
+import sys
+import time
+import tracemalloc
+
+import discord
+
+from benchmarks.discord_payloads import CHANNEL_ID, GUILD_ID, FakeDiscord
+from benchmarks.suite import BenchmarkSuite, main
+from mewbot.io.discord import DiscordInput, DiscordOutput, DiscordOutputEvent
+from mewbot.io.discord.backfill import BackfillConfig
+from mewbot.io.discord.events import DiscordPostToChannelOutputEvent
+from mewbot.io.discord.fake_discord import FakeDiscordServer
+
+MESSAGES = 20_000
+SENDS = 500
+CHANNELS = 10
+HISTORY = 200
+QUEUED = 10_000
+
+INTENTS = discord.Intents(guilds=True, guild_messages=True, message_content=True)
+
+
+@dataclasses.dataclass
+class NoopOutputEvent(DiscordOutputEvent):
+    """An output event whose handler sends nothing - so only the dispatch is measured."""
+
+
+@DiscordOutput.register_handler(NoopOutputEvent)
+async def send_nothing(output: DiscordOutput, event: NoopOutputEvent) -> bool:
+    """
+    Handle the event by doing nothing.
+    """
+    return output is not None and event is not None
+
+
+def sized(count: int, scale: float) -> int:
+    """
+    The size of a workload, at the given scale - never less than one.
+    """
+    return max(1, int(count * scale))
+
+
+def bound_input(**options: Any) -> DiscordInput:
+    """
+    A DiscordInput, not connected to anything, with a queue to put events on.
+
+    :param options: Passed to the DiscordInput.
+    """
+    discord_input = DiscordInput("not-a-token", intents=discord.Intents.all(), **options)
+    discord_input.bind(asyncio.Queue())
+    return discord_input
+
+
+@contextlib.asynccontextmanager
+async def connected(server: FakeDiscordServer, **options: Any) -> AsyncIterator[DiscordInput]:
+    """
+    A DiscordInput, running against the fake discord - once it is ready.
+
+    :param server:
+    :param options: Passed to the DiscordInput.
+    """
+    discord_input = DiscordInput(server.token, intents=INTENTS, **options)
+    discord_input.bind(asyncio.Queue())
+
+    running = asyncio.create_task(discord_input.run())
+    try:
+        await asyncio.wait_for(discord_input.get_client().wait_until_ready(), 10)
+        yield discord_input
+    finally:
+        await discord_input.get_client().close()
+        running.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await running
+
+
+async def filled(queue: asyncio.Queue[Any], size: int) -> None:
+    """
+    Wait for the queue to hold the given number of events.
+    """
+
+    async def poll() -> None:
+        while queue.qsize() < size:
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), 30)
+
+
+async def per_second(
+    handler: Callable[..., Awaitable[Any]], calls: Sequence[Tuple[Any, ...]]
+) -> float:
+    """
+    The rate at which the handler runs - with each set of arguments in turn.
+    """
+    start = time.perf_counter()
+    for args in calls:
+        await handler(*args)
+    return len(calls) / (time.perf_counter() - start)
+
+
+def raw_update(message: discord.Message) -> discord.RawMessageUpdateEvent:
+    """
+    The raw MESSAGE_UPDATE payload for an edit of the message.
+    """
+    return discord.RawMessageUpdateEvent(
+        {  # type: ignore[typeddict-unknown-key]
+            "id": str(message.id),
+            "channel_id": str(CHANNEL_ID),
+            "guild_id": str(GUILD_ID),
+            "content": "after",
+            "author": {"id": str(message.author.id), "bot": False},
+        }
+    )
+
+
+def raw_delete(message: discord.Message) -> discord.RawMessageDeleteEvent:
+    """
+    The raw MESSAGE_DELETE payload for the message.
+    """
+    return discord.RawMessageDeleteEvent(
+        {"id": str(message.id), "channel_id": str(CHANNEL_ID), "guild_id": str(GUILD_ID)}
+    )
+
+
+async def on_message(scale: float) -> float:
+    """
+    New messages, from the handler to the InputQueue.
+    """
+    client = bound_input().get_client()
+    fake = FakeDiscord(loop=asyncio.get_running_loop())
+    calls = [(fake.message(f"message {index}"),) for index in range(sized(MESSAGES, scale))]
+
+    return await per_second(client.on_message, calls)
+
+
+async def message_edit(scale: float) -> float:
+    """
+    Edits of messages in the cache.
+    """
+    client = bound_input().get_client()
+    fake = FakeDiscord(loop=asyncio.get_running_loop())
+    calls = [
+        (fake.message("before"), fake.message("after")) for _ in range(sized(MESSAGES, scale))
+    ]
+
+    return await per_second(client.on_message_edit, calls)
+
+
+async def message_delete(scale: float) -> float:
+    """
+    Deletes of messages in the cache.
+    """
+    client = bound_input().get_client()
+    fake = FakeDiscord(loop=asyncio.get_running_loop())
+    calls = [(fake.message("deleted"),) for _ in range(sized(MESSAGES, scale))]
+
+    return await per_second(client.on_message_delete, calls)
+
+
+async def raw_message_edit(scale: float) -> float:
+    """
+    Edits from the raw gateway payloads - of messages not in the cache.
+    """
+    client = bound_input(raw_message_events=True).get_client()
+    fake = FakeDiscord(loop=asyncio.get_running_loop())
+    calls = [(raw_update(fake.message("before")),) for _ in range(sized(MESSAGES, scale))]
+
+    return await per_second(client.on_raw_message_edit, calls)
+
+
+async def raw_message_delete(scale: float) -> float:
+    """
+    Deletes from the raw gateway payloads - of messages not in the cache.
+    """
+    client = bound_input(raw_message_events=True).get_client()
+    fake = FakeDiscord(loop=asyncio.get_running_loop())
+    calls = [(raw_delete(fake.message("deleted")),) for _ in range(sized(MESSAGES, scale))]
+
+    return await per_second(client.on_raw_message_delete, calls)
+
+
+async def output_dispatch(scale: float) -> float:
+    """
+    Output events through DiscordOutput.output - with nothing sent by the handler.
+    """
+    output = DiscordOutput(bound_input().get_client())
+    calls = [(NoopOutputEvent("text", None),) for _ in range(sized(MESSAGES, scale))]
+
+    return await per_second(output.output, calls)
+
+
+async def output_send(scale: float) -> float:
+    """
+    Posts to a channel through DiscordOutput.output - sent to the fake discord one at a time.
+    """
+    async with FakeDiscordServer() as server, connected(server) as discord_input:
+        channel_id = server.channel_ids[0]
+        output = DiscordOutput(discord_input.get_client())
+        calls = [
+            (DiscordPostToChannelOutputEvent(f"post {index}", None, channel_id, None),)
+            for index in range(sized(SENDS, scale))
+        ]
+
+        rate = await per_second(output.output, calls)
+
+    assert len(server.messages(channel_id)) == len(calls), "Not every post was sent"
+    return rate
+
+
+async def startup_backfill(scale: float) -> float:
+    """
+    Retrieving the history of every channel on startup - and putting it on the InputQueue.
+    """
+    history = sized(HISTORY, scale)
+    async with FakeDiscordServer(channels=CHANNELS) as server:
+        for channel in range(CHANNELS):
+            server.seed_history(history, channel=channel)
+
+        async with connected(
+            server,
+            startup_queue_depth=CHANNELS * history,
+            backfill_config=BackfillConfig(channel_depth=history),
+        ) as discord_input:
+            # The client retrieves the history once ready - wait for it, then time a rerun
+            queue = discord_input.queue
+            assert isinstance(queue, asyncio.Queue)
+            await filled(queue, CHANNELS * history)
+            while not queue.empty():
+                queue.get_nowait()
+
+            start = time.perf_counter()
+            await discord_input.get_client().retrieve_old_message()
+            elapsed = time.perf_counter() - start
+
+            assert queue.qsize() == CHANNELS * history, "Not every message was retrieved"
+
+    return elapsed
+
+
+async def queued_bytes(scale: float, compact: bool) -> float:
+    """
+    The memory held per event on the InputQueue - once nothing else refers to the messages.
+    """
+    client = bound_input(compact_events=compact).get_client()
+    fake = FakeDiscord(loop=asyncio.get_running_loop())
+    count = sized(QUEUED, scale)
+
+    gc.collect()
+    tracemalloc.start()
+
+    for index in range(count):
+        await client.on_message(fake.message(f"message {index}"))
+
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return held / count
+
+
+async def queued_event_bytes(scale: float) -> float:
+    """
+    Memory held per new message event on the InputQueue.
+    """
+    return await queued_bytes(scale, compact=False)
+
+
+async def queued_compact_event_bytes(scale: float) -> float:
+    """
+    Memory held per compact new message event on the InputQueue.
+    """
+    return await queued_bytes(scale, compact=True)
+
+
+suite = BenchmarkSuite()
+suite.add("on_message", "events/sec", on_message)
+suite.add("message_edit", "events/sec", message_edit)
+suite.add("message_delete", "events/sec", message_delete)
+suite.add("raw_message_edit", "events/sec", raw_message_edit)
+suite.add("raw_message_delete", "events/sec", raw_message_delete)
+suite.add("output_dispatch", "events/sec", output_dispatch)
+suite.add("output_send", "messages/sec", output_send)
+suite.add("startup_backfill", "seconds", startup_backfill, higher_is_better=False)
+suite.add("queued_event_bytes", "bytes", queued_event_bytes, higher_is_better=False)
+suite.add(
+    "queued_compact_event_bytes", "bytes", queued_compact_event_bytes, higher_is_better=False
+)
+
+
+if __name__ == "__main__":
+    sys.exit(main(suite))
@@ -0,0 +1,80 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Compares building DiscordMessageCreationEvents with eager and lazy text, on mention heavy content.
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src python -m benchmarks.bench_message_text
+"""
+
+from __future__ import annotations
+
+from typing import Callable, List
+
+import time
+
+import discord
+
+from benchmarks.discord_payloads import FakeDiscord
+from mewbot.io.discord import DiscordMessageCreationEvent
+
+MESSAGES = 20_000
+
+
+def eager(message: discord.Message) -> DiscordMessageCreationEvent:
+    """
+    Build an event as on_message used to - cleaning the content up front.
+    """
+    return DiscordMessageCreationEvent(text=str(message.clean_content), message=message)
+
+
+def lazy(message: discord.Message) -> DiscordMessageCreationEvent:
+    """
+    Build an event as on_message now does - the text is not worked out until it is read.
+    """
+    return DiscordMessageCreationEvent.from_message(message)
+
+
+def lazy_and_read(message: discord.Message) -> DiscordMessageCreationEvent:
+    """
+    Build an event lazily and then read the text - the worst case for lazy text.
+    """
+    event = DiscordMessageCreationEvent.from_message(message)
+    _ = event.text
+    return event
+
+
+def events_per_second(
+    build: Callable[[discord.Message], DiscordMessageCreationEvent],
+    messages: List[discord.Message],
+) -> float:
+    """
+    The rate events can be built from the given messages.
+
+    Fresh messages must be used for each run - py-cord caches the clean content on the message.
+    """
+    start = time.perf_counter()
+    for message in messages:
+        build(message)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """
+    Run each variation on a fresh batch of messages, and report the rates.
+    """
+    fake = FakeDiscord(members=50)
+
+    results = {}
+    for name, build in (("eager", eager), ("lazy", lazy), ("lazy + read", lazy_and_read)):
+        messages = fake.mention_heavy_messages(MESSAGES)
+        results[name] = events_per_second(build, messages)
+
+    for name, rate in results.items():
+        print(f"{name:>12}: {rate:>12,.0f} events/sec ({rate / results['eager']:.1f}x eager)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Compares picking the handler for output events by an isinstance chain and by the handler table.
+
+Only the dispatch is measured - the handlers themselves are not run.
+
+Run with the package on the path, e.g.
+    PYTHONPATH=src python -m benchmarks.bench_output_dispatch
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, List, Optional, Set, Type
+
+import dataclasses
+import time
+
+from mewbot.api.v1 import OutputEvent
+
+from mewbot.io.discord import (
+    DiscordOutput,
+    DiscordOutputEvent,
+    DiscordReplyIntoMessageChannelOutputEvent,
+    DiscordReplyToMessageOutputEvent,
+)
+from mewbot.io.discord.events import DiscordPostToChannelOutputEvent
+
+EVENTS = 1_000_000
+
+
+@dataclasses.dataclass
+class ThirdPartyOutputEvent(DiscordOutputEvent):
+    """An output event from another package - handled as a bare event."""
+
+    extra: int
+
+
+def consumes_outputs() -> Set[Type[OutputEvent]]:
+    """
+    As DiscordOutput.consumes_outputs used to be.
+    """
+    return {DiscordOutputEvent}
+
+
+def chain(event: OutputEvent) -> Optional[Callable[..., Any]]:
+    """
+    Pick the handler as DiscordOutput.output used to - a tuple built per call, then a chain.
+    """
+    # pylint: disable=protected-access
+    if not isinstance(event, tuple(consumes_outputs())):
+        return None
+    if isinstance(event, DiscordReplyToMessageOutputEvent):
+        return DiscordOutput._process_reply_to_message
+    if isinstance(event, DiscordReplyIntoMessageChannelOutputEvent):
+        return DiscordOutput._process_reply_into_message_channel_event
+    if isinstance(event, DiscordPostToChannelOutputEvent):
+        return DiscordOutput._process_post_to_channel_output_evnet
+    if isinstance(event, DiscordOutputEvent):
+        return DiscordOutput._process_bare_event
+    raise NotImplementedError("Currently can only respond to a message")
+
+
+def table(event: OutputEvent) -> Optional[Callable[..., Any]]:
+    """
+    Pick the handler as DiscordOutput.output now does.
+    """
+    return DiscordOutput.handler_for(type(event))
+
+
+def events() -> List[OutputEvent]:
+    """
+    A mix of output events - with the types the chain reaches last well represented.
+    """
+    message: Any = None
+    return [
+        DiscordReplyToMessageOutputEvent("reply", message),
+        DiscordReplyIntoMessageChannelOutputEvent("into channel", message),
+        DiscordPostToChannelOutputEvent("post", None, 1, None),
+        DiscordOutputEvent("bare", message),
+        ThirdPartyOutputEvent("third party", message, 1),
+    ] * (EVENTS // 5)
+
+
+def dispatches_per_second(
+    dispatch: Callable[[OutputEvent], Optional[Callable[..., Any]]], batch: List[OutputEvent]
+) -> float:
+    """
+    The rate at which handlers are picked for the given events.
+    """
+    start = time.perf_counter()
+    for event in batch:
+        dispatch(event)
+    return len(batch) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """
+    Check both ways agree, then run each, and report the rates.
+    """
+    batch = events()
+    for event in batch[:5]:
+        assert chain(event) is table(event), type(event)
+
+    results = {
+        name: dispatches_per_second(pick, batch)
+        for name, pick in (("chain", chain), ("table", table))
+    }
+
+    for name, rate in results.items():
+        print(
+            f"{name:>6}: {rate:>12,.0f} dispatches/sec "
+            f"({1e9 / rate:>5.0f} ns each, {rate / results['chain']:.1f}x chain)"
+        )
+
+
+if __name__ == "__main__":
+    main()
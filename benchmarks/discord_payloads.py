@@ -0,0 +1,204 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Builds real py-cord objects from synthetic gateway payloads - without connecting to discord.
+
+Used by the benchmarks, so that they measure the connector working on genuine discord.Message
+objects rather than mocks.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+import asyncio
+import itertools
+
+import discord
+from discord.state import ConnectionState
+
+# Snowflakes need to look real (15-20 digits) for py-cord to parse mentions of them
+GUILD_ID = 100000000000000001
+CHANNEL_ID = 100000000000000010
+FIRST_USER_ID = 100000000000001000
+FIRST_MESSAGE_ID = 100000000100000000
+
+TIMESTAMP = "2023-01-01T00:00:00+00:00"
+
+
+def user_payload(index: int) -> Dict[str, Any]:
+    """
+    The payload for a (numbered) user.
+    """
+    return {
+        "id": str(FIRST_USER_ID + index),
+        "username": f"user{index}",
+        "discriminator": "0001",
+        "avatar": None,
+    }
+
+
+def member_payload() -> Dict[str, Any]:
+    """
+    The member specific part of a user payload.
+    """
+    return {"roles": [], "joined_at": TIMESTAMP, "deaf": False, "mute": False}
+
+
+class FakeDiscord:
+    """
+    A connection state holding one guild with one text channel and a number of members.
+    """
+
+    state: ConnectionState
+    guild: discord.Guild
+    channel: discord.TextChannel
+
+    def __init__(
+        self,
+        members: int = 50,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        **options: Any,
+    ):
+        """
+        Build the state, guild and channel.
+
+        :param members: The number of members in the guild.
+        :param loop: Loop for the state - a new one is made if not given.
+        :param options: Passed to the state - as a discord.Client passes its options.
+        """
+        self._ids = itertools.count(FIRST_MESSAGE_ID)
+        self.members = members
+
+        self.state = ConnectionState(
+            dispatch=lambda *args, **kwargs: None,
+            handlers={},
+            hooks={},
+            http=None,  # type: ignore
+            loop=loop if loop is not None else asyncio.new_event_loop(),
+            intents=discord.Intents.all(),
+            **options,
+        )
+
+        self.guild = discord.Guild(data=self.guild_payload(), state=self.state)  # type: ignore
+        self.state._add_guild(self.guild)  # pylint: disable=protected-access
+
+        channel = self.guild.get_channel(CHANNEL_ID)
+        assert isinstance(channel, discord.TextChannel)
+        self.channel = channel
+
+    def guild_payload(self) -> Dict[str, Any]:
+        """
+        The GUILD_CREATE payload for the guild.
+        """
+        return {
+            "id": str(GUILD_ID),
+            "name": "benchmark guild",
+            "roles": [
+                {
+                    "id": str(GUILD_ID),
+                    "name": "@everyone",
+                    "permissions": "0",
+                    "position": 0,
+                    "color": 0,
+                    "hoist": False,
+                    "managed": False,
+                    "mentionable": False,
+                }
+            ],
+            "channels": [
+                {
+                    "id": str(CHANNEL_ID),
+                    "type": 0,
+                    "name": "general",
+                    "position": 0,
+                    "guild_id": str(GUILD_ID),
+                    "permission_overwrites": [],
+                }
+            ],
+            "members": [
+                dict(member_payload(), user=user_payload(index))
+                for index in range(self.members)
+            ],
+            "member_count": self.members,
+            "emojis": [],
+            "stickers": [],
+            "features": [],
+        }
+
+    def members_chunk_payload(self, start: int, count: int) -> Dict[str, Any]:
+        """
+        A GUILD_MEMBERS_CHUNK payload - as sent in answer to a request for the guild's members.
+
+        :param start: Index of the first member in the chunk.
+        :param count: The number of members in the chunk.
+        """
+        return {
+            "guild_id": str(GUILD_ID),
+            "members": [
+                dict(member_payload(), user=user_payload(index))
+                for index in range(start, start + count)
+            ],
+        }
+
+    def message_payload(
+        self, content: str, author: int = 0, mentions: int = 0
+    ) -> Dict[str, Any]:
+        """
+        The MESSAGE_CREATE payload for a new message in the channel.
+
+        :param content: Text of the message.
+        :param author: Index of the member who sent it.
+        :param mentions: The number of members mentioned (listed in the payload).
+        """
+        return {
+            "id": str(next(self._ids)),
+            "channel_id": str(CHANNEL_ID),
+            "guild_id": str(GUILD_ID),
+            "author": user_payload(author),
+            "member": member_payload(),
+            "content": content,
+            "timestamp": TIMESTAMP,
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [
+                dict(user_payload(index), member=member_payload())
+                for index in range(1, mentions + 1)
+            ],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+        }
+
+    def message(self, content: str, author: int = 0, mentions: int = 0) -> discord.Message:
+        """
+        A new message in the channel.
+
+        :param content: Text of the message.
+        :param author: Index of the member who sent it.
+        :param mentions: The number of members mentioned (listed in the payload).
+        """
+        return discord.Message(
+            state=self.state,
+            channel=self.channel,
+            data=self.message_payload(content, author, mentions),  # type: ignore
+        )
+
+    def mention_heavy_messages(self, count: int, mentions: int = 5) -> List[discord.Message]:
+        """
+        Messages which mention several members, and the channel.
+
+        :param count: The number of messages.
+        :param mentions: The number of members each message mentions.
+        """
+        content = " ".join(
+            f"<@{FIRST_USER_ID + index}> and <@!{FIRST_USER_ID + index}>"
+            for index in range(1, mentions + 1)
+        )
+        content = f"{content} see <#{CHANNEL_ID}> for details"
+        return [self.message(content, mentions=mentions) for _ in range(count)]
@@ -0,0 +1,263 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Runs a set of benchmarks, stores the results as JSON, and compares them against a baseline.
+
+Each benchmark measures one number - a rate, a time or a size - and knows which way is better.
+The best of several runs is kept, as timings only ever get worse from noise.
+
+A results file looks like
+    {
+      "meta": {"python": "3.11.7", "platform": "...", "py-cord": "2.4.1", "time": ...,
+               "scale": 1.0, "repeat": 3},
+      "results": {
+        "on_message": {"value": 61234.5, "unit": "events/sec", "higher_is_better": true},
+        ...
+      }
+    }
+
+Compared against a baseline, any result which is worse by more than the tolerance is a
+regression - and the run exits with status 1, so CI can fail the build on it.
+Baselines are only meaningful from the same machine (or CI runner type), and with the same
+scale and repeat - a baseline measured with others is refused, with status 2.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Sequence, Tuple
+
+import argparse
+import asyncio
+import dataclasses
+import importlib.metadata
+import json
+import pathlib
+import platform
+import sys
+import time
+
+# Measures one value, given a scale for the size of the workload (1.0 for the full size)
+Measure = Callable[[float], Coroutine[Any, Any, float]]
+
+# The settings a run was made with - results are only comparable if these match
+SETTINGS = ("scale", "repeat")
+
+
+@dataclasses.dataclass(frozen=True)
+class Benchmark:
+    """
+    A named measurement - and the way its results are judged.
+    """
+
+    name: str
+    unit: str
+    higher_is_better: bool
+    measure: Measure
+
+
+@dataclasses.dataclass(frozen=True)
+class Result:
+    """
+    The best value measured by a benchmark.
+    """
+
+    value: float
+    unit: str
+    higher_is_better: bool
+
+
+class BenchmarkSuite:
+    """
+    Collects benchmarks - and runs them.
+    """
+
+    benchmarks: Dict[str, Benchmark]
+
+    def __init__(self) -> None:
+        """
+        Start with no benchmarks.
+        """
+        self.benchmarks = {}
+
+    def add(
+        self, name: str, unit: str, measure: Measure, higher_is_better: bool = True
+    ) -> None:
+        """
+        Add a measurement to the suite.
+
+        :param name: Key for the result - must be stable, as baselines are matched by it.
+        :param unit:
+        :param measure: Called with the scale of the workload - returns the value measured.
+        :param higher_is_better: False for times and sizes.
+        :return:
+        """
+        assert name not in self.benchmarks, f"Benchmark {name} added twice"
+        self.benchmarks[name] = Benchmark(name, unit, higher_is_better, measure)
+
+    def run(
+        self, only: Sequence[str] = (), repeat: int = 3, scale: float = 1.0
+    ) -> Dict[str, Result]:
+        """
+        Run the benchmarks - keeping the best value each measures.
+
+        Each run gets a fresh event loop, so runs do not share any state.
+        :param only: Names of the benchmarks to run - all of them if empty.
+        :param repeat: The number of times to run each benchmark.
+        :param scale: Multiplies the size of each benchmark's workload.
+        :return:
+        """
+        unknown = set(only) - set(self.benchmarks)
+        assert not unknown, f"Unknown benchmarks {sorted(unknown)}"
+
+        results: Dict[str, Result] = {}
+        for benchmark in self.benchmarks.values():
+            if only and benchmark.name not in only:
+                continue
+
+            values: List[float] = [
+                asyncio.run(benchmark.measure(scale)) for _ in range(repeat)
+            ]
+            best = max(values) if benchmark.higher_is_better else min(values)
+            results[benchmark.name] = Result(best, benchmark.unit, benchmark.higher_is_better)
+            print(f"{benchmark.name:>32}: {best:>14,.3f} {benchmark.unit}", flush=True)
+
+        return results
+
+
+def save(results: Dict[str, Result], path: pathlib.Path, settings: Dict[str, float]) -> None:
+    """
+    Write the results to a JSON file - along with what, and how, they were measured.
+
+    :param results:
+    :param path:
+    :param settings: The scale and repeat the results were measured with.
+    :return:
+    """
+    document = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "py-cord": importlib.metadata.version("py-cord"),
+            "time": time.time(),
+            **settings,
+        },
+        "results": {name: dataclasses.asdict(result) for name, result in results.items()},
+    }
+    path.write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+
+
+def load(path: pathlib.Path) -> Tuple[Dict[str, Any], Dict[str, Result]]:
+    """
+    Read results written by save.
+
+    :param path:
+    :return: The meta, and the results.
+    """
+    document = json.loads(path.read_text(encoding="utf-8"))
+    results = {name: Result(**result) for name, result in document["results"].items()}
+    return document["meta"], results
+
+
+def check_settings(settings: Dict[str, float], baseline_meta: Dict[str, Any]) -> None:
+    """
+    Refuse a baseline measured with another scale or repeat - its results are not comparable.
+
+    :param settings: The scale and repeat of this run.
+    :param baseline_meta: The meta saved with the baseline.
+    :return:
+    :raises ValueError: Naming the settings which differ.
+    """
+    differing = [
+        f"{name} {baseline_meta.get(name)} (not {settings[name]})"
+        for name in SETTINGS
+        if baseline_meta.get(name) != settings[name]
+    ]
+    if differing:
+        raise ValueError(f"The baseline was measured with {', '.join(differing)}")
+
+
+def compare(
+    results: Dict[str, Result],
+    baseline: Dict[str, Result],
+    tolerance: float,
+    settings: Dict[str, float],
+    baseline_meta: Dict[str, Any],
+) -> List[str]:
+    """
+    Describe each result which is worse than the baseline by more than the tolerance.
+
+    Results missing from either side are not compared.
+    :param results:
+    :param baseline:
+    :param tolerance: The fraction a result may be worse by - e.g. 0.1 for 10%.
+    :param settings: The scale and repeat the results were measured with.
+    :param baseline_meta: The meta saved with the baseline - its settings have to match.
+    :return: A line for each regression.
+    :raises ValueError: If the baseline was measured with other settings.
+    """
+    check_settings(settings, baseline_meta)
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or base.value == 0:
+            continue
+
+        change = (result.value - base.value) / base.value
+        worse = -change if result.higher_is_better else change
+        marker = "REGRESSION" if worse > tolerance else ""
+        print(
+            f"{name:>32}: {base.value:>14,.3f} -> {result.value:>14,.3f} "
+            f"{result.unit} ({change:+.1%}) {marker}"
+        )
+        if marker:
+            regressions.append(f"{name} is {worse:.1%} worse than the baseline")
+
+    return regressions
+
+
+def main(suite: BenchmarkSuite, argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Run the suite as a command line tool.
+
+    :param suite:
+    :param argv: The command line arguments - sys.argv if not given.
+    :return: The exit status - 1 if there were regressions, 2 if the baseline is not comparable.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("only", nargs="*", help="Benchmarks to run - all if not given")
+    parser.add_argument("--output", type=pathlib.Path, help="Write the results to this file")
+    parser.add_argument("--baseline", type=pathlib.Path, help="Compare against this file")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="Fraction worse to allow (default 0.1)"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per benchmark (default 3)"
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiplies the size of the workloads"
+    )
+    args = parser.parse_args(argv)
+
+    settings: Dict[str, float] = {"scale": args.scale, "repeat": args.repeat}
+    baseline = load(args.baseline) if args.baseline is not None else None
+    if baseline is not None:
+        # Checked before running - so a mismatch does not waste the run
+        try:
+            check_settings(settings, baseline[0])
+        except ValueError as error:
+            print(f"{error} - not comparing", file=sys.stderr)
+            return 2
+
+    results = suite.run(args.only, args.repeat, args.scale)
+    if args.output is not None:
+        save(results, args.output, settings)
+    if baseline is None:
+        return 0
+
+    regressions = compare(results, baseline[1], args.tolerance, settings, baseline[0])
+    for regression in regressions:
+        print(regression, file=sys.stderr)
+    return 1 if regressions else 0
@@ -17,7 +17,6 @@ If message is in the discord cache, then the message contents that where deleted
 provided.
 """
 
-
 from __future__ import annotations
 
 from typing import Any, AsyncIterable, Dict, Set, Type
@@ -27,7 +26,12 @@ import logging
 from mewbot.api.v1 import Action, Trigger
 from mewbot.core import InputEvent, OutputEvent, OutputQueue
 
-from mewbot.io.discord import DiscordMessageDeleteInputEvent, DiscordOutputEvent
+from mewbot.io.discord import (
+    DiscordMessageDeleteInputEvent,
+    DiscordOutputEvent,
+    DiscordRawMessageDeleteInputEvent,
+)
+from mewbot.io.discord.events import DiscordPostToChannelOutputEvent
 
 
 class DiscordDeleteEventTrigger(Trigger):
@@ -41,10 +45,12 @@ class DiscordDeleteEventTrigger(Trigger):
         Inputs this method responds to.
 
         This will only pass on message deletion input events.
+        The raw delete events stand in for the delete events when raw_message_events is set.
         :return:
         """
         return {
             DiscordMessageDeleteInputEvent,
+            DiscordRawMessageDeleteInputEvent,
         }
 
     def matches(self, event: InputEvent) -> bool:
@@ -54,10 +60,9 @@ class DiscordDeleteEventTrigger(Trigger):
         :param event:
         :return:
         """
-        if isinstance(event, DiscordMessageDeleteInputEvent):
-            return True
-
-        return False
+        return isinstance(
+            event, (DiscordMessageDeleteInputEvent, DiscordRawMessageDeleteInputEvent)
+        )
 
 
 class DiscordDeleteResponseAction(Action):
@@ -80,6 +85,7 @@ class DiscordDeleteResponseAction(Action):
         """
         return {
             DiscordMessageDeleteInputEvent,
+            DiscordRawMessageDeleteInputEvent,
         }
 
     @staticmethod
@@ -87,7 +93,7 @@ class DiscordDeleteResponseAction(Action):
         """
         Output Events that this action can produce.
         """
-        return {DiscordOutputEvent}
+        return {DiscordOutputEvent, DiscordPostToChannelOutputEvent}
 
     @property
     def message(self) -> str:
@@ -109,6 +115,18 @@ class DiscordDeleteResponseAction(Action):
         """
         Construct a DiscordOutputEvent with the result of performing the calculation.
         """
+        if isinstance(event, DiscordRawMessageDeleteInputEvent):
+            # Who wrote the message, and what it said, are only known if it was in the cache
+            self._logger.info("We have detected deleting! - %s", event)
+            yield DiscordPostToChannelOutputEvent(
+                text=f"User {event.author_id or '(unknown)'} has deleted message: "
+                f'"{event.text_before or "(not cached)"}"',
+                message=None,
+                channel_id=event.channel_id,
+                picture=None,
+            )
+            return
+
         if not isinstance(event, DiscordMessageDeleteInputEvent):
             self._logger.warning("Received wrong event type %s", type(event))
             return
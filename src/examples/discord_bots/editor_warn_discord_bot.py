@@ -26,7 +26,12 @@ import logging
 from mewbot.api.v1 import Action, Trigger
 from mewbot.core import InputEvent, OutputEvent, OutputQueue
 
-from mewbot.io.discord import DiscordMessageEditInputEvent, DiscordOutputEvent
+from mewbot.io.discord import (
+    DiscordMessageEditInputEvent,
+    DiscordOutputEvent,
+    DiscordRawMessageEditInputEvent,
+)
+from mewbot.io.discord.events import DiscordPostToChannelOutputEvent
 
 
 class DiscordEditTrigger(Trigger):
@@ -38,9 +43,12 @@ class DiscordEditTrigger(Trigger):
     def consumes_inputs() -> Set[Type[InputEvent]]:
         """
         Inputs which will be examined by this trigger.
+
+        The raw edit events stand in for the edit events when raw_message_events is set.
         """
         return {
             DiscordMessageEditInputEvent,
+            DiscordRawMessageEditInputEvent,
         }
 
     def matches(self, event: InputEvent) -> bool:
@@ -53,7 +61,11 @@ class DiscordEditTrigger(Trigger):
         if isinstance(event, DiscordMessageEditInputEvent):
             return True
 
-        return False
+        # Raw edits which did not touch the content (e.g. embeds resolving) are not reported
+        return (
+            isinstance(event, DiscordRawMessageEditInputEvent)
+            and event.text_after is not None
+        )
 
 
 class DiscordEditResponse(Action):
@@ -76,6 +88,7 @@ class DiscordEditResponse(Action):
         """
         return {
             DiscordMessageEditInputEvent,
+            DiscordRawMessageEditInputEvent,
         }
 
     @staticmethod
@@ -83,7 +96,7 @@ class DiscordEditResponse(Action):
         """
         Output Events this Action can produce.
         """
-        return {DiscordOutputEvent}
+        return {DiscordOutputEvent, DiscordPostToChannelOutputEvent}
 
     @property
     def message(self) -> str:
@@ -102,6 +115,18 @@ class DiscordEditResponse(Action):
         """
         Construct a DiscordOutputEvent with the result of performing the calculation.
         """
+        if isinstance(event, DiscordRawMessageEditInputEvent):
+            # The message before the edit is only known if it was in the cache
+            self._logger.info("We have detected editing! - %s", event)
+            yield DiscordPostToChannelOutputEvent(
+                text=f'We have detected editing! "{event.text_before or "(not cached)"}"'
+                f' was changed to "{event.text_after}"',
+                message=None,
+                channel_id=event.channel_id,
+                picture=None,
+            )
+            return
+
         if not isinstance(event, DiscordMessageEditInputEvent):
             self._logger.warning("Received wrong event type %s", type(event))
             return
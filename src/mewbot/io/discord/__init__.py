@@ -8,25 +8,57 @@ Provides an IOConfig for listening to and responding to discord message channels
 
 from __future__ import annotations
 
-from typing import List, Optional, Sequence, Set, Type
+from typing import List, Optional, Sequence
 
 import logging
-import uuid
 
 import discord
-from mewbot.api.v1 import Input, InputEvent, InputQueue, IOConfig, Output, OutputEvent
-
+from mewbot.api.v1 import Input, IOConfig, Output
+
+from mewbot.io.discord.attachments import DiscordAttachment
+from mewbot.io.discord.backfill import BackfillConfig
+from mewbot.io.discord.channels import ChannelResolver
+from mewbot.io.discord.client import (
+    CacheConfig,
+    InternalMewbotDiscordClient,
+    ShardConfig,
+)
+from mewbot.io.discord.cursors import ChannelCursors
 from mewbot.io.discord.events import (
+    DiscordCompactMessageCreationEvent,
+    DiscordCompactMessageDeleteInputEvent,
+    DiscordCompactMessageEditInputEvent,
     DiscordInputEvent,
     DiscordMessageCreationEvent,
     DiscordMessageDeleteInputEvent,
     DiscordMessageEditInputEvent,
+    DiscordMessageSnapshot,
     DiscordOutputEvent,
-    DiscordPostToChannelOutputEvent,
+    DiscordRawMessageDeleteInputEvent,
+    DiscordRawMessageEditInputEvent,
     DiscordReplyIntoMessageChannelOutputEvent,
     DiscordReplyToMessageOutputEvent,
     DiscordUserJoinInputEvent,
 )
+from mewbot.io.discord.filters import DiscordEventFilter
+from mewbot.io.discord.ingress import IngressBuffer, OverflowPolicy
+from mewbot.io.discord.input import DiscordInput
+from mewbot.io.discord.intents import (
+    check_consumed_events,
+    consumed_input_events,
+    intents_for_events,
+    intents_from_names,
+    member_cache_flags_from_names,
+    produced_input_events,
+)
+from mewbot.io.discord.metrics import DiscordMetrics
+from mewbot.io.discord.output import DiscordOutput
+from mewbot.io.discord.pool import OutputPool, PoolStrategy
+from mewbot.io.discord.recording import GatewayRecorder
+from mewbot.io.discord.replay import DiscordReplayInput
+from mewbot.io.discord.scheduler import ChannelOutputScheduler
+from mewbot.io.discord.tracing import EventTracer
+from mewbot.io.discord.workers import ShardWorkerPool, ShardWorkerSpec
 
 __version__ = "0.0.4"
 
@@ -36,10 +68,58 @@ class DiscordIO(IOConfig):
     IOConfig for reading and writing to Discord.
     """
 
+    # pylint: disable=too-many-instance-attributes, too-many-public-methods
+    # Each of the private attributes backs a property which can be set from the yaml.
+
     _input: Optional[DiscordInput] = None
     _output: Optional[DiscordOutput] = None
     _token: str = ""
     _startup_queue_depth: int = 0
+    _startup_channel_depth: int = 0
+    _startup_concurrency: int = 8
+    _startup_guilds: List[int] = []
+    _startup_channels: List[int] = []
+    _cursor_store: str = ""
+    _cursor_flush_interval: float = 5.0
+    _intents: List[str] = []
+    _allowed_guilds: List[int] = []
+    _denied_guilds: List[int] = []
+    _allowed_channels: List[int] = []
+    _denied_channels: List[int] = []
+    _allowed_authors: List[int] = []
+    _denied_authors: List[int] = []
+    _ignore_bots: bool = False
+    _ignore_self: bool = False
+    _clean_message_text: bool = True
+    _compact_events: bool = False
+    _raw_message_events: bool = False
+    _suppress_unchanged_edits: bool = False
+    _edit_debounce: float = 0.0
+    _ingress_capacity: int = 0
+    _ingress_overflow: str = OverflowPolicy.DROP_OLDEST.value
+    _output_concurrency: int = 0
+    _coalesce_window: float = 0.0
+    _coalesce_separator: str = "\n"
+    _channel_cache_size: int = 1024
+    _channel_cache_ttl: float = 300.0
+    _channel_negative_ttl: float = 30.0
+    _upload_limit: int = 0
+    _sharded: bool = False
+    _shard_count: int = 0
+    _shard_ids: List[int] = []
+    _shard_workers: int = 0
+    _output_tokens: List[str] = []
+    _max_messages: int = 1000
+    _member_cache: Optional[List[str]] = None
+    _chunk_guilds_at_startup: Optional[bool] = None
+    _output_strategy: str = PoolStrategy.AFFINITY.value
+    _collect_metrics: bool = False
+    _metrics_port: int = 0
+    _metrics: Optional[DiscordMetrics] = None
+    _trace_sink: str = ""
+    _trace_sample_rate: float = 0.01
+    _tracer: Optional[EventTracer] = None
+    _gateway_log: str = ""
     _client: InternalMewbotDiscordClient
 
     @property
@@ -60,7 +140,8 @@ class DiscordIO(IOConfig):
 
         Messages will be retrieved from all channels this IOConfig is aware of.
         Note - this represents the TOTAL number of messages retrieved, not the PER CHANNEL number.
-        There is currently no way to setting a per channel number.
+        See startup_channel_depth for setting a per channel number.
+        With shard_workers, the total is divided between the workers - see shard_workers.
         :return:
         """
         return self._startup_queue_depth
@@ -72,358 +153,844 @@ class DiscordIO(IOConfig):
         ), "Please provide a positive (or 0) startup_queue_depth"
         self._startup_queue_depth = startup_queue_depth
 
-    def get_inputs(self) -> Sequence[Input]:
+    @property
+    def startup_channel_depth(self) -> int:
         """
-        Return the DiscordInput for this DiscordIO.
+        On startup, at most this many messages will be retrieved from any one channel.
+
+        0 (the default) means no per channel limit - only the startup_queue_depth applies.
+        :return:
         """
-        if not self._input:
-            self._input = DiscordInput(self._token, self._startup_queue_depth)
-            self._client = self._input.get_client()
+        return self._startup_channel_depth
 
-        return [self._input]
+    @startup_channel_depth.setter
+    def startup_channel_depth(self, startup_channel_depth: int) -> None:
+        assert (
+            startup_channel_depth >= 0
+        ), "Please provide a positive (or 0) startup_channel_depth"
+        self._startup_channel_depth = startup_channel_depth
 
-    def get_outputs(self) -> Sequence[Output]:
+    @property
+    def startup_concurrency(self) -> int:
         """
-        Return the DiscordOutput for this DiscordIO.
+        On startup, the number of channel histories which can be fetched at once.
         """
-        if not self._output:
-            self._output = DiscordOutput(active_client=self._client)
+        return self._startup_concurrency
 
-        return [self._output]
+    @startup_concurrency.setter
+    def startup_concurrency(self, startup_concurrency: int) -> None:
+        assert startup_concurrency > 0, "Please provide a positive startup_concurrency"
+        self._startup_concurrency = startup_concurrency
 
+    @property
+    def startup_guilds(self) -> List[int]:
+        """
+        If set, only channels in guilds with these ids will be retrieved from on startup.
+        """
+        return self._startup_guilds
 
-class DiscordInput(Input):
-    """
-    Uses py-cord as a backend to connect, receive and send messages to discord.
-    """
+    @startup_guilds.setter
+    def startup_guilds(self, startup_guilds: List[int]) -> None:
+        self._startup_guilds = [int(x) for x in startup_guilds]
 
-    _logger: logging.Logger
-    _token: str
-    _startup_queue_depth: int
-    _client: InternalMewbotDiscordClient
+    @property
+    def startup_channels(self) -> List[int]:
+        """
+        If set, only channels with these ids will be retrieved from on startup.
+        """
+        return self._startup_channels
 
-    def __init__(self, token: str, startup_queue_depth: int = 0) -> None:
+    @startup_channels.setter
+    def startup_channels(self, startup_channels: List[int]) -> None:
+        self._startup_channels = [int(x) for x in startup_channels]
+
+    @property
+    def cursor_store(self) -> str:
         """
-        Initialize the Discord Input.
+        Path to a file to store the last message dispatched from each channel in.
 
-        :param token: The token need to authenticate this bot to the discord server
-        :param startup_queue_depth:
-            During startup, the number of DiscordTextInputEvents to put on the wire
-            (Other forms of event are not always possible).
+        If set, on startup every message sent since the last one dispatched is put on the wire -
+        for each channel with a stored position.
+        Channels without a stored position fall back on the startup_queue_depth.
+        Empty (the default) disables storing positions.
         """
-        assert startup_queue_depth >= 0, "Does not support a negative startup_queue_depth"
+        return self._cursor_store
 
-        super().__init__()
+    @cursor_store.setter
+    def cursor_store(self, cursor_store: str) -> None:
+        self._cursor_store = str(cursor_store)
 
-        intents = discord.Intents.all()
-        self._client = InternalMewbotDiscordClient(intents=intents)
-        self._token = token
-        self._logger = logging.getLogger(__name__ + "DiscordInput")
+    @property
+    def cursor_flush_interval(self) -> float:
+        """
+        Seconds between writing the positions in the cursor_store to disk.
 
-        self._startup_queue_depth = startup_queue_depth
+        0 writes them every time a message is dispatched.
+        """
+        return self._cursor_flush_interval
 
-        self._client._logger = self._logger
-        self._client._startup_queue_depth = self._startup_queue_depth
-        self._client.queue = self.queue
+    @cursor_flush_interval.setter
+    def cursor_flush_interval(self, cursor_flush_interval: float) -> None:
+        assert cursor_flush_interval >= 0, "Please provide a positive (or 0) flush interval"
+        self._cursor_flush_interval = float(cursor_flush_interval)
 
-    def bind(self, queue: InputQueue) -> None:
+    @property
+    def intents(self) -> List[str]:
         """
-        Bind the queues into this Input class.
+        The gateway intents to connect with - e.g. ["guilds", "guild_messages"].
 
-        :param queue:
-        :return:
+        If empty (the default), the smallest set of intents needed to produce the input events
+        consumed by the loaded triggers is used.
+        Names are as used by discord.Intents.
         """
-        self.queue = queue
-        self._client.queue = queue
+        return self._intents
 
-    def get_client(self) -> InternalMewbotDiscordClient:
+    @intents.setter
+    def intents(self, intents: List[str]) -> None:
+        # Fail on load - rather than on connect - if any of the names are wrong
+        intents_from_names(intents)
+        self._intents = [str(x) for x in intents]
+
+    @property
+    def allowed_guilds(self) -> List[int]:
         """
-        Return the internal client which the Input uses to talk to discord.
+        If set, only events from guilds with these ids will be put on the wire.
+        """
+        return self._allowed_guilds
 
-        We need the client in the output to allow certain OutputEvents to affect discord.
-        :return:
+    @allowed_guilds.setter
+    def allowed_guilds(self, allowed_guilds: List[int]) -> None:
+        self._allowed_guilds = [int(x) for x in allowed_guilds]
+
+    @property
+    def denied_guilds(self) -> List[int]:
         """
-        return self._client
+        Events from guilds with these ids will never be put on the wire.
+        """
+        return self._denied_guilds
+
+    @denied_guilds.setter
+    def denied_guilds(self, denied_guilds: List[int]) -> None:
+        self._denied_guilds = [int(x) for x in denied_guilds]
 
-    @staticmethod
-    def produces_inputs() -> Set[Type[InputEvent]]:
+    @property
+    def allowed_channels(self) -> List[int]:
         """
-        Defines the set of input events this Input class can produce.
+        If set, only events from channels (or threads in channels) with these ids go on the wire.
         """
-        return {
-            DiscordUserJoinInputEvent,
-            DiscordMessageCreationEvent,
-            DiscordMessageEditInputEvent,
-            DiscordMessageDeleteInputEvent,
-        }
+        return self._allowed_channels
 
-    async def run(self) -> None:
+    @allowed_channels.setter
+    def allowed_channels(self, allowed_channels: List[int]) -> None:
+        self._allowed_channels = [int(x) for x in allowed_channels]
+
+    @property
+    def denied_channels(self) -> List[int]:
         """
-        Fires up a discord client to run this service.
+        Events from channels (or threads in channels) with these ids never go on the wire.
+        """
+        return self._denied_channels
+
+    @denied_channels.setter
+    def denied_channels(self, denied_channels: List[int]) -> None:
+        self._denied_channels = [int(x) for x in denied_channels]
 
-        Token needs to be set by this point.
+    @property
+    def allowed_authors(self) -> List[int]:
+        """
+        If set, only events caused by users with these ids will be put on the wire.
         """
-        self._logger.info("About to connect to Discord")
+        return self._allowed_authors
 
-        await self._client.start(self._token)
+    @allowed_authors.setter
+    def allowed_authors(self, allowed_authors: List[int]) -> None:
+        self._allowed_authors = [int(x) for x in allowed_authors]
 
+    @property
+    def denied_authors(self) -> List[int]:
+        """
+        Events caused by users with these ids will never be put on the wire.
+        """
+        return self._denied_authors
 
-class InternalMewbotDiscordClient(discord.Client):
-    """
-    Discord.Client with overrode methods to actually interact with mewbot.
+    @denied_authors.setter
+    def denied_authors(self, denied_authors: List[int]) -> None:
+        self._denied_authors = [int(x) for x in denied_authors]
 
-    In particular, methods have been overridden to write events to the InputQueue when they occur.
-    """
+    @property
+    def ignore_bots(self) -> bool:
+        """
+        Should events caused by bots be dropped?
+        """
+        return self._ignore_bots
 
-    _logger: logging.Logger
-    _startup_queue_depth: int
+    @ignore_bots.setter
+    def ignore_bots(self, ignore_bots: bool) -> None:
+        self._ignore_bots = bool(ignore_bots)
 
-    queue: Optional[InputQueue]
+    @property
+    def ignore_self(self) -> bool:
+        """
+        Should events caused by this bot be dropped?
+        """
+        return self._ignore_self
 
-    async def on_ready(self) -> None:
+    @ignore_self.setter
+    def ignore_self(self, ignore_self: bool) -> None:
+        self._ignore_self = bool(ignore_self)
+
+    @property
+    def clean_message_text(self) -> bool:
         """
-        Called once at the start, after the bot has connected to discord.
+        Should the text of new messages have mentions resolved, as shown in the client?
+
+        If False, the raw content of the message is used - e.g. "<@1234>" rather than "@name".
+        Either way, the text is only worked out if something reads it.
         """
-        self._logger.info("%s has connected to Discord!", self.user)
+        return self._clean_message_text
 
-        await self.retrieve_old_message()
+    @clean_message_text.setter
+    def clean_message_text(self, clean_message_text: bool) -> None:
+        self._clean_message_text = bool(clean_message_text)
 
-    async def retrieve_old_message(self) -> None:
+    @property
+    def compact_events(self) -> bool:
         """
-        If a startup_queue_depth is set, then retrieve that number of entries and transmit them.
+        Should message events hold a compact snapshot of the message, rather than the message?
+
+        If True, the DiscordCompact... events are produced in place of the message creation,
+        edit and delete events.
+        These hold only ids, content and timestamps - so use far less memory while queued.
+        Replies can still be made to them, via a rebuilt PartialMessage.
+        Triggers which consume only the events replaced are refused when the input is built.
         """
-        if not self._startup_queue_depth:
-            return
+        return self._compact_events
 
-        # Might want to, instead, wait for a queue
-        if not self.queue:
-            return
+    @compact_events.setter
+    def compact_events(self, compact_events: bool) -> None:
+        self._compact_events = bool(compact_events)
 
-        self._logger.info("Retrieving %s old messages", self._startup_queue_depth)
-
-        # The aim is to build a list of the last five messages the bot would have seen if it was up
-        # - iterate over all the guilds the bot can see
-        # - then iterate over all the text channels in that guild
-        # - grab a number of messages equal to the queue depth
-        # - append them to a master list
-        # - sort on time in the master list
-        # - return the queue depth number of items from the sorted list
-        past_messages: List[discord.Message] = []
-
-        # Shortcut for iterating over all guilds, then all channels
-        for channel in self.get_all_channels():
-            # Ignoring everything which is not a text channel - nothing to do with past voice
-            if not isinstance(channel, discord.channel.TextChannel):
-                continue
-
-            messages = [x async for x in channel.history(limit=5)]
-            past_messages.extend(messages)
-
-        # Sort the messages and put the last five on the wire
-        past_messages = sorted(
-            past_messages, key=lambda x: float(x.created_at.timestamp()), reverse=True
-        )
+    @property
+    def raw_message_events(self) -> bool:
+        """
+        Should edits and deletes be produced for every message - not just those in the cache?
 
-        for message in past_messages[: self._startup_queue_depth]:
-            if not isinstance(message, discord.Message):
-                self._logger.info("Expected a message and got a %s", type(message))
+        If True, DiscordRawMessageEditInputEvents and DiscordRawMessageDeleteInputEvents are
+        produced in place of the message edit and delete events.
+        These are built from the gateway payload - so carry ids, and the new content of an
+        edit - and only hold what came before when the message was in the cache.
+        This allows max_messages to be reduced without losing any edits or deletes.
+        Triggers which consume only the events replaced are refused when the input is built.
+        """
+        return self._raw_message_events
 
-            await self.queue.put(
-                DiscordMessageCreationEvent(text=message.content, message=message)
-            )
+    @raw_message_events.setter
+    def raw_message_events(self, raw_message_events: bool) -> None:
+        self._raw_message_events = bool(raw_message_events)
 
-    async def on_message(self, message: discord.Message) -> None:
+    @property
+    def suppress_unchanged_edits(self) -> bool:
         """
-        Check for acceptance on all commands - execute the first one that matches.
+        Should edits which leave the content of the message as it was be dropped?
 
-        :param message:
-        :return:
+        Discord sends an update whenever the link embeds of a message resolve - which reaches
+        the bot as an edit, with the same text before and after.
+        Raw edits can only be compared with the message before if it was in the cache - those
+        without any content are always dropped.
         """
-        if not self.queue:
-            return
+        return self._suppress_unchanged_edits
 
-        await self.queue.put(
-            DiscordMessageCreationEvent(text=str(message.clean_content), message=message)
-        )
+    @suppress_unchanged_edits.setter
+    def suppress_unchanged_edits(self, suppress_unchanged_edits: bool) -> None:
+        self._suppress_unchanged_edits = bool(suppress_unchanged_edits)
 
-    async def on_member_join(self, member: discord.Member) -> None:
+    @property
+    def edit_debounce(self) -> float:
         """
-        Triggered when a member joins one of the guilds that the bot is monitoring.
+        Seconds to hold each message edit for - merging further edits of the message into it.
+
+        A burst of edits becomes one event - from the text before the first edit to the text
+        after the last. With suppress_unchanged_edits, an edit which was reverted within the
+        window produces no event at all.
+        0 (the default) puts each edit on the wire as it comes.
         """
-        self._logger.info(
-            'New member "%s" has been detected joining"%s"',
-            str(member.mention),
-            str(member.guild.name),
-        )
+        return self._edit_debounce
 
-        if not self.queue:
-            return
+    @edit_debounce.setter
+    def edit_debounce(self, edit_debounce: float) -> None:
+        assert edit_debounce >= 0, "Please provide a positive (or 0) edit debounce"
+        self._edit_debounce = float(edit_debounce)
 
-        await self.queue.put(DiscordUserJoinInputEvent(member=member))
+    @property
+    def collect_metrics(self) -> bool:
+        """
+        Should counters and latency histograms be kept - readable with get_metrics?
 
-    async def on_message_edit(self, before: discord.Message, after: discord.Message) -> None:
+        Covers gateway events received and filtered, waits to put events on the InputQueue,
+        output send latency, 429s, backfill duration and heartbeat latency.
         """
-        Triggered when a message is edited on any of the channels which the bot is monitoring.
+        return self._collect_metrics or bool(self._metrics_port)
+
+    @collect_metrics.setter
+    def collect_metrics(self, collect_metrics: bool) -> None:
+        self._collect_metrics = bool(collect_metrics)
 
-        :param before: The message before the edit
-        :param after: The message after the edit
+    @property
+    def metrics_port(self) -> int:
         """
-        self._logger.info("Message edit - %s changed to %s", before.content, after.content)
+        Serve the metrics at http://127.0.0.1:<port>/metrics, for Prometheus to scrape.
 
-        if not self.queue:
-            return
+        0 (the default) does not serve them. Setting a port also turns on collect_metrics.
+        """
+        return self._metrics_port
 
-        await self.queue.put(
-            DiscordMessageEditInputEvent(
-                text_before=before.content,
-                message_before=before,
-                text_after=after.content,
-                message_after=after,
-            )
-        )
+    @metrics_port.setter
+    def metrics_port(self, metrics_port: int) -> None:
+        assert 0 <= metrics_port <= 65535, "Please provide a valid port (or 0)"
+        self._metrics_port = int(metrics_port)
 
-    async def on_message_delete(self, message: discord.Message) -> None:
+    @property
+    def trace_sink(self) -> str:
         """
-        Triggered when a message is deleted on any of the channels which the bot is monitoring.
+        A JSONL file to append sampled traces of replies to - "" (the default) to not trace.
 
-        :param message: The message before the delete event occurred.
+        Each line is one reply - the seconds taken from the message it replies to arriving
+        from the gateway to being put on the InputQueue (queue), from there to the reply
+        starting to send (pipeline), and sending it (send).
+        With collect_metrics, every reply's total is recorded in reply_latency_seconds.
         """
-        self._logger.info(
-            "Message delete - %s has deleted a message with content %s",
-            message.author,
-            message.content,
-        )
+        return self._trace_sink
 
-        if not self.queue:
-            return
+    @trace_sink.setter
+    def trace_sink(self, trace_sink: str) -> None:
+        self._trace_sink = str(trace_sink)
 
-        await self.queue.put(
-            DiscordMessageDeleteInputEvent(text_before=message.content, message=message)
-        )
+    @property
+    def trace_sample_rate(self) -> float:
+        """
+        The fraction of traces written to the trace_sink - 0.01 by default.
+        """
+        return self._trace_sample_rate
 
+    @trace_sample_rate.setter
+    def trace_sample_rate(self, trace_sample_rate: float) -> None:
+        assert 0 <= trace_sample_rate <= 1, "Please provide a sample rate between 0 and 1"
+        self._trace_sample_rate = float(trace_sample_rate)
 
-class DiscordOutput(Output):
-    """
-    Output class to write events to connected Discord servers.
-    """
+    @property
+    def gateway_log(self) -> str:
+        """
+        A file to record every dispatch from the gateway to - "" (the default) to not record.
 
-    output_uuid: str
+        The log is gzipped, and replaced on each run. Replay it with a DiscordReplayInput.
+        With shard_workers, the gateway is read by the workers - so nothing is recorded.
+        """
+        return self._gateway_log
 
-    _client: InternalMewbotDiscordClient
+    @gateway_log.setter
+    def gateway_log(self, gateway_log: str) -> None:
+        self._gateway_log = str(gateway_log)
 
-    def __init__(self, active_client: InternalMewbotDiscordClient):
+    @property
+    def ingress_capacity(self) -> int:
         """
-        Initialise this class with a client to effect changes to discord beyond replying.
+        The most events which can wait between discord and the InputQueue.
 
-        :param active_client:
+        If set, gateway events are buffered without ever waiting on the InputQueue - once the
+        buffer is full, events are shed according to the ingress_overflow policy.
+        0 (the default) disables the buffer - events are put straight onto the InputQueue.
         """
-        self._client = active_client
+        return self._ingress_capacity
 
-        self.output_uuid = str(uuid.uuid4())
+    @ingress_capacity.setter
+    def ingress_capacity(self, ingress_capacity: int) -> None:
+        assert ingress_capacity >= 0, "Please provide a positive (or 0) ingress capacity"
+        self._ingress_capacity = int(ingress_capacity)
 
-    @staticmethod
-    def consumes_outputs() -> Set[Type[OutputEvent]]:
+    @property
+    def ingress_overflow(self) -> str:
         """
-        Defines the set of output events that this Output class can consume.
+        What to do with new events when the ingress buffer is full.
+
+        One of "drop-oldest" (the default), "drop-newest" or "coalesce-edits".
+        "coalesce-edits" folds an edit into a waiting edit of the same message - otherwise
+        dropping the oldest event.
         """
-        return {DiscordOutputEvent}
+        return self._ingress_overflow
+
+    @ingress_overflow.setter
+    def ingress_overflow(self, ingress_overflow: str) -> None:
+        self._ingress_overflow = OverflowPolicy(ingress_overflow).value
 
-    async def output(self, event: OutputEvent) -> bool:
+    @property
+    def output_concurrency(self) -> int:
         """
-        Does the work of transmitting the event to the world.
+        The most messages which can be being sent at once, across all channels.
 
-        :param event:
-        :return:
+        If set, output is queued per channel and sent in the background - in order within each
+        channel, with independent channels not waiting on each other.
+        Discord's per-channel and global rate limits are kept to before sending.
+        0 (the default) sends each output event before moving on to the next.
         """
+        return self._output_concurrency
 
-        if not isinstance(event, tuple(self.consumes_outputs())):
-            return False
+    @output_concurrency.setter
+    def output_concurrency(self, output_concurrency: int) -> None:
+        assert output_concurrency >= 0, "Please provide a positive (or 0) output concurrency"
+        self._output_concurrency = int(output_concurrency)
+
+    @property
+    def coalesce_window(self) -> float:
+        """
+        Seconds to hold text output for, joining texts sent to the same place into one message.
 
-        if isinstance(event, DiscordReplyToMessageOutputEvent):
-            return await self._process_reply_to_message(event)
+        Texts are joined up to discord's 2000 character limit - and split at line breaks (or
+        spaces) beyond it.
+        Replies are only joined with other replies to the same message.
+        0 (the default) sends each output event as its own message.
+        """
+        return self._coalesce_window
 
-        if isinstance(event, DiscordReplyIntoMessageChannelOutputEvent):
-            return await self._process_reply_into_message_channel_event(event)
+    @coalesce_window.setter
+    def coalesce_window(self, coalesce_window: float) -> None:
+        assert coalesce_window >= 0, "Please provide a positive (or 0) coalesce window"
+        self._coalesce_window = float(coalesce_window)
 
-        if isinstance(event, DiscordPostToChannelOutputEvent):
-            return await self._process_post_to_channel_output_evnet(event)
+    @property
+    def coalesce_separator(self) -> str:
+        """
+        Placed between texts joined into one message - a new line by default.
+        """
+        return self._coalesce_separator
 
-        if isinstance(event, DiscordOutputEvent):
-            return await self._process_bare_event(event)
+    @coalesce_separator.setter
+    def coalesce_separator(self, coalesce_separator: str) -> None:
+        self._coalesce_separator = str(coalesce_separator)
 
-        raise NotImplementedError("Currently can only respond to a message")
+    @property
+    def channel_cache_size(self) -> int:
+        """
+        The most channels, fetched to be posted to by id, to hold on to.
 
-    @staticmethod
-    async def _process_reply_to_message(event: DiscordReplyToMessageOutputEvent) -> bool:
+        Channels in the gateway's cache are always used first - only channels which are not
+        (e.g. with reduced guild caching) are fetched, and held.
         """
-        Process a DiscordReplyToMessageOutputEvent event.
+        return self._channel_cache_size
 
-        :param event:
-        :return:
+    @channel_cache_size.setter
+    def channel_cache_size(self, channel_cache_size: int) -> None:
+        assert channel_cache_size >= 0, "Please provide a positive (or 0) channel cache size"
+        self._channel_cache_size = int(channel_cache_size)
+
+    @property
+    def channel_cache_ttl(self) -> float:
         """
-        await event.message.reply(event.text)
-        return True
+        Seconds to hold a fetched channel for, before fetching it again.
+        """
+        return self._channel_cache_ttl
+
+    @channel_cache_ttl.setter
+    def channel_cache_ttl(self, channel_cache_ttl: float) -> None:
+        assert channel_cache_ttl >= 0, "Please provide a positive (or 0) channel cache ttl"
+        self._channel_cache_ttl = float(channel_cache_ttl)
 
-    @staticmethod
-    async def _process_reply_into_message_channel_event(
-        event: DiscordReplyIntoMessageChannelOutputEvent,
-    ) -> bool:
+    @property
+    def channel_negative_ttl(self) -> float:
+        """
+        Seconds to remember that a channel could not be fetched - so it is not tried again.
         """
-        Reply into the same channel which produced the message.
+        return self._channel_negative_ttl
 
-        :param event:
-        :return:
+    @channel_negative_ttl.setter
+    def channel_negative_ttl(self, channel_negative_ttl: float) -> None:
+        assert channel_negative_ttl >= 0, "Please provide a positive (or 0) negative ttl"
+        self._channel_negative_ttl = float(channel_negative_ttl)
+
+    @property
+    def upload_limit(self) -> int:
         """
-        await event.message.channel.send(event.text)
-        return True
+        The largest file, in bytes, which will be attached to a post.
 
-    @staticmethod
-    async def _process_bare_event(event: DiscordOutputEvent) -> bool:
+        Posts with larger files are not sent - checked before any network call.
+        0 (the default) uses the limit of the guild being posted to.
         """
-        Process a bare DiscordOutputEvent event.
+        return self._upload_limit
 
-        :param event:
-        :return:
+    @upload_limit.setter
+    def upload_limit(self, upload_limit: int) -> None:
+        assert upload_limit >= 0, "Please provide a positive (or 0) upload limit"
+        self._upload_limit = int(upload_limit)
+
+    @property
+    def sharded(self) -> bool:
+        """
+        Should the bot connect with several gateway shards?
+
+        Discord requires sharding for bots in over 2500 guilds - and a single shard limits
+        throughput well before then.
+        If shard_count and shard_ids are not set, discord is asked how many shards to use.
+        Setting either of them also enables sharding.
+        """
+        return self._sharded or bool(self._shard_count) or bool(self._shard_ids)
+
+    @sharded.setter
+    def sharded(self, sharded: bool) -> None:
+        self._sharded = bool(sharded)
+
+    @property
+    def shard_count(self) -> int:
+        """
+        The total number of shards the bot is split into.
+
+        0 (the default) uses the number discord suggests.
         """
-        # Don't know how to send this message
-        if event.message is None:
-            return False
+        return self._shard_count
 
-        await event.message.channel.send(event.text)
-        return True
+    @shard_count.setter
+    def shard_count(self, shard_count: int) -> None:
+        assert shard_count >= 0, "Please provide a positive (or 0) shard count"
+        self._shard_count = int(shard_count)
 
-    async def _process_post_to_channel_output_evnet(
-        self, event: DiscordPostToChannelOutputEvent
-    ) -> bool:
+    @property
+    def shard_ids(self) -> List[int]:
         """
-        Process a DiscordPostToChannelOutputEvent.
+        The shards to run in this process - e.g. when the bot is spread over several hosts.
 
-        This instructs the bot to post to an existing channel.
-        :param event:
-        :return:
+        Empty (the default) runs all of them. If set, shard_count must be set as well.
+        """
+        return self._shard_ids
+
+    @shard_ids.setter
+    def shard_ids(self, shard_ids: List[int]) -> None:
+        self._shard_ids = [int(x) for x in shard_ids]
+
+    @property
+    def max_messages(self) -> int:
+        """
+        The most messages to hold in the message cache - 0 for no message cache.
+
+        DiscordMessageEditInputEvents and DiscordMessageDeleteInputEvents are only produced for
+        messages which are still in the cache.
+        Each cached message costs roughly 1KiB - more with embeds and attachments.
+        """
+        return self._max_messages
+
+    @max_messages.setter
+    def max_messages(self, max_messages: int) -> None:
+        assert max_messages >= 0, "Please provide a positive (or 0) max_messages"
+        self._max_messages = int(max_messages)
+
+    @property
+    def member_cache(self) -> Optional[List[str]]:
+        """
+        Which members to cache - e.g. ["joined"] - or [] to cache none beyond the bot itself.
+
+        Names are as used by discord.MemberCacheFlags.
+        If not set (the default), it is decided from the intents - all members are cached if
+        the members intent is enabled.
+        In large guilds, the member cache is usually the largest part of the client's memory.
+        """
+        return self._member_cache
+
+    @member_cache.setter
+    def member_cache(self, member_cache: Optional[List[str]]) -> None:
+        if member_cache is None:
+            self._member_cache = None
+            return
+        # Fail on load - rather than on connect - if any of the names are wrong
+        member_cache_flags_from_names(member_cache)
+        self._member_cache = [str(x) for x in member_cache]
+
+    @property
+    def chunk_guilds_at_startup(self) -> Optional[bool]:
+        """
+        Should every member of each guild be requested on connecting?
+
+        Chunking fills the member cache - but delays the client being ready (and any backfill)
+        until every guild's members have arrived.
+        If not set (the default), guilds are chunked if the members intent is enabled.
+        """
+        return self._chunk_guilds_at_startup
+
+    @chunk_guilds_at_startup.setter
+    def chunk_guilds_at_startup(self, chunk_guilds_at_startup: Optional[bool]) -> None:
+        self._chunk_guilds_at_startup = (
+            None if chunk_guilds_at_startup is None else bool(chunk_guilds_at_startup)
+        )
+
+    def _cache_config(self) -> CacheConfig:
         """
-        channel_id = event.channel_id
+        Gather the settings which control how much the client holds on to.
+        """
+        return CacheConfig(
+            max_messages=self._max_messages or None,
+            member_cache=(
+                tuple(self._member_cache) if self._member_cache is not None else None
+            ),
+            chunk_guilds_at_startup=self._chunk_guilds_at_startup,
+        )
+
+    @property
+    def output_tokens(self) -> List[str]:
+        """
+        Tokens for further bots to send output with - spreading it over their rate limits.
+
+        The bots must be in the same guilds as the main bot (and able to post in the same
+        channels). They only log in - they never connect to the gateway.
+        DMs are always sent by the main bot.
+        """
+        return self._output_tokens
 
-        channel = self._client.get_channel(channel_id)
-        if channel is None:
-            return False
-        if isinstance(channel, (discord.abc.PrivateChannel, discord.abc.GuildChannel)):
-            return False
+    @output_tokens.setter
+    def output_tokens(self, output_tokens: List[str]) -> None:
+        self._output_tokens = [str(x) for x in output_tokens]
 
-        await channel.send(event.text)
+    @property
+    def output_strategy(self) -> str:
+        """
+        How the bot to send each message with is chosen, when there are output_tokens.
+
+        "affinity" (the default) always sends to a channel with the same bot.
+        "least-limited" uses the next bot along if the channel's own bot is rate limited.
+        """
+        return self._output_strategy
+
+    @output_strategy.setter
+    def output_strategy(self, output_strategy: str) -> None:
+        self._output_strategy = PoolStrategy(output_strategy).value
+
+    @property
+    def shard_workers(self) -> int:
+        """
+        The number of worker processes to run the gateway shards in - 0 (the default) to run
+        them in this process.
 
-        return True
+        Parsing gateway traffic is CPU bound - workers spread it over several cores.
+        Each worker filters its shards' events, and sends them here as compact events - so
+        compact_events is implied, and DiscordUserJoinInputEvents are not produced - triggers
+        which consume only the events not produced are refused when the input is built.
+        The shards are divided between the workers - so shard_count (or discord's suggestion)
+        should be at least the number of workers.
+        Each worker retrieves old messages from its own shards' channels on startup - the
+        startup_queue_depth is divided between them in proportion to their shards.
+        """
+        return self._shard_workers
+
+    @shard_workers.setter
+    def shard_workers(self, shard_workers: int) -> None:
+        assert shard_workers >= 0, "Please provide a positive (or 0) number of shard workers"
+        self._shard_workers = int(shard_workers)
+
+    def _shard_config(self) -> Optional[ShardConfig]:
+        """
+        Gather the settings which control sharding - None if the bot is not sharded.
+        """
+        if not self.sharded:
+            return None
+
+        assert (
+            not self._shard_ids or self._shard_count
+        ), "Please provide a shard_count along with the shard_ids"
+        assert all(
+            0 <= x < self._shard_count for x in self._shard_ids
+        ), "Each of the shard_ids must be less than the shard_count"
+
+        return ShardConfig(
+            shard_count=self._shard_count or None,
+            shard_ids=tuple(self._shard_ids) if self._shard_ids else None,
+        )
+
+    def _worker_pool(self, intents: discord.Intents) -> Optional[ShardWorkerPool]:
+        """
+        The pool of worker processes to run the gateway shards in - None to run them here.
+
+        :param intents: The intents the workers should connect with.
+        """
+        if not self._shard_workers:
+            return None
+
+        assert not self._shard_ids, "shard_ids cannot be used with shard_workers"
+
+        spec = ShardWorkerSpec(
+            token=self._token,
+            intents=intents,
+            shard_count=self._shard_count,
+            startup_queue_depth=self._startup_queue_depth,
+            backfill_config=self._backfill_config(),
+            cursor_store=self._cursor_store,
+            cursor_flush_interval=self._cursor_flush_interval,
+            event_filter=self._event_filter(),
+            clean_message_text=self._clean_message_text,
+            raw_message_events=self._raw_message_events,
+            suppress_unchanged_edits=self._suppress_unchanged_edits,
+            edit_debounce=self._edit_debounce,
+            cache=self._cache_config(),
+        )
+        return ShardWorkerPool(spec, self._shard_workers)
+
+    def _event_filter(self) -> DiscordEventFilter:
+        """
+        Gather the settings which decide which events are put on the wire.
+        """
+        return DiscordEventFilter(
+            allowed_guilds=frozenset(self._allowed_guilds),
+            denied_guilds=frozenset(self._denied_guilds),
+            allowed_channels=frozenset(self._allowed_channels),
+            denied_channels=frozenset(self._denied_channels),
+            allowed_authors=frozenset(self._allowed_authors),
+            denied_authors=frozenset(self._denied_authors),
+            ignore_bots=self._ignore_bots,
+            ignore_self=self._ignore_self,
+        )
+
+    def _gateway_intents(self) -> discord.Intents:
+        """
+        The intents the client should connect with - logging which were enabled, and why.
+        """
+        logger = logging.getLogger(__name__ + "DiscordIO")
+
+        if self._intents:
+            logger.info("Using configured intents: %s", ", ".join(sorted(self._intents)))
+            return intents_from_names(self._intents)
+
+        intents, reasons = intents_for_events(
+            consumed_input_events(),
+            reads_history=bool(self._startup_queue_depth or self._cursor_store),
+        )
+        for name, why in self._cache_config().needed_intents().items():
+            setattr(intents, name, True)
+            reasons.setdefault(name, []).extend(why)
+        for name, why in sorted(reasons.items()):
+            logger.info("Enabling intent %s for %s", name, ", ".join(why))
+
+        return intents
+
+    def _backfill_config(self) -> BackfillConfig:
+        """
+        Gather the settings which control the startup backfill.
+        """
+        return BackfillConfig(
+            channel_depth=self._startup_channel_depth,
+            concurrency=self._startup_concurrency,
+            guild_ids=set(self._startup_guilds),
+            channel_ids=set(self._startup_channels),
+        )
+
+    def get_metrics(self) -> Optional[DiscordMetrics]:
+        """
+        The metrics kept by the input and output - None if metrics are not being collected.
+
+        get_metrics().render is a pull callback giving them in the Prometheus text format.
+        """
+        if self._metrics is None and self.collect_metrics:
+            self._metrics = DiscordMetrics()
+            self._metrics.watch_rate_limits()
+        return self._metrics
+
+    def _event_tracer(self) -> Optional[EventTracer]:
+        """
+        The tracer shared by the input and output - None if there is nothing to trace for.
+        """
+        if self._tracer is None and (self._trace_sink or self.collect_metrics):
+            self._tracer = EventTracer(self._trace_sink, self._trace_sample_rate)
+        return self._tracer
+
+    def get_inputs(self) -> Sequence[Input]:
+        """
+        Return the DiscordInput for this DiscordIO.
+        """
+        if not self._input:
+            intents = self._gateway_intents()
+            workers = self._worker_pool(intents)
+            check_consumed_events(
+                produced_input_events(
+                    self._compact_events, self._raw_message_events, workers is not None
+                )
+            )
+
+            self._input = DiscordInput(
+                self._token,
+                self._startup_queue_depth,
+                self._backfill_config(),
+                ChannelCursors(self._cursor_store, self._cursor_flush_interval),
+                intents=intents,
+                event_filter=self._event_filter(),
+                clean_message_text=self._clean_message_text,
+                compact_events=self._compact_events or workers is not None,
+                raw_message_events=self._raw_message_events,
+                suppress_unchanged_edits=self._suppress_unchanged_edits,
+                edit_debounce=self._edit_debounce,
+                ingress=(
+                    IngressBuffer(
+                        self._ingress_capacity, OverflowPolicy(self._ingress_overflow)
+                    )
+                    if self._ingress_capacity
+                    else None
+                ),
+                # The workers run the shards - this client only logs in
+                shards=self._shard_config() if workers is None else None,
+                workers=workers,
+                cache=self._cache_config(),
+                metrics=self.get_metrics(),
+                metrics_port=self._metrics_port,
+                tracer=self._event_tracer(),
+                recorder=GatewayRecorder(self._gateway_log) if self._gateway_log else None,
+            )
+            self._client = self._input.get_client()
+
+        return [self._input]
+
+    def get_outputs(self) -> Sequence[Output]:
+        """
+        Return the DiscordOutput for this DiscordIO.
+        """
+        if not self._output:
+            pool = OutputPool(
+                self._client, self._output_tokens, PoolStrategy(self._output_strategy)
+            )
+            self._output = DiscordOutput(
+                active_client=self._client,
+                scheduler=(
+                    ChannelOutputScheduler(self._output_concurrency, sender=pool.sender_for)
+                    if self._output_concurrency
+                    else None
+                ),
+                coalesce_window=self._coalesce_window,
+                coalesce_separator=self._coalesce_separator,
+                channels=ChannelResolver(
+                    self._client,
+                    self._channel_cache_size,
+                    self._channel_cache_ttl,
+                    self._channel_negative_ttl,
+                ),
+                upload_limit=self._upload_limit,
+                pool=pool,
+                metrics=self.get_metrics(),
+                tracer=self._event_tracer(),
+            )
+            # Output held back is sent, and the pool closed, before the client is closed
+            self._client.add_close_hook(self._output.close)
+
+        return [self._output]
 
 
 __all__ = [
+    "DiscordAttachment",
+    "DiscordCompactMessageCreationEvent",
+    "DiscordCompactMessageDeleteInputEvent",
+    "DiscordCompactMessageEditInputEvent",
     "DiscordInputEvent",
     "DiscordMessageCreationEvent",
     "DiscordMessageDeleteInputEvent",
     "DiscordMessageEditInputEvent",
+    "DiscordMessageSnapshot",
     "DiscordOutputEvent",
+    "DiscordRawMessageDeleteInputEvent",
+    "DiscordRawMessageEditInputEvent",
     "DiscordUserJoinInputEvent",
     "DiscordIO",
     "DiscordInput",
+    "DiscordReplayInput",
     "DiscordOutput",
     "DiscordReplyIntoMessageChannelOutputEvent",
     "DiscordReplyToMessageOutputEvent",
@@ -0,0 +1,223 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Files to attach to output messages - from memory or disk, uploaded without extra copies.
+
+In memory data (bytes, bytearray or memoryview) is read through a view - so it is never copied
+as a whole, only a chunk at a time into the upload.
+Files on disk are opened when the message is sent, and streamed from disk.
+Sizes are known without reading anything, so limits can be checked before any network call.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Union
+
+import dataclasses
+import io
+import os
+
+import discord
+
+# Discord allows up to 10 files on a message
+MAX_ATTACHMENTS = 10
+# The upload limit in guilds without boosts (and direct messages)
+DEFAULT_UPLOAD_LIMIT = 8 * 1024 * 1024
+
+# Data in memory, or the path to a file
+AttachmentSource = Union[bytes, bytearray, memoryview, str, "os.PathLike[str]"]
+
+# Extensions for the types discord will show inline - by the first bytes of the file
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"%PDF", ".pdf"),
+)
+
+
+class MemoryViewReader(io.BufferedIOBase):
+    """
+    A read only, seekable file over a memoryview - so the data is not copied up front.
+    """
+
+    _view: memoryview
+    _position: int
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        """
+        Start reading from the beginning of the data.
+
+        :param data: The data to read - held by reference, not copied.
+        """
+        super().__init__()
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        """
+        The data can be read.
+        """
+        return True
+
+    def seekable(self) -> bool:
+        """
+        The data can be re-read - e.g. when an upload is retried.
+        """
+        return True
+
+    def tell(self) -> int:
+        """
+        The position the next read will start at.
+        """
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """
+        Move to the given position.
+        """
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        """
+        Read up to size bytes - a single copy, of just the chunk read.
+        """
+        start = self._position
+        end = len(self._view) if size is None or size < 0 else start + size
+        chunk = self._view[start:end]
+        self._position += len(chunk)
+        return chunk.tobytes()
+
+    def read1(self, size: Optional[int] = -1) -> bytes:
+        """
+        Read up to size bytes - there is only ever the one "raw" read.
+        """
+        return self.read(size)
+
+    def readinto(self, buffer: Union[bytearray, memoryview]) -> int:  # type: ignore[override]
+        """
+        Read into the given buffer - copying straight from the data.
+        """
+        target = memoryview(buffer).cast("B")
+        start = self._position
+        end = start + len(target)
+        chunk = self._view[start:end]
+        size = len(chunk)
+        target[:size] = chunk
+        self._position += size
+        return size
+
+
+@dataclasses.dataclass(frozen=True)
+class DiscordAttachment:
+    """
+    A file to attach to an output message.
+    """
+
+    # Data in memory, or the path to a file on disk
+    source: AttachmentSource
+    # The name shown in discord - defaults to the file's name, or is made up for data in memory
+    filename: Optional[str] = None
+    spoiler: bool = False
+
+    @classmethod
+    def named(cls, source: AttachmentSource, default_stem: str) -> DiscordAttachment:
+        """
+        An attachment with its name settled now - made up from the stem for in memory data.
+
+        :param source:
+        :param default_stem: Used, with an extension guessed from the data, for in memory data.
+        :return:
+        """
+        return cls(source, _name_for(source, default_stem))
+
+    def size(self) -> int:
+        """
+        The size of the file in bytes - without reading it.
+        """
+        if isinstance(self.source, memoryview):
+            return self.source.nbytes
+        if isinstance(self.source, (bytes, bytearray)):
+            return len(self.source)
+        return os.stat(self.source).st_size
+
+    def name(self, default_stem: str = "attachment") -> str:
+        """
+        The name the file will be shown with.
+
+        :param default_stem: Used, with an extension guessed from the data, for in memory data
+                             without a filename.
+        :return:
+        """
+        if self.filename:
+            return self.filename
+        return _name_for(self.source, default_stem)
+
+    def file(self, default_stem: str = "attachment") -> discord.File:
+        """
+        A discord.File to upload this attachment with.
+
+        Files on disk are opened here - so this should only be called just before sending.
+        :param default_stem:
+        :return:
+        """
+        if isinstance(self.source, (bytes, bytearray, memoryview)):
+            fp: Union[io.BufferedIOBase, str] = MemoryViewReader(self.source)
+        else:
+            fp = os.fspath(self.source)
+        return discord.File(fp, filename=self.name(default_stem), spoiler=self.spoiler)
+
+
+def _name_for(source: AttachmentSource, default_stem: str) -> str:
+    """
+    The name a file is shown with, when it has not been given one.
+
+    :param source:
+    :param default_stem: Used, with an extension guessed from the data, for in memory data.
+    :return:
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        head = bytes(memoryview(source).cast("B")[:8])
+        extension = next((ext for sig, ext in _SIGNATURES if head.startswith(sig)), ".bin")
+        return default_stem + extension
+    return os.path.basename(os.fspath(source))
+
+
+def oversized(attachments: Sequence[DiscordAttachment], limit: int) -> List[str]:
+    """
+    Describe each of the attachments which is too large to upload.
+
+    :param attachments:
+    :param limit: The largest file, in bytes, which can be uploaded.
+    :return:
+    """
+    problems = []
+    for index, attachment in enumerate(attachments):
+        size = attachment.size()
+        if size > limit:
+            problems.append(f"{attachment.name(f'attachment{index}')} is {size} bytes")
+    return problems
+
+
+def batches(
+    attachments: Sequence[DiscordAttachment],
+) -> List[Sequence[DiscordAttachment]]:
+    """
+    Split attachments into groups small enough to send on one message each.
+
+    :param attachments:
+    :return:
+    """
+    groups = []
+    for start in range(0, len(attachments), MAX_ATTACHMENTS):
+        end = start + MAX_ATTACHMENTS
+        groups.append(attachments[start:end])
+    return groups
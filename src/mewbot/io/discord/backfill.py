@@ -0,0 +1,312 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Retrieves messages which were sent before the bot started, so they can be put on the wire.
+"""
+
+from __future__ import annotations
+
+from typing import (
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import asyncio
+import contextlib
+import dataclasses
+import heapq
+import logging
+
+import discord
+
+
+@dataclasses.dataclass
+class BackfillConfig:
+    """
+    Settings which control which channels are back-filled on startup, and how.
+    """
+
+    # Maximum number of messages to retrieve from any single channel (0 - no per channel limit)
+    channel_depth: int = 0
+    # Maximum number of channel histories to be fetching at once
+    concurrency: int = 8
+    # If not empty, only channels in these guilds will be back-filled
+    guild_ids: Set[int] = dataclasses.field(default_factory=set)
+    # If not empty, only these channels will be back-filled
+    channel_ids: Set[int] = dataclasses.field(default_factory=set)
+
+    def includes(self, channel: discord.abc.GuildChannel) -> bool:
+        """
+        Should the given channel be back-filled under these settings?
+
+        :param channel:
+        :return:
+        """
+        if self.guild_ids and channel.guild.id not in self.guild_ids:
+            return False
+        if self.channel_ids and channel.id not in self.channel_ids:
+            return False
+        return True
+
+
+class DiscordBackfill:
+    """
+    Fetches the recent history of a number of channels, with a bounded number of fetches at once.
+    """
+
+    _queue_depth: int
+    _config: BackfillConfig
+    _logger: logging.Logger
+
+    def __init__(self, queue_depth: int, config: BackfillConfig, logger: logging.Logger):
+        """
+        Prepare a backfill - which will retrieve, at most, queue_depth messages.
+
+        :param queue_depth: The TOTAL number of messages to retrieve.
+        :param config: Which channels to back-fill, and how.
+        :param logger: Logger to record progress and problems with.
+        """
+        self._queue_depth = queue_depth
+        self._config = config
+        self._logger = logger
+
+    @property
+    def channel_depth(self) -> int:
+        """
+        The number of messages which will be requested from each channel.
+
+        Never more than the total queue depth - we could never use more than that from any
+        single channel.
+        """
+        if self._config.channel_depth:
+            return min(self._config.channel_depth, self._queue_depth)
+        return self._queue_depth
+
+    def select_channels(
+        self, channels: Iterable[discord.abc.GuildChannel]
+    ) -> List[discord.TextChannel]:
+        """
+        Filter down to the text channels which have been selected for back-filling.
+
+        :param channels:
+        :return:
+        """
+        # Ignoring everything which is not a text channel - nothing to do with past voice
+        return [
+            channel
+            for channel in channels
+            if isinstance(channel, discord.TextChannel) and self._config.includes(channel)
+        ]
+
+    async def retrieve(
+        self, channels: Iterable[discord.abc.GuildChannel]
+    ) -> List[discord.Message]:
+        """
+        Retrieve the most recent messages across all the selected channels - oldest first.
+
+        Channel histories are merged as they stream in - so pages are only requested until the
+        newest queue_depth messages are known.
+        :param channels: All channels the client can see - will be filtered by the config.
+        :return:
+        """
+        return await self._retrieve_recent(self.select_channels(channels))
+
+    async def stream(
+        self, channels: Iterable[discord.abc.GuildChannel], resume_from: Dict[int, int]
+    ) -> AsyncGenerator[discord.Message, None]:
+        """
+        Stream the messages which should be put on the wire at startup - oldest first.
+
+        Channels with a position in resume_from have every message after that position
+        replayed - however many there are.
+        All other selected channels are back-filled from their recent history, as retrieve().
+        :param channels: All channels the client can see - will be filtered by the config.
+        :param resume_from: The id of the last message dispatched from some of the channels.
+        :return:
+        """
+        selected = self.select_channels(channels)
+
+        recent = await self._retrieve_recent([x for x in selected if x.id not in resume_from])
+
+        cursors = _after_cursors(selected, resume_from)
+        self._logger.info("Replaying missed messages from %s channels", len(cursors))
+        cursors.append((discord.Object(id=0), _iterate(recent)))
+
+        async with contextlib.aclosing(
+            merge_histories(
+                cursors, self._config.concurrency, self._logger, newest_first=False
+            )
+        ) as merged:
+            async for message in merged:
+                yield message
+
+    async def gap_fill(
+        self, channels: Iterable[discord.abc.Messageable], positions: Dict[int, int]
+    ) -> AsyncGenerator[discord.Message, None]:
+        """
+        Stream every message sent after the given positions - oldest first.
+
+        Used to recover the messages which were missed while disconnected.
+        Unlike the startup backfill, the include lists do not apply - every channel which had
+        been seen live is filled.
+        :param channels: The channels to fill the gap in.
+        :param positions: The id of the last message seen from each channel.
+        :return:
+        """
+        cursors = _after_cursors(channels, positions)
+        self._logger.info("Filling gap in %s channels", len(cursors))
+
+        async with contextlib.aclosing(
+            merge_histories(
+                cursors, self._config.concurrency, self._logger, newest_first=False
+            )
+        ) as merged:
+            async for message in merged:
+                yield message
+
+    async def _retrieve_recent(
+        self, selected: List[discord.TextChannel]
+    ) -> List[discord.Message]:
+        """
+        Retrieve the most recent queue_depth messages across the given channels - oldest first.
+
+        :param selected:
+        :return:
+        """
+        if self._queue_depth <= 0 or not selected:
+            return []
+
+        self._logger.info(
+            "Back-filling %s channels (%s at a time)", len(selected), self._config.concurrency
+        )
+
+        cursors = [
+            (channel, channel.history(limit=self.channel_depth)) for channel in selected
+        ]
+
+        past_messages: List[discord.Message] = []
+        async with contextlib.aclosing(
+            merge_histories(cursors, self._config.concurrency, self._logger)
+        ) as merged:
+            async for message in merged:
+                past_messages.append(message)
+                if len(past_messages) >= self._queue_depth:
+                    break
+
+        # Messages were merged newest first - they should go on the wire as they happened
+        past_messages.reverse()
+        return past_messages
+
+
+# A channel, and an iterator over (some of) the messages in it
+HistoryCursor = Tuple[discord.abc.Snowflake, AsyncIterator[discord.Message]]
+
+
+async def merge_histories(
+    cursors: Sequence[HistoryCursor],
+    concurrency: int,
+    logger: logging.Logger,
+    newest_first: bool = True,
+) -> AsyncGenerator[discord.Message, None]:
+    """
+    Lazily merge a number of channel histories into a single stream of messages.
+
+    Each of the histories must already be ordered (newest first, or oldest first, as given).
+    Message ids are snowflakes - so ordering on them is ordering on creation time.
+
+    py-cord's histories fetch a page of up to 100 messages at a time, and hold it until it has
+    been read - so at most one page per history is held, along with its next message here.
+    The first pages are fetched concurrently, up to the given limit. After that, each history
+    fetches its next page when the merge reaches the end of the last one - one at a time, as
+    the stream waits on each fetch.
+    :param cursors: Channels and the history iterators for them.
+    :param concurrency: The number of histories which can be fetching their first page at once.
+    :param logger: Logger to record problems with.
+    :param newest_first: The order the histories are in, and the merged stream will be in.
+    :return:
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    sign = -1 if newest_first else 1
+
+    async def _first(cursor: HistoryCursor) -> Optional[discord.Message]:
+        async with semaphore:
+            return await _advance(cursor, logger)
+
+    heads = await asyncio.gather(*(_first(cursor) for cursor in cursors))
+    heap = [
+        (sign * message.id, index, message)
+        for index, message in enumerate(heads)
+        if message is not None
+    ]
+    heapq.heapify(heap)
+
+    while heap:
+        _, index, message = heapq.heappop(heap)
+        yield message
+
+        next_message = await _advance(cursors[index], logger)
+        if next_message is not None:
+            heapq.heappush(heap, (sign * next_message.id, index, next_message))
+
+
+def _after_cursors(
+    channels: Iterable[discord.abc.Messageable], positions: Dict[int, int]
+) -> List[HistoryCursor]:
+    """
+    Cursors over every message after the given position, in each channel which has one.
+
+    :param channels:
+    :param positions: The id of the last message seen from some of the channels.
+    :return:
+    """
+    return [
+        (
+            channel,
+            channel.history(
+                limit=None, after=discord.Object(id=positions[channel.id]), oldest_first=True
+            ),
+        )
+        for channel in channels
+        if isinstance(channel, discord.abc.Snowflake) and channel.id in positions
+    ]
+
+
+async def _iterate(messages: List[discord.Message]) -> AsyncIterator[discord.Message]:
+    """
+    Present an already retrieved list of messages as a history.
+
+    :param messages:
+    :return:
+    """
+    for message in messages:
+        yield message
+
+
+async def _advance(
+    cursor: HistoryCursor, logger: logging.Logger
+) -> Optional[discord.Message]:
+    """
+    Get the next message from a channel's history - None if there are no more.
+
+    :param cursor:
+    :param logger:
+    :return:
+    """
+    channel, history = cursor
+    try:
+        return await anext(history)
+    except StopAsyncIteration:
+        return None
+    except discord.HTTPException as exp:
+        # Most likely we do not have permission to read history in this channel
+        logger.warning("Could not read history of channel %s - %s", channel.id, exp)
+        return None
@@ -0,0 +1,152 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Finds the channel to send output to, given only its id.
+
+The gateway's channel cache is used first.
+Channels which are not in it (e.g. when guild caching is reduced) are fetched over REST - and
+kept for a while, so they are not fetched again for every message.
+Ids which could not be fetched are remembered for a shorter while, so posting to a channel
+which does not exist (or cannot be seen) does not make a failing REST call every time.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional, Tuple
+
+import asyncio
+import collections
+import logging
+import time
+
+import discord
+
+
+class ChannelResolver:
+    """
+    Resolves channel ids to channels which can be sent to - from the cache, or over REST.
+
+    Fetched channels are held in an LRU cache - each entry expiring after ttl seconds.
+    Ids which could not be fetched are held as misses - expiring after negative_ttl seconds.
+    """
+
+    _client: discord.Client
+    _max_size: int
+    _ttl: float
+    _negative_ttl: float
+    _logger: logging.Logger
+
+    # Expiry time and channel - None for ids which could not be fetched - most recent last
+    _cache: collections.OrderedDict[int, Tuple[float, Optional[discord.abc.Messageable]]]
+    # Fetches in progress - so concurrent posts to a channel make only one REST call
+    _fetching: Dict[int, asyncio.Task[Optional[discord.abc.Messageable]]]
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        client: discord.Client,
+        max_size: int = 1024,
+        ttl: float = 300.0,
+        negative_ttl: float = 30.0,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """
+        Prepare an empty resolver.
+
+        :param client: Used to look up and fetch the channels.
+        :param max_size: The most fetched channels (and misses) to hold.
+        :param ttl: Seconds to hold a fetched channel for.
+        :param negative_ttl: Seconds to remember that a channel could not be fetched.
+        :param logger:
+        """
+        self._client = client
+        self._max_size = max_size
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+
+        self._cache = collections.OrderedDict()
+        self._fetching = {}
+
+    async def resolve(self, channel_id: int) -> Optional[discord.abc.Messageable]:
+        """
+        The channel with the given id - None if it does not exist, or cannot be sent to.
+
+        :param channel_id:
+        :return:
+        """
+        channel = self._client.get_channel(channel_id)
+        if isinstance(channel, discord.abc.Messageable):
+            return channel
+
+        entry = self._cache.get(channel_id)
+        if entry is not None:
+            expires, cached = entry
+            if expires > time.monotonic():
+                self._cache.move_to_end(channel_id)
+                return cached
+            del self._cache[channel_id]
+
+        fetch = self._fetching.get(channel_id)
+        if fetch is None:
+            fetch = self._fetching[channel_id] = asyncio.create_task(self._fetch(channel_id))
+            fetch.add_done_callback(lambda _: self._fetching.pop(channel_id, None))
+
+        return await asyncio.shield(fetch)
+
+    def forget(self, channel_id: int) -> None:
+        """
+        Drop anything held for the channel - e.g. after it has been deleted.
+
+        :param channel_id:
+        :return:
+        """
+        self._cache.pop(channel_id, None)
+
+    async def _fetch(self, channel_id: int) -> Optional[discord.abc.Messageable]:
+        """
+        Fetch the channel over REST - holding the result.
+
+        :param channel_id:
+        :return:
+        """
+        try:
+            fetched = await self._client.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden) as exp:
+            self._logger.warning("Cannot fetch channel %s - %s", channel_id, exp)
+            self._hold(channel_id, None, self._negative_ttl)
+            return None
+        except discord.HTTPException as exp:
+            # Might work next time - so nothing is held
+            self._logger.warning("Failed to fetch channel %s - %s", channel_id, exp)
+            return None
+
+        if not isinstance(fetched, discord.abc.Messageable):
+            self._logger.warning(
+                "Channel %s (a %s) cannot be sent to", channel_id, type(fetched).__name__
+            )
+            self._hold(channel_id, None, self._negative_ttl)
+            return None
+
+        self._hold(channel_id, fetched, self._ttl)
+        return fetched
+
+    def _hold(
+        self, channel_id: int, channel: Optional[discord.abc.Messageable], ttl: float
+    ) -> None:
+        """
+        Hold a channel (or a miss) - evicting the least recently used entry if full.
+
+        :param channel_id:
+        :param channel:
+        :param ttl:
+        :return:
+        """
+        if ttl <= 0 or self._max_size <= 0:
+            return
+
+        self._cache[channel_id] = (time.monotonic() + ttl, channel)
+        self._cache.move_to_end(channel_id)
+        while len(self._cache) > self._max_size:
+            self._cache.popitem(last=False)
@@ -0,0 +1,971 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+The py-cord client which turns discord gateway events into mewbot input events.
+"""
+
+from __future__ import annotations
+
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import asyncio
+import contextlib
+import dataclasses
+import logging
+
+import discord
+from mewbot.api.v1 import InputEvent, InputQueue
+
+from mewbot.io.discord.backfill import BackfillConfig, DiscordBackfill
+from mewbot.io.discord.cursors import ChannelCursors
+from mewbot.io.discord.edits import EditDebouncer
+from mewbot.io.discord.events import (
+    DiscordCompactMessageCreationEvent,
+    DiscordCompactMessageDeleteInputEvent,
+    DiscordCompactMessageEditInputEvent,
+    DiscordInputEvent,
+    DiscordMessageCreationEvent,
+    DiscordMessageDeleteInputEvent,
+    DiscordMessageEditInputEvent,
+    DiscordMessageSnapshot,
+    DiscordRawMessageDeleteInputEvent,
+    DiscordRawMessageEditInputEvent,
+    DiscordUserJoinInputEvent,
+)
+from mewbot.io.discord.filters import DiscordEventFilter
+from mewbot.io.discord.ingress import IngressBuffer
+from mewbot.io.discord.intents import (
+    CHUNKING_INTENTS,
+    MEMBER_CACHE_INTENTS,
+    member_cache_flags_from_names,
+)
+from mewbot.io.discord.metrics import DiscordMetrics
+from mewbot.io.discord.tracing import EventTracer, received_key
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheConfig:
+    """
+    How much of what discord sends the client holds on to.
+
+    The message cache, the member cache and requesting every member on connecting dominate the
+    client's memory use - and the last dominates the time taken to become ready in large guilds.
+    """
+
+    # The most messages to hold - edits and deletes of older messages are not seen.
+    # None for no message cache at all
+    max_messages: Optional[int] = 1000
+    # The members to cache - names of discord.MemberCacheFlags. None to decide from the intents
+    member_cache: Optional[Tuple[str, ...]] = None
+    # Request every member of each guild on connecting - None to if the members intent is on
+    chunk_guilds_at_startup: Optional[bool] = None
+
+    def needed_intents(self) -> Dict[str, List[str]]:
+        """
+        The intents which have to be enabled for these settings - with the reasons why.
+        """
+        reasons: Dict[str, List[str]] = {}
+        for flag in self.member_cache or ():
+            for name in MEMBER_CACHE_INTENTS.get(flag, ()):
+                reasons.setdefault(name, []).append(f"caching {flag} members")
+        if self.chunk_guilds_at_startup:
+            for name in CHUNKING_INTENTS:
+                reasons.setdefault(name, []).append("chunking guilds at startup")
+        return reasons
+
+    def client_options(self) -> Dict[str, Any]:
+        """
+        The options to pass to discord.Client.
+        """
+        options: Dict[str, Any] = {"max_messages": self.max_messages}
+        if self.member_cache is not None:
+            options["member_cache_flags"] = member_cache_flags_from_names(self.member_cache)
+        if self.chunk_guilds_at_startup is not None:
+            options["chunk_guilds_at_startup"] = self.chunk_guilds_at_startup
+        return options
+
+
+@dataclasses.dataclass(frozen=True)
+class ShardConfig:
+    """
+    Which gateway shards to run - discord requires sharding for bots in over 2500 guilds.
+    """
+
+    # The total number of shards the bot is split into - None to use the number discord suggests
+    shard_count: Optional[int] = None
+    # The shards to run in this process - None for all of them
+    shard_ids: Optional[Tuple[int, ...]] = None
+
+    def client_options(self) -> Dict[str, Any]:
+        """
+        The options to pass to discord.AutoShardedClient.
+        """
+        assert (
+            self.shard_ids is None or self.shard_count is not None
+        ), "shard_count must be given along with shard_ids"
+
+        options: Dict[str, Any] = {}
+        if self.shard_count is not None:
+            options["shard_count"] = self.shard_count
+        if self.shard_ids is not None:
+            options["shard_ids"] = list(self.shard_ids)
+        return options
+
+
+class InternalMewbotDiscordClient(discord.Client):
+    """
+    Discord.Client with overrode methods to actually interact with mewbot.
+
+    In particular, methods have been overridden to write events to the InputQueue when they occur.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # The client carries the state needed to keep the stream of events complete across restarts
+    # and reconnects - on top of the settings passed in from the DiscordInput.
+
+    _logger: logging.Logger
+    _startup_queue_depth: int
+    _backfill_config: BackfillConfig
+    _cursors: ChannelCursors
+    _event_filter: DiscordEventFilter
+    _clean_message_text: bool
+    _compact_events: bool
+    # Produce edit and delete events from the raw gateway events - not only for cached messages
+    _raw_message_events: bool
+    # Drop edits which leave the content as it was - e.g. link embeds resolving
+    _suppress_unchanged_edits: bool
+    # Merges bursts of edits to a message - None to put each edit on the wire as it comes
+    _edits: Optional[EditDebouncer]
+    # Buffers live events on their way to the queue - None to put them straight onto it
+    _ingress: Optional[IngressBuffer]
+    # Where events received, filtered and put on the wire are counted - None to not count them
+    _metrics: Optional[DiscordMetrics]
+    # Stamps messages as they are received and put on the queue - None to not trace them
+    _tracer: Optional[EventTracer]
+    # The first message seen live from each channel - replays stop short of these
+    _live_floor: Dict[int, int]
+    # The newest message seen from each channel - even if it is not yet on the InputQueue
+    _seen: Dict[int, int]
+    # Has the startup backfill been run? If so, later on_ready calls are reconnects
+    _backfilled: bool
+    # Positions in each channel when its shard lost its connection to discord - keyed by shard
+    _gap_from: Dict[int, Dict[int, int]]
+    # Run as the client closes - e.g. to send output still held back
+    _close_hooks: List[Callable[[], Awaitable[None]]]
+
+    queue: Optional[InputQueue]
+
+    def __init__(self, **options: Any) -> None:
+        """
+        Initialise the client - options are passed through to discord.Client.
+
+        :param options:
+        """
+        super().__init__(**options)
+
+        self._live_floor = {}
+        self._seen = {}
+        self._backfilled = False
+        self._gap_from = {}
+        self._close_hooks = []
+        self._ingress = None
+        self._raw_message_events = False
+        self._suppress_unchanged_edits = False
+        self._edits = None
+        self._metrics = None
+        self._tracer = None
+
+    def dispatch(self, event: str, *args: Any, **kwargs: Any) -> None:
+        """
+        Count each event from the gateway, before passing it on to the handlers.
+
+        :param event:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        if self._metrics is not None:
+            self._metrics.gateway_events.inc(event)
+        if self._tracer is not None:
+            key = received_key(event, args)
+            if key is not None:
+                self._tracer.received(key)
+        super().dispatch(event, *args, **kwargs)
+
+    async def on_ready(self) -> None:
+        """
+        Called after the bot has connected to discord.
+
+        On the first connection, old messages are retrieved.
+        This is also called after any reconnect which could not resume the previous session -
+        in which case only the messages missed while disconnected are retrieved.
+        """
+        self._logger.info("%s has connected to Discord!", self.user)
+
+        if self._backfilled:
+            await self.fill_gap()
+            return
+
+        self._backfilled = True
+        await self.retrieve_old_message()
+
+    async def on_disconnect(self) -> None:
+        """
+        Called when the connection to discord has been lost.
+
+        Records where each channel was up to - so the gap can be filled after reconnecting.
+        """
+        self._logger.info("Disconnected from Discord")
+        self._note_disconnect()
+
+    async def on_resumed(self) -> None:
+        """
+        Called when the previous session has been resumed.
+
+        Discord replays everything missed in the session - so there is no gap to fill.
+        """
+        self._logger.info("Resumed session with Discord")
+
+        self._gap_from.pop(0, None)
+
+    def _note_disconnect(self, shard_id: int = 0) -> None:
+        """
+        Record where each of a shard's channels was up to when it lost its connection.
+
+        Channels on other shards are still live - so their floors are kept.
+        Messages seen, but still waiting to be put on the InputQueue, count as received - the
+        cursors only move on once they are delivered.
+        :param shard_id:
+        :return:
+        """
+        positions = self._cursors.positions()
+        for channel_id, message_id in self._seen.items():
+            positions[channel_id] = max(message_id, positions.get(channel_id, 0))
+        channels = self._shard_channels(shard_id, positions)
+
+        # Keep the earliest positions if the connection drops repeatedly before the gap is filled
+        if shard_id not in self._gap_from:
+            self._gap_from[shard_id] = channels
+        for channel_id in self._shard_channels(shard_id, self._live_floor):
+            del self._live_floor[channel_id]
+
+    def _shard_channels(self, shard_id: int, positions: Dict[int, int]) -> Dict[int, int]:
+        """
+        The positions, of those given, in channels served by the shard.
+
+        An unsharded client serves every channel from the one shard.
+        :param shard_id:
+        :param positions: Keyed by channel id.
+        :return:
+        """
+        del shard_id
+        return dict(positions)
+
+    def add_close_hook(self, hook: Callable[[], Awaitable[None]]) -> None:
+        """
+        Run the hook as the client closes - while it can still send to discord.
+
+        :param hook:
+        :return:
+        """
+        self._close_hooks.append(hook)
+
+    async def close(self) -> None:
+        """
+        Run the close hooks - then close the connection to discord.
+        """
+        hooks, self._close_hooks = self._close_hooks, []
+        for hook in hooks:
+            try:
+                await hook()
+            except Exception:  # pylint: disable=broad-except
+                self._logger.exception("Failed to run close hook %s", hook)
+
+        await super().close()
+
+    def shard_latencies(self) -> Dict[int, float]:
+        """
+        The latest heartbeat latency, in seconds, of each shard the client is running.
+
+        An unsharded client runs the one shard.
+        """
+        return {self.shard_id or 0: self.latency}
+
+    def gateway_parsers(self) -> Dict[str, Callable[[Any], None]]:
+        """
+        The functions py-cord parses each gateway dispatch with - keyed by event name.
+
+        Each updates the cache from the payload, and dispatches the event to the handlers.
+        The gateway takes these on connecting - so replacing them afterwards has no effect.
+        """
+        parsers: Dict[str, Callable[[Any], None]] = self._connection.parsers
+        return parsers
+
+    async def flush_edits(self) -> None:
+        """
+        Put the edits being debounced on the wire now - e.g. as the input stops.
+        """
+        if self._edits is not None:
+            await self._edits.flush()
+
+    async def drain(self) -> None:
+        """
+        Put every event still held back on the wire - edits being debounced, and the ingress.
+
+        For when no more events will come from the gateway - e.g. at the end of a replay.
+        """
+        await self.flush_edits()
+        while self._ingress is not None and len(self._ingress):
+            await asyncio.sleep(0.01)
+
+    async def fill_gap(self, shard_ids: Optional[Iterable[int]] = None) -> None:
+        """
+        Retrieve and transmit every message sent while the bot was disconnected.
+
+        Only channels which had been seen before the disconnect are filled.
+        :param shard_ids: The shards to fill the gaps of - every shard with a gap if None.
+        :return:
+        """
+        positions: Dict[int, int] = {}
+        for shard_id in list(self._gap_from) if shard_ids is None else shard_ids:
+            positions.update(self._gap_from.pop(shard_id, {}))
+
+        # Might want to, instead, wait for a queue
+        if not positions or not self.queue:
+            return
+
+        channels = [
+            channel
+            for channel in (self.get_channel(channel_id) for channel_id in positions)
+            if isinstance(channel, discord.abc.Messageable)
+        ]
+
+        backfill = DiscordBackfill(0, self._backfill_config, self._logger)
+        with self._timing_backfill("gap"):
+            async with contextlib.aclosing(backfill.gap_fill(channels, positions)) as missed:
+                async for message in missed:
+                    await self._put_past_message(message)
+
+    async def retrieve_old_message(self) -> None:
+        """
+        If a startup_queue_depth is set, then retrieve that number of entries and transmit them.
+
+        Channels with a stored position instead have every message after it transmitted.
+        The entries are transmitted in the order they were originally sent.
+        """
+        resume_from = self._cursors.loaded
+
+        if not self._startup_queue_depth and not resume_from:
+            return
+
+        # Might want to, instead, wait for a queue
+        if not self.queue:
+            return
+
+        self._logger.info(
+            "Retrieving %s old messages, and resuming %s channels",
+            self._startup_queue_depth,
+            len(resume_from),
+        )
+
+        backfill = DiscordBackfill(
+            self._startup_queue_depth, self._backfill_config, self._logger
+        )
+        with self._timing_backfill("startup"):
+            async with contextlib.aclosing(
+                backfill.stream(self.get_all_channels(), resume_from)
+            ) as past_messages:
+                async for message in past_messages:
+                    await self._put_past_message(message)
+
+    def _timing_backfill(self, kind: str) -> ContextManager[None]:
+        """
+        Time a backfill of the given kind - if there are metrics.
+
+        :param kind: "startup" or "gap".
+        :return:
+        """
+        if self._metrics is None:
+            return contextlib.nullcontext()
+        return self._metrics.backfill_seconds.time(kind)
+
+    async def _queue_put(self, event: InputEvent) -> None:
+        """
+        Put an event on the InputQueue - timing the wait, if there are metrics.
+
+        :param event:
+        :return:
+        """
+        assert self.queue is not None
+
+        if self._metrics is None:
+            await self.queue.put(event)
+        else:
+            with self._metrics.queue_put_seconds.time():
+                await self.queue.put(event)
+
+        if self._tracer is not None:
+            self._tracer.enqueued(event)
+
+    async def _put_past_message(self, message: discord.Message) -> None:
+        """
+        Transmit a message retrieved from a channel's history.
+
+        :param message:
+        :return:
+        """
+        if not self.queue:
+            return
+
+        if not isinstance(message, discord.Message):
+            self._logger.info("Expected a message and got a %s", type(message))
+
+        if not self._admits_message(message, "history"):
+            return
+
+        # Already put on the wire by on_message while the history was being retrieved
+        floor = self._live_floor.get(message.channel.id)
+        if floor is not None and message.id >= floor:
+            return
+
+        self._note_seen(message)
+        await self._queue_put(self._creation_event(message, message.content))
+        self._cursors.note(message.channel.id, message.id)
+
+    @property
+    def _self_id(self) -> Optional[int]:
+        """
+        The user id of this bot - None if not yet logged in.
+        """
+        user = self._connection.user
+        return user.id if user is not None else None
+
+    def _admits_message(self, message: discord.Message, event: str) -> bool:
+        """
+        Should an event about the given message be put on the wire?
+
+        Only looks at ids - so is cheap compared to building an event.
+        :param message:
+        :param event: The gateway event - events held back are counted by it.
+        :return:
+        """
+        channel = message.channel
+        guild = message.guild
+        author = message.author
+        admitted = self._event_filter.admits(
+            guild.id if guild is not None else None,
+            channel.id,
+            getattr(channel, "parent_id", None),
+            author_id=author.id,
+            author_is_bot=author.bot,
+            self_id=self._self_id,
+        )
+        return admitted or self._filtered(event)
+
+    def _filtered(self, event: str) -> bool:
+        """
+        Count an event held back by the filter - if there are metrics.
+
+        :param event:
+        :return: False - as the event was not admitted.
+        """
+        if self._metrics is not None:
+            self._metrics.filtered_events.inc(event)
+        return False
+
+    def _admits_raw(
+        self,
+        guild_id: Optional[int],
+        channel_id: int,
+        author: Optional[Tuple[int, bool]],
+        event: str,
+    ) -> bool:
+        """
+        Should an event built from a raw gateway event be put on the wire?
+
+        :param guild_id:
+        :param channel_id:
+        :param author: The id of the message's author, and if they are a bot - if known.
+        :param event: The gateway event - events held back are counted by it.
+        :return:
+        """
+        parent_id = getattr(self.get_channel(channel_id), "parent_id", None)
+        if not self._event_filter.admits_place(guild_id, channel_id, parent_id):
+            return self._filtered(event)
+
+        # An unknown author can only be held back by a list of the authors to allow
+        if author is None:
+            admitted = not self._event_filter.allowed_authors
+        else:
+            admitted = self._event_filter.admits_author(author[0], author[1], self._self_id)
+        return admitted or self._filtered(event)
+
+    @staticmethod
+    def _raw_author(
+        data: Dict[str, Any], cached: Optional[discord.Message]
+    ) -> Optional[Tuple[int, bool]]:
+        """
+        The id of a message's author, and if they are a bot - from the cache, or the payload.
+
+        :param data: The gateway payload - edits usually include the author.
+        :param cached: The message, if it was in the cache.
+        :return: None if neither says.
+        """
+        if cached is not None:
+            return cached.author.id, cached.author.bot
+
+        author = data.get("author")
+        if not author:
+            return None
+        return int(author["id"]), bool(author.get("bot", False))
+
+    def _creation_event(
+        self, message: discord.Message, text: Optional[str] = None
+    ) -> DiscordInputEvent:
+        """
+        Build the event for a new message - compact, or holding the message.
+
+        :param message:
+        :param text: The text of the message - if None, it is worked out as configured.
+        :return:
+        """
+        if not self._compact_events:
+            if text is None:
+                return DiscordMessageCreationEvent.from_message(
+                    message, self._clean_message_text
+                )
+            return DiscordMessageCreationEvent(
+                text=text, message=message, clean_text=self._clean_message_text
+            )
+
+        if text is None:
+            text = str(message.clean_content) if self._clean_message_text else message.content
+        return DiscordCompactMessageCreationEvent(
+            text=text, snapshot=DiscordMessageSnapshot.from_message(message), client=self
+        )
+
+    def _edit_event(
+        self, before: discord.Message, after: discord.Message
+    ) -> DiscordInputEvent:
+        """
+        Build the event for an edited message - compact, or holding the messages.
+
+        :param before:
+        :param after:
+        :return:
+        """
+        if not self._compact_events:
+            return DiscordMessageEditInputEvent(
+                text_before=before.content,
+                message_before=before,
+                text_after=after.content,
+                message_after=after,
+            )
+
+        return DiscordCompactMessageEditInputEvent(
+            text_before=before.content,
+            text_after=after.content,
+            snapshot=DiscordMessageSnapshot.from_message(after),
+            client=self,
+        )
+
+    def _delete_event(self, message: discord.Message) -> DiscordInputEvent:
+        """
+        Build the event for a deleted message - compact, or holding the message.
+
+        :param message:
+        :return:
+        """
+        if not self._compact_events:
+            return DiscordMessageDeleteInputEvent(
+                text_before=message.content, message=message
+            )
+
+        return DiscordCompactMessageDeleteInputEvent(
+            text_before=message.content, snapshot=DiscordMessageSnapshot.from_message(message)
+        )
+
+    async def _put_live_event(self, event: InputEvent) -> None:
+        """
+        Transmit an event received from the gateway - via the ingress buffer, if there is one.
+
+        :param event:
+        :return:
+        """
+        if self._ingress is not None:
+            self._ingress.put(event)
+            return
+
+        if self.queue:
+            await self._queue_put(event)
+
+    async def _put_edit(self, event: InputEvent) -> None:
+        """
+        Transmit an edit - via the debouncer, if there is one.
+
+        :param event:
+        :return:
+        """
+        if self._edits is not None:
+            await self._edits.add(event)
+            return
+
+        await self._put_live_event(event)
+
+    async def on_message(self, message: discord.Message) -> None:
+        """
+        Check for acceptance on all commands - execute the first one that matches.
+
+        :param message:
+        :return:
+        """
+        if not self.queue or not self._admits_message(message, "message"):
+            return
+
+        self._live_floor.setdefault(message.channel.id, message.id)
+        self._note_seen(message)
+
+        await self._put_live_event(self._creation_event(message))
+        # Through the ingress buffer, the message may yet be shed - see note_delivered
+        if self._ingress is None:
+            self._cursors.note(message.channel.id, message.id)
+
+    def _note_seen(self, message: discord.Message) -> None:
+        """
+        Record a message as received - before it waits for room in the ingress buffer or queue.
+
+        :param message:
+        :return:
+        """
+        channel_id = message.channel.id
+        self._seen[channel_id] = max(message.id, self._seen.get(channel_id, 0))
+
+    def note_delivered(self, event: InputEvent) -> None:
+        """
+        Record a channel's position once a new message from it is on the InputQueue.
+
+        Called by the ingress buffer's pump - so messages it sheds do not move the cursors on.
+        :param event:
+        :return:
+        """
+        if isinstance(event, DiscordMessageCreationEvent):
+            self._cursors.note(event.message.channel.id, event.message.id)
+        elif isinstance(event, DiscordCompactMessageCreationEvent):
+            self._cursors.note(event.snapshot.channel_id, event.snapshot.message_id)
+
+    async def on_member_join(self, member: discord.Member) -> None:
+        """
+        Triggered when a member joins one of the guilds that the bot is monitoring.
+        """
+        if not self._event_filter.admits_guild(
+            member.guild.id
+        ) or not self._event_filter.admits_author(member.id, member.bot, self._self_id):
+            self._filtered("member_join")
+            return
+
+        self._logger.info(
+            'New member "%s" has been detected joining"%s"',
+            str(member.mention),
+            str(member.guild.name),
+        )
+
+        if not self.queue:
+            return
+
+        await self._put_live_event(DiscordUserJoinInputEvent(member=member))
+
+    async def on_message_edit(self, before: discord.Message, after: discord.Message) -> None:
+        """
+        Triggered when a message is edited on any of the channels which the bot is monitoring.
+
+        Only called for messages in the message cache - see on_raw_message_edit.
+        :param before: The message before the edit
+        :param after: The message after the edit
+        """
+        if self._raw_message_events or not self._admits_message(after, "message_edit"):
+            return
+
+        if self._suppress_unchanged_edits and before.content == after.content:
+            return
+
+        self._logger.debug("Message edit - %s changed to %s", before.content, after.content)
+
+        if not self.queue:
+            return
+
+        await self._put_edit(self._edit_event(before, after))
+
+    async def on_message_delete(self, message: discord.Message) -> None:
+        """
+        Triggered when a message is deleted on any of the channels which the bot is monitoring.
+
+        Only called for messages in the message cache - see on_raw_message_delete.
+        :param message: The message before the delete event occurred.
+        """
+        if self._raw_message_events or not self._admits_message(message, "message_delete"):
+            return
+
+        self._logger.info(
+            "Message delete - %s has deleted a message with content %s",
+            message.author,
+            message.content,
+        )
+
+        if not self.queue:
+            return
+
+        await self._put_live_event(self._delete_event(message))
+
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent) -> None:
+        """
+        Triggered when any message is edited - whether or not it is in the message cache.
+
+        Only used if raw message events are enabled.
+        :param payload: The gateway payload, and the message before the edit if it was cached.
+        """
+        if not self._raw_message_events:
+            return
+
+        cached = payload.cached_message
+        data: Dict[str, Any] = dict(payload.data)
+        content = data.get("content")
+        # The content is only sent when it changed - but may be sent unchanged alongside embeds
+        if self._suppress_unchanged_edits and (
+            content is None or (cached is not None and cached.content == content)
+        ):
+            return
+
+        author = self._raw_author(data, cached)
+        if not self._admits_raw(
+            payload.guild_id, payload.channel_id, author, "raw_message_edit"
+        ):
+            return
+
+        self._logger.debug(
+            "Raw message edit - %s in channel %s", payload.message_id, payload.channel_id
+        )
+
+        if not self.queue:
+            return
+
+        await self._put_edit(
+            DiscordRawMessageEditInputEvent(
+                message_id=payload.message_id,
+                channel_id=payload.channel_id,
+                guild_id=payload.guild_id,
+                text_after=content if isinstance(content, str) else None,
+                text_before=cached.content if cached is not None else None,
+                author_id=author[0] if author is not None else None,
+                message_before=None if self._compact_events else cached,
+            )
+        )
+
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
+        """
+        Triggered when any message is deleted - whether or not it is in the message cache.
+
+        Only used if raw message events are enabled.
+        :param payload: The ids of the message, and the message itself if it was cached.
+        """
+        if not self._raw_message_events:
+            return
+
+        await self._put_raw_delete(
+            payload.message_id, payload.channel_id, payload.guild_id, payload.cached_message
+        )
+
+    async def on_raw_bulk_message_delete(
+        self, payload: discord.RawBulkMessageDeleteEvent
+    ) -> None:
+        """
+        Triggered when many messages are deleted at once - e.g. by a moderator purging a channel.
+
+        Only used if raw message events are enabled - each message gets a delete event.
+        :param payload: The ids of the messages, and those messages which were cached.
+        """
+        if not self._raw_message_events:
+            return
+
+        cached = {message.id: message for message in payload.cached_messages}
+        for message_id in sorted(payload.message_ids):
+            await self._put_raw_delete(
+                message_id, payload.channel_id, payload.guild_id, cached.get(message_id)
+            )
+
+    async def _put_raw_delete(
+        self,
+        message_id: int,
+        channel_id: int,
+        guild_id: Optional[int],
+        cached: Optional[discord.Message],
+    ) -> None:
+        """
+        Transmit the event for a deleted message - built from ids, and the cache if possible.
+
+        :param message_id:
+        :param channel_id:
+        :param guild_id:
+        :param cached: The message, if it was in the cache.
+        :return:
+        """
+        author = self._raw_author({}, cached)
+        if not self._admits_raw(guild_id, channel_id, author, "raw_message_delete"):
+            return
+
+        self._logger.info("Raw message delete - %s in channel %s", message_id, channel_id)
+
+        if not self.queue:
+            return
+
+        await self._put_live_event(
+            DiscordRawMessageDeleteInputEvent(
+                message_id=message_id,
+                channel_id=channel_id,
+                guild_id=guild_id,
+                text_before=cached.content if cached is not None else None,
+                author_id=author[0] if author is not None else None,
+                message=None if self._compact_events else cached,
+            )
+        )
+
+
+class InternalMewbotShardedDiscordClient(
+    InternalMewbotDiscordClient, discord.AutoShardedClient
+):  # pylint: disable=too-many-ancestors
+    """
+    InternalMewbotDiscordClient running several gateway shards, in the one process.
+
+    Each shard is a separate connection to discord - which can drop, resume and reconnect on its
+    own. Gaps are recorded per shard, so one shard resuming does not forget another's gap - and
+    only the channels of shards which had to identify again are filled.
+    """
+
+    # Shards which have identified since the last ready - their gaps are filled on the next
+    _identified_shards: Set[int]
+
+    def __init__(self, **options: Any) -> None:
+        """
+        Initialise the client - options are passed through to discord.AutoShardedClient.
+
+        :param options:
+        """
+        super().__init__(**options)
+
+        self._identified_shards = set()
+
+    async def on_disconnect(self) -> None:
+        """
+        Called as any shard loses its connection - handled by on_shard_disconnect.
+        """
+
+    async def on_resumed(self) -> None:
+        """
+        Called as any shard resumes its session - handled by on_shard_resumed.
+        """
+
+    async def on_shard_connect(self, shard_id: int) -> None:
+        """
+        Called when a shard has identified - with a new session, so anything missed is lost.
+
+        The shards identifying at startup have nothing to fill - the startup backfill runs.
+        :param shard_id:
+        """
+        if self._backfilled:
+            self._identified_shards.add(shard_id)
+
+    async def on_shard_ready(self, shard_id: int) -> None:
+        """
+        Called when a shard has connected and received its guilds.
+
+        :param shard_id:
+        """
+        self._logger.info(
+            "Shard %s is ready - latency %s", shard_id, self._shard_latency(shard_id)
+        )
+
+    async def on_shard_disconnect(self, shard_id: int) -> None:
+        """
+        Called when a shard has lost its connection.
+
+        :param shard_id:
+        """
+        self._logger.info("Shard %s disconnected from Discord", shard_id)
+
+        self._note_disconnect(shard_id)
+
+    async def on_shard_resumed(self, shard_id: int) -> None:
+        """
+        Called when a shard has resumed its session - so has missed nothing.
+
+        Only this shard's gap is forgotten - any other shard may still be disconnected.
+        Shards which had to identify again instead have their gaps filled when on_ready is called.
+        :param shard_id:
+        """
+        self._logger.info(
+            "Shard %s resumed session with Discord - latency %s",
+            shard_id,
+            self._shard_latency(shard_id),
+        )
+
+        self._gap_from.pop(shard_id, None)
+
+    async def fill_gap(self, shard_ids: Optional[Iterable[int]] = None) -> None:
+        """
+        Retrieve and transmit every message missed by the shards which identified again.
+
+        Shards still disconnected, or which resumed, are left alone.
+        :param shard_ids: The shards to fill the gaps of - those which identified again if None.
+        :return:
+        """
+        if shard_ids is None:
+            shard_ids, self._identified_shards = self._identified_shards, set()
+        await super().fill_gap(shard_ids)
+
+    def _shard_channels(self, shard_id: int, positions: Dict[int, int]) -> Dict[int, int]:
+        """
+        The positions, of those given, in channels served by the shard.
+
+        Channels not in the cache cannot be placed on a shard - so are left out.
+        Direct messages are served by shard 0.
+        :param shard_id:
+        :param positions: Keyed by channel id.
+        :return:
+        """
+        served: Dict[int, int] = {}
+        for channel_id, position in positions.items():
+            channel = self.get_channel(channel_id)
+            if channel is None:
+                continue
+            guild = getattr(channel, "guild", None)
+            if (guild.shard_id if guild is not None else 0) == shard_id:
+                served[channel_id] = position
+        return served
+
+    def shard_latencies(self) -> Dict[int, float]:
+        """
+        The latest heartbeat latency, in seconds, of each shard the client is running.
+        """
+        return dict(self.latencies)
+
+    def _shard_latency(self, shard_id: int) -> str:
+        """
+        The latency of a shard, for logging.
+
+        :param shard_id:
+        :return:
+        """
+        latency = self.shard_latencies().get(shard_id)
+        return f"{latency * 1000:.0f}ms" if latency is not None else "unknown"
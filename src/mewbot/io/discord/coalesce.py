@@ -0,0 +1,264 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Merges bursts of small output messages to a channel into fewer, larger messages.
+
+Each message sent costs a REST call and a rate limit slot.
+Texts sent to the same channel within a short window are joined into one message - up to
+discord's length limit, and split cleanly beyond it.
+"""
+
+from __future__ import annotations
+
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import asyncio
+import dataclasses
+import logging
+
+from mewbot.io.discord.events import DiscordOutputEvent
+
+# The longest message discord will accept
+MESSAGE_LIMIT = 2000
+
+# Where output is going - the channel, and the message being replied to (if any)
+OutputTarget = Tuple[int, Optional[int]]
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Split text into pieces no longer than the limit - at line breaks or spaces, where possible.
+
+    :param text:
+    :param limit:
+    :return:
+    """
+    pieces: List[str] = []
+
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            pieces.append(text[:limit])
+            text = text[limit:]
+            continue
+
+        pieces.append(text[:cut])
+        # Drop the break itself - it would otherwise start the next message
+        after_break = cut + 1
+        text = text[after_break:]
+
+    pieces.append(text)
+    return pieces
+
+
+@dataclasses.dataclass
+class _Pending:
+    """
+    Output waiting to be sent to a channel.
+    """
+
+    target: OutputTarget
+    # The first event - the merged messages are sent as copies of it
+    event: DiscordOutputEvent
+    texts: List[str]
+    length: int
+    timer: Optional[asyncio.Task[None]] = None
+
+
+class OutputCoalescer:
+    """
+    Holds output for a short window, joining texts sent to the same target into one message.
+
+    Only one target is held per channel - output to a different target in the same channel
+    (e.g. a reply to another message) sends what is held first, so order is kept.
+    Sends to a channel are chained - each starts once the one before it has finished, so a
+    slow send cannot be overtaken by a later window closing.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # The settings, and the held output, sends and timers of each channel.
+
+    _window: float
+    _separator: str
+    _limit: int
+    _send: Callable[[DiscordOutputEvent], Awaitable[bool]]
+    _logger: logging.Logger
+
+    _pending: Dict[int, _Pending]
+    # The latest send to each channel - the next waits for it to finish
+    _sending: Dict[int, asyncio.Task[None]]
+    # Every timer still running - held, as the event loop only keeps weak references to tasks
+    _timers: Set[asyncio.Task[None]]
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        window: float,
+        send: Callable[[DiscordOutputEvent], Awaitable[bool]],
+        separator: str = "\n",
+        limit: int = MESSAGE_LIMIT,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """
+        Prepare the coalescer.
+
+        :param window: Seconds to hold output for, from the first text, before sending it.
+        :param send: Called to send each merged event.
+        :param separator: Placed between joined texts.
+        :param limit: The longest message which can be sent.
+        :param logger:
+        """
+        assert window > 0, "Coalescing needs a window to hold output for"
+
+        self._window = window
+        self._separator = separator
+        self._limit = limit
+        self._send = send
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+
+        self._pending = {}
+        self._sending = {}
+        self._timers = set()
+
+    async def add(self, target: OutputTarget, event: DiscordOutputEvent) -> None:
+        """
+        Hold an event's text to be sent to the target - with any other text sent there soon.
+
+        :param target: The channel, and the message being replied to (if any).
+        :param event:
+        :return:
+        """
+        channel_id = target[0]
+        pending = self._pending.get(channel_id)
+
+        if pending is not None and (
+            pending.target == target
+            and pending.length + len(self._separator) + len(event.text) <= self._limit
+        ):
+            pending.texts.append(event.text)
+            pending.length += len(self._separator) + len(event.text)
+            return
+
+        # Hold the new text before sending the old - so anything added meanwhile follows it
+        full = self._take(channel_id)
+        pending = self._pending[channel_id] = _Pending(
+            target, event, [event.text], len(event.text)
+        )
+        pending.timer = asyncio.create_task(self._flush_later(channel_id, pending))
+        self._timers.add(pending.timer)
+        pending.timer.add_done_callback(self._timers.discard)
+
+        if full is not None:
+            await self._send_in_turn(full)
+
+    async def flush(self, channel_id: Optional[int] = None) -> None:
+        """
+        Send the output held for a channel now - or for every channel.
+
+        Returns once everything sent to the channels so far has been - e.g. before shutting down.
+        :param channel_id:
+        :return:
+        """
+        channel_ids = list(self._pending) if channel_id is None else [channel_id]
+
+        for held in channel_ids:
+            pending = self._take(held)
+            if pending is not None:
+                self._chain(pending)
+
+        if channel_id is None:
+            sending = list(self._sending.values())
+        else:
+            sending = [self._sending[channel_id]] if channel_id in self._sending else []
+        if sending:
+            await asyncio.wait(sending)
+
+    def _take(self, channel_id: int) -> Optional[_Pending]:
+        """
+        Remove the output held for a channel - stopping its timer.
+
+        :param channel_id:
+        :return:
+        """
+        pending = self._pending.pop(channel_id, None)
+        if (
+            pending is not None
+            and pending.timer is not None
+            and pending.timer is not asyncio.current_task()
+        ):
+            pending.timer.cancel()
+        return pending
+
+    async def _flush_later(self, channel_id: int, pending: _Pending) -> None:
+        """
+        Send the output held for a channel once the window has passed.
+
+        :param channel_id:
+        :param pending: What was held when the window opened - it may since have been sent.
+        :return:
+        """
+        await asyncio.sleep(self._window)
+        if self._pending.get(channel_id) is pending:
+            await self.flush(channel_id)
+
+    def _chain(self, pending: _Pending) -> asyncio.Task[None]:
+        """
+        Send held output once the sends to its channel before it have finished.
+
+        :param pending:
+        :return: The task sending it.
+        """
+        channel_id = pending.target[0]
+        before = self._sending.get(channel_id)
+        sending = asyncio.create_task(self._send_after(before, pending))
+        self._sending[channel_id] = sending
+
+        def finished(task: asyncio.Task[None]) -> None:
+            if self._sending.get(channel_id) is task:
+                del self._sending[channel_id]
+
+        sending.add_done_callback(finished)
+        return sending
+
+    async def _send_in_turn(self, pending: _Pending) -> None:
+        """
+        Send held output in turn - returning once it has been sent.
+
+        :param pending:
+        :return:
+        """
+        # Shielded, so the output is still sent if whatever is waiting on it is cancelled
+        await asyncio.shield(self._chain(pending))
+
+    async def _send_after(
+        self, before: Optional[asyncio.Task[None]], pending: _Pending
+    ) -> None:
+        """
+        Wait for the previous send to the channel to finish - then send the held output.
+
+        :param before:
+        :param pending:
+        :return:
+        """
+        if before is not None:
+            await asyncio.wait([before])
+        await self._send_pending(pending)
+
+    async def _send_pending(self, pending: _Pending) -> None:
+        """
+        Send held output, as few messages as the limit allows.
+
+        :param pending:
+        :return:
+        """
+        if len(pending.texts) > 1:
+            self._logger.debug("Merged %s messages to %s", len(pending.texts), pending.target)
+
+        for text in split_message(self._separator.join(pending.texts), self._limit):
+            try:
+                await self._send(dataclasses.replace(pending.event, text=text))
+            except Exception:  # pylint: disable=broad-except
+                self._logger.exception("Failed to send merged output to %s", pending.target)
@@ -0,0 +1,160 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Keeps track of the last message put on the wire from each channel - optionally across restarts.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional, Set
+
+import asyncio
+import logging
+import sqlite3
+
+
+class ChannelCursors:
+    """
+    Records the id of the newest message which has been dispatched from each channel.
+
+    If given a path, the positions are stored in a SQLite database there.
+    Positions are written out every flush_interval seconds (and on close) - not on every
+    message - so a crash may lose the last few seconds of positions.
+    Which will result in those messages being replayed on the next startup.
+    """
+
+    _path: str
+    _flush_interval: float
+    _logger: logging.Logger
+
+    _positions: Dict[int, int]
+    _loaded: Dict[int, int]
+    _dirty: Set[int]
+    _connection: Optional[sqlite3.Connection]
+
+    def __init__(self, path: str = "", flush_interval: float = 5.0) -> None:
+        """
+        Prepare the cursors - they will not be loaded from disk until open() is called.
+
+        :param path: Path to the SQLite database to store positions in. Empty for memory only.
+        :param flush_interval: Seconds between writing the positions to disk.
+        """
+        self._path = path
+        self._flush_interval = flush_interval
+        self._logger = logging.getLogger(__name__ + "ChannelCursors")
+
+        self._positions = {}
+        self._loaded = {}
+        self._dirty = set()
+        self._connection = None
+
+    @property
+    def persistent(self) -> bool:
+        """
+        Are these positions being stored on disk?
+        """
+        return bool(self._path)
+
+    @property
+    def loaded(self) -> Dict[int, int]:
+        """
+        The positions which were read from disk when the cursors were opened.
+        """
+        return dict(self._loaded)
+
+    def positions(self) -> Dict[int, int]:
+        """
+        A copy of the current position in every channel which has one.
+        """
+        return dict(self._positions)
+
+    def open(self) -> None:
+        """
+        Connect to the database (if there is one) and load the stored positions.
+        """
+        if not self._path or self._connection is not None:
+            return
+
+        self._connection = sqlite3.connect(self._path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS channel_cursors "
+            "(channel_id INTEGER PRIMARY KEY, message_id INTEGER NOT NULL)"
+        )
+        self._connection.commit()
+
+        for channel_id, message_id in self._connection.execute(
+            "SELECT channel_id, message_id FROM channel_cursors"
+        ):
+            self._loaded[channel_id] = message_id
+            self._positions[channel_id] = max(message_id, self._positions.get(channel_id, 0))
+
+        self._logger.info(
+            "Loaded positions for %s channels from %s", len(self._loaded), self._path
+        )
+
+    def get(self, channel_id: int) -> Optional[int]:
+        """
+        The id of the newest message dispatched from the given channel - if any.
+
+        :param channel_id:
+        :return:
+        """
+        return self._positions.get(channel_id)
+
+    def note(self, channel_id: int, message_id: int) -> None:
+        """
+        Record that a message has been dispatched from a channel.
+
+        Positions only ever move forward - noting an older message has no effect.
+        :param channel_id:
+        :param message_id:
+        :return:
+        """
+        if message_id <= self._positions.get(channel_id, 0):
+            return
+
+        self._positions[channel_id] = message_id
+        self._dirty.add(channel_id)
+
+        if self._flush_interval <= 0:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write any positions which have changed to disk.
+        """
+        if self._connection is None or not self._dirty:
+            return
+
+        self._connection.executemany(
+            "INSERT INTO channel_cursors (channel_id, message_id) VALUES (?, ?) "
+            "ON CONFLICT(channel_id) DO UPDATE SET "
+            "message_id = MAX(message_id, excluded.message_id)",
+            [(channel_id, self._positions[channel_id]) for channel_id in self._dirty],
+        )
+        self._connection.commit()
+        self._dirty.clear()
+
+    async def run(self) -> None:
+        """
+        Periodically write the positions to disk - until cancelled.
+        """
+        if not self.persistent or self._flush_interval <= 0:
+            return
+
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            self.flush()
+
+    def close(self) -> None:
+        """
+        Write any outstanding positions to disk, then disconnect from the database.
+        """
+        if self._connection is None:
+            return
+
+        self.flush()
+        self._connection.close()
+        self._connection = None
@@ -0,0 +1,207 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Cuts down the number of message edit events put on the wire.
+
+Discord sends a message update whenever the link embeds of a message resolve - which reaches
+the bot as an edit, with the content unchanged.
+Users also tend to edit a message several times in quick succession.
+Unchanged edits can be dropped, and a burst of edits to one message merged into one event -
+from the text before the first edit to the text after the last.
+"""
+
+from __future__ import annotations
+
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+import asyncio
+import dataclasses
+import logging
+
+from mewbot.api.v1 import InputEvent
+
+from mewbot.io.discord.events import (
+    DiscordCompactMessageEditInputEvent,
+    DiscordMessageEditInputEvent,
+    DiscordRawMessageEditInputEvent,
+)
+
+
+def edit_key(event: InputEvent) -> Optional[int]:
+    """
+    The id of the edited message - if the event is an edit.
+
+    :param event:
+    :return:
+    """
+    if isinstance(event, DiscordMessageEditInputEvent):
+        return event.message_after.id
+    if isinstance(event, DiscordCompactMessageEditInputEvent):
+        return event.snapshot.message_id
+    if isinstance(event, DiscordRawMessageEditInputEvent):
+        return event.message_id
+    return None
+
+
+def merge_edits(earlier: InputEvent, later: InputEvent) -> InputEvent:
+    """
+    A single edit, from the message before the earlier edit to the message after the later one.
+
+    :param earlier:
+    :param later:
+    :return:
+    """
+    if isinstance(earlier, DiscordMessageEditInputEvent) and isinstance(
+        later, DiscordMessageEditInputEvent
+    ):
+        return dataclasses.replace(
+            later, text_before=earlier.text_before, message_before=earlier.message_before
+        )
+    if isinstance(earlier, DiscordCompactMessageEditInputEvent) and isinstance(
+        later, DiscordCompactMessageEditInputEvent
+    ):
+        return dataclasses.replace(later, text_before=earlier.text_before)
+    if isinstance(earlier, DiscordRawMessageEditInputEvent) and isinstance(
+        later, DiscordRawMessageEditInputEvent
+    ):
+        return dataclasses.replace(
+            later,
+            text_before=earlier.text_before,
+            message_before=earlier.message_before,
+            # The later edit may not have touched the content
+            text_after=(
+                later.text_after if later.text_after is not None else earlier.text_after
+            ),
+        )
+    return later
+
+
+def unchanged(event: InputEvent) -> bool:
+    """
+    Is the event an edit which left the message's content as it was?
+
+    Raw edits without any content are unchanged - the content is only sent when it changed.
+    :param event:
+    :return:
+    """
+    if isinstance(event, (DiscordMessageEditInputEvent, DiscordCompactMessageEditInputEvent)):
+        return event.text_before == event.text_after
+    if isinstance(event, DiscordRawMessageEditInputEvent):
+        return event.text_after is None or event.text_after == event.text_before
+    return False
+
+
+@dataclasses.dataclass
+class _PendingEdit:
+    """
+    Edits to a message, merged, waiting to be put on the wire.
+    """
+
+    event: InputEvent
+    timer: Optional[asyncio.Task[None]] = None
+
+
+class EditDebouncer:
+    """
+    Holds edits for a short window - merging further edits of the same message into them.
+
+    The window runs from the first edit - so a message being edited continuously still has its
+    edits put on the wire every window.
+    """
+
+    _window: float
+    _suppress_unchanged: bool
+    _deliver: Callable[[InputEvent], Awaitable[None]]
+    _logger: logging.Logger
+
+    _pending: Dict[int, _PendingEdit]
+    # Every timer still running - held, as the event loop only keeps weak references to tasks
+    _timers: Set[asyncio.Task[None]]
+
+    def __init__(
+        self,
+        window: float,
+        deliver: Callable[[InputEvent], Awaitable[None]],
+        suppress_unchanged: bool = False,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """
+        Prepare the debouncer.
+
+        :param window: Seconds to hold each message's edits for, from the first.
+        :param deliver: Called to put each merged edit on the wire.
+        :param suppress_unchanged: Drop merged edits which leave the content as it was - e.g.
+                                   an edit which was then reverted.
+        :param logger:
+        """
+        assert window > 0, "Debouncing needs a window to hold edits for"
+
+        self._window = window
+        self._suppress_unchanged = suppress_unchanged
+        self._deliver = deliver
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+
+        self._pending = {}
+        self._timers = set()
+
+    async def add(self, event: InputEvent) -> None:
+        """
+        Hold an edit - merging it with any edit to the same message being held.
+
+        Events which are not edits are put on the wire straight away.
+        :param event:
+        :return:
+        """
+        key = edit_key(event)
+        if key is None:
+            await self._deliver(event)
+            return
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.event = merge_edits(pending.event, event)
+            return
+
+        pending = self._pending[key] = _PendingEdit(event)
+        pending.timer = asyncio.create_task(self._deliver_later(key))
+        # Once the window has passed, the timer is no longer pending - but may still be sending
+        self._timers.add(pending.timer)
+        pending.timer.add_done_callback(self._timers.discard)
+
+    async def flush(self) -> None:
+        """
+        Put every edit being held on the wire now.
+        """
+        for key in list(self._pending):
+            pending = self._pending.pop(key)
+            if pending.timer is not None:
+                pending.timer.cancel()
+            await self._send(pending.event)
+
+    async def _deliver_later(self, key: int) -> None:
+        """
+        Put the edits held for a message on the wire once the window has passed.
+
+        :param key: The id of the edited message.
+        :return:
+        """
+        await asyncio.sleep(self._window)
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            await self._send(pending.event)
+
+    async def _send(self, event: InputEvent) -> None:
+        """
+        Put a merged edit on the wire - unless it changed nothing, and those are suppressed.
+
+        :param event:
+        :return:
+        """
+        if self._suppress_unchanged and unchanged(event):
+            self._logger.debug(
+                "Dropping merged edit of %s - content unchanged", edit_key(event)
+            )
+            return
+        await self._deliver(event)
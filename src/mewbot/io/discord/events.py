@@ -6,13 +6,17 @@
 Events which your IOConfig can produce/consume.
 """
 
-from typing import Optional
+from __future__ import annotations
+
+from typing import Any, Optional, Sequence, Union
 
 import dataclasses
 
 import discord
 from mewbot.api.v1 import InputEvent, OutputEvent
 
+from mewbot.io.discord.attachments import AttachmentSource, DiscordAttachment
+
 
 @dataclasses.dataclass
 class DiscordInputEvent(InputEvent):
@@ -30,14 +34,74 @@ class DiscordUserJoinInputEvent(DiscordInputEvent):
     member: discord.member.Member
 
 
+class _MessageText:
+    """
+    The text of a created message - worked out from the message the first time it is read.
+
+    A descriptor - so the text stays a dataclass field, which can be replaced and set.
+    """
+
+    def __get__(self, event: Optional[DiscordMessageCreationEvent], owner: Any) -> Any:
+        """
+        The text of the event's message - cleaned, or raw, as requested for the event.
+
+        :param event:
+        :param owner:
+        :return:
+        """
+        if event is None:
+            return self
+
+        text: Optional[str] = event.__dict__.get("_text")
+        if text is None:
+            message = event.message
+            text = str(message.clean_content) if event.clean_text else message.content
+            event.__dict__["_text"] = text
+        return text
+
+    def __set__(self, event: DiscordMessageCreationEvent, text: Optional[str]) -> None:
+        """
+        Set the text of the event's message - None to work it out when it is next read.
+
+        :param event:
+        :param text:
+        :return:
+        """
+        event.__dict__["_text"] = text
+
+
 @dataclasses.dataclass
 class DiscordMessageCreationEvent(DiscordInputEvent):
     """
     A discord message has been created in a channel on a server the bot monitors.
+
+    Events made with from_message work out their text the first time it is read.
+    Cleaning the text (resolving mentions into names) is comparatively expensive - and many
+    events are never read by any trigger.
     """
 
     text: str
     message: discord.Message
+    # Should the text have mentions resolved (as it is shown in the client) or be raw content?
+    clean_text: bool = True
+
+    @classmethod
+    def from_message(
+        cls, message: discord.Message, clean_text: bool = True
+    ) -> DiscordMessageCreationEvent:
+        """
+        An event for the given message - with its text worked out when it is first read.
+
+        :param message: The message which has been created.
+        :param clean_text: Should the text be cleaned, or the raw content?
+        :return:
+        """
+        # None is only accepted by the descriptor - it stands for text not yet worked out
+        return cls(text=None, message=message, clean_text=clean_text)  # type: ignore[arg-type]
+
+
+# Set once the dataclass is built - so it is not taken as a default for the text
+setattr(DiscordMessageCreationEvent, "text", _MessageText())
 
 
 @dataclasses.dataclass
@@ -63,6 +127,188 @@ class DiscordMessageDeleteInputEvent(DiscordInputEvent):
     message: discord.Message
 
 
+@dataclasses.dataclass(slots=True)
+class DiscordMessageSnapshot:
+    """
+    The ids, content and timestamps of a message - without the message itself.
+
+    Holding a full discord.Message keeps its author, member, guild, channel and embeds alive for
+    as long as the event holding it does.
+    A snapshot holds only what is needed to act on the message - and rebuild a PartialMessage
+    to reply to it.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # Each is a plain value - which is the point.
+
+    message_id: int
+    channel_id: int
+    # Needed to rebuild a PartialMessage for a channel not in the cache
+    channel_type: int
+    guild_id: Optional[int]
+    author_id: int
+    content: str
+    # POSIX timestamps
+    created_at: float
+    edited_at: Optional[float]
+
+    @classmethod
+    def from_message(cls, message: discord.Message) -> DiscordMessageSnapshot:
+        """
+        Take a snapshot of the given message.
+
+        :param message:
+        :return:
+        """
+        guild = message.guild
+        edited_at = message.edited_at
+        channel_type = message.channel.type
+        return cls(
+            message_id=message.id,
+            channel_id=message.channel.id,
+            channel_type=(channel_type or discord.ChannelType.text).value,
+            guild_id=guild.id if guild is not None else None,
+            author_id=message.author.id,
+            content=message.content,
+            created_at=message.created_at.timestamp(),
+            edited_at=edited_at.timestamp() if edited_at is not None else None,
+        )
+
+    def partial_message(self, client: discord.Client) -> discord.PartialMessage:
+        """
+        Rebuild a PartialMessage for this message - which can be replied to.
+
+        The client's channel cache is used if possible - otherwise a partial channel is built.
+        :param client: The client which will be used to act on the message.
+        :return:
+        """
+        cached = client.get_channel(self.channel_id)
+        if isinstance(
+            cached,
+            (discord.TextChannel, discord.VoiceChannel, discord.Thread, discord.DMChannel),
+        ):
+            return cached.get_partial_message(self.message_id)
+
+        channel = client.get_partial_messageable(
+            self.channel_id, type=discord.ChannelType(self.channel_type)
+        )
+        return channel.get_partial_message(self.message_id)
+
+
+@dataclasses.dataclass
+class DiscordCompactMessageCreationEvent(DiscordInputEvent):
+    """
+    A discord message has been created - holding only a snapshot of the message.
+
+    Produced instead of DiscordMessageCreationEvent when the DiscordIO is in compact mode.
+    """
+
+    text: str
+    snapshot: DiscordMessageSnapshot
+    client: Optional[discord.Client] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    @property
+    def message(self) -> discord.PartialMessage:
+        """
+        A PartialMessage for the created message - which can be replied to.
+        """
+        assert self.client is not None, "Cannot rebuild a message without a client"
+        return self.snapshot.partial_message(self.client)
+
+
+@dataclasses.dataclass
+class DiscordCompactMessageEditInputEvent(DiscordInputEvent):
+    """
+    A discord message has been edited - holding only a snapshot of the message after the edit.
+
+    Produced instead of DiscordMessageEditInputEvent when the DiscordIO is in compact mode.
+    """
+
+    text_before: str
+    text_after: str
+    snapshot: DiscordMessageSnapshot
+    client: Optional[discord.Client] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    @property
+    def message(self) -> discord.PartialMessage:
+        """
+        A PartialMessage for the edited message - which can be replied to.
+        """
+        assert self.client is not None, "Cannot rebuild a message without a client"
+        return self.snapshot.partial_message(self.client)
+
+
+@dataclasses.dataclass
+class DiscordCompactMessageDeleteInputEvent(DiscordInputEvent):
+    """
+    A discord message has been deleted - holding only a snapshot of the message.
+
+    Produced instead of DiscordMessageDeleteInputEvent when the DiscordIO is in compact mode.
+    """
+
+    text_before: str
+    snapshot: DiscordMessageSnapshot
+
+
+@dataclasses.dataclass
+class DiscordRawMessageEditInputEvent(DiscordInputEvent):
+    """
+    A discord message has been edited - whether or not it was in the message cache.
+
+    Built from the gateway payload - so it carries ids, and the new content if it changed.
+    What came before the edit is only known if the message was in the cache.
+
+    Produced instead of DiscordMessageEditInputEvent when the DiscordIO uses raw message events.
+    """
+
+    message_id: int
+    channel_id: int
+    guild_id: Optional[int]
+    # None if the content was not part of the edit (e.g. an embed being resolved)
+    text_after: Optional[str]
+    # None if the message was not in the cache
+    text_before: Optional[str]
+    # None if neither the payload nor the cache said who wrote the message
+    author_id: Optional[int]
+    # The message before the edit - None if it was not in the cache (or in compact mode)
+    message_before: Optional[discord.Message] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+
+@dataclasses.dataclass
+class DiscordRawMessageDeleteInputEvent(DiscordInputEvent):
+    """
+    A discord message has been deleted - whether or not it was in the message cache.
+
+    Built from the gateway payload - which carries only ids.
+    The message's content and author are only known if it was in the cache.
+
+    Produced instead of DiscordMessageDeleteInputEvent when the DiscordIO uses raw message
+    events. Each message removed by a bulk delete is produced as an event of its own.
+    """
+
+    message_id: int
+    channel_id: int
+    guild_id: Optional[int]
+    # None if the message was not in the cache
+    text_before: Optional[str]
+    author_id: Optional[int]
+    # The deleted message - None if it was not in the cache (or in compact mode)
+    message: Optional[discord.Message] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+
+# Messages which can be acted on by the output events - in compact mode, only partial messages
+# are available.
+ActionableMessage = Union[discord.Message, discord.PartialMessage]
+
+
 @dataclasses.dataclass
 class DiscordOutputEvent(OutputEvent):
     """
@@ -70,7 +316,7 @@ class DiscordOutputEvent(OutputEvent):
     """
 
     text: str
-    message: Optional[discord.Message]
+    message: Optional[ActionableMessage]
 
 
 @dataclasses.dataclass
@@ -80,7 +326,7 @@ class DiscordReplyIntoMessageChannelOutputEvent(DiscordOutputEvent):
     """
 
     text: str
-    message: discord.Message
+    message: ActionableMessage
 
 
 @dataclasses.dataclass
@@ -93,7 +339,7 @@ class DiscordReplyToMessageOutputEvent(DiscordOutputEvent):
     """
 
     text: str
-    message: discord.Message
+    message: ActionableMessage
 
 
 @dataclasses.dataclass
@@ -106,7 +352,10 @@ class DiscordPostToChannelOutputEvent(DiscordOutputEvent):
 
     # Contents to post to the channel
     text: str
-    picture: Optional[bytes]
+    # A file to attach - data in memory, or the path to a file
+    picture: Optional[AttachmentSource]
+    # Further files to attach - more than 10 in all are sent over several messages
+    attachments: Sequence[DiscordAttachment] = ()
 
 
 # Thought - schedule events in order?
@@ -0,0 +1,912 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+An in-process stand-in for discord's gateway and REST API - for testing without discord.
+
+The server listens locally, and - while it is entered - py-cord's REST routes point at it.
+So the DiscordInput and DiscordOutput run unchanged against it, with no network access:
+
+    async with FakeDiscordServer(channels=2) as server:
+        discord_input = DiscordInput(server.token, intents=...)
+        ...
+        await server.connected.wait()
+        await server.send_message("hello")
+
+The gateway speaks enough of the protocol for py-cord - HELLO, IDENTIFY (READY then a
+GUILD_CREATE per guild), heartbeats, RESUME (replaying what was missed), member chunk requests,
+and dispatches of MESSAGE_CREATE, MESSAGE_UPDATE and MESSAGE_DELETE.
+The REST API covers logging in, finding the gateway, and creating, editing, deleting and
+listing messages. Responses carry rate limit headers - per channel, with a configurable limit
+- and 429s can be injected.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import asyncio
+import collections
+import dataclasses
+import itertools
+import json
+import logging
+import time
+
+from aiohttp import WSMsgType, web
+from discord.http import API_VERSION, Route
+
+# Snowflakes need to look real (15-20 digits) for py-cord to parse mentions of them
+BOT_ID = 100000000000000500
+FIRST_GUILD_ID = 100000000000000001
+FIRST_CHANNEL_ID = 100000000000000100
+FIRST_USER_ID = 100000000000001000
+FIRST_MESSAGE_ID = 100000000100000000
+
+TIMESTAMP = "2023-01-01T00:00:00+00:00"
+
+# Gateway opcodes
+DISPATCH = 0
+HEARTBEAT = 1
+IDENTIFY = 2
+RESUME = 6
+RECONNECT = 7
+REQUEST_MEMBERS = 8
+INVALIDATE_SESSION = 9
+HELLO = 10
+HEARTBEAT_ACK = 11
+
+# The most dispatches held per session, to replay on resuming
+REPLAY_LOG = 1000
+
+
+def user_payload(index: int) -> Dict[str, Any]:
+    """
+    The payload for a (numbered) user.
+
+    :param index:
+    :return:
+    """
+    return {
+        "id": str(FIRST_USER_ID + index),
+        "username": f"user{index}",
+        "discriminator": "0001",
+        "avatar": None,
+    }
+
+
+def bot_user_payload() -> Dict[str, Any]:
+    """
+    The payload for the bot's own user.
+
+    :return:
+    """
+    return dict(user_payload(0), id=str(BOT_ID), username="fakebot", bot=True)
+
+
+def member_payload(index: int) -> Dict[str, Any]:
+    """
+    The payload for a (numbered) member of a guild.
+
+    :param index:
+    :return:
+    """
+    return {
+        "user": user_payload(index),
+        "roles": [],
+        "joined_at": TIMESTAMP,
+        "deaf": False,
+        "mute": False,
+    }
+
+
+def json_response(
+    data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None
+) -> web.Response:
+    """
+    A JSON response - with the exact content type py-cord expects of JSON.
+
+    :param data:
+    :param status:
+    :param headers:
+    :return:
+    """
+    return web.Response(
+        body=json.dumps(data).encode(),
+        status=status,
+        headers=dict(headers or {}, **{"Content-Type": "application/json"}),
+    )
+
+
+@dataclasses.dataclass
+class InjectedLimit:
+    """
+    A 429 to answer a REST request with - instead of handling it.
+    """
+
+    retry_after: float
+    is_global: bool = False
+
+
+@dataclasses.dataclass
+class _Session:
+    """
+    A gateway session - which can be resumed.
+    """
+
+    session_id: str
+    # [shard_id, shard_count]
+    shard: Tuple[int, int]
+    sequence: int = 0
+    # Recent dispatches, with their sequence numbers - replayed on resuming
+    log: Deque[Dict[str, Any]] = dataclasses.field(
+        default_factory=lambda: collections.deque(maxlen=REPLAY_LOG)
+    )
+    socket: Optional[web.WebSocketResponse] = None
+
+
+class FakeDiscordServer:
+    """
+    A local stand-in for discord's gateway and REST API.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # The server holds the state of the fake discord - guilds, messages, sessions and limits.
+
+    token: str
+    heartbeat_interval: float
+    rate_limit: int
+    rate_limit_window: float
+
+    # Set while every shard which has connected is connected (and identified or resumed)
+    connected: asyncio.Event
+    # Requests received by the REST API - method, path and JSON body (if any)
+    requests: List[Tuple[str, str, Any]]
+    identifies: int
+    resumes: int
+    heartbeats: int
+    limited: int
+
+    _guilds: List[Dict[str, Any]]
+    _messages: Dict[int, Dict[int, Dict[str, Any]]]
+    _sessions: Dict[str, _Session]
+    _shard_count: int
+    _injected: Deque[InjectedLimit]
+    # The start of the current window, and requests made in it - per bucket
+    _buckets: Dict[str, Tuple[float, int]]
+    _ids: itertools.count[int]
+    _logger: logging.Logger
+
+    _runner: Optional[web.AppRunner]
+    _port: int
+    _original_base: Any
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        guilds: int = 1,
+        channels: int = 1,
+        members: int = 10,
+        shard_count: int = 1,
+        token: str = "fake-token",
+        heartbeat_interval: float = 41.25,
+        rate_limit: int = 0,
+        rate_limit_window: float = 5.0,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """
+        Prepare the fake discord - it does not listen until started (or entered).
+
+        :param guilds: The number of guilds the bot is in.
+        :param channels: The number of text channels in each guild.
+        :param members: The number of members (other than the bot) in each guild.
+        :param shard_count: The number of shards recommended to bots on connecting.
+        :param token: The only token which can log in.
+        :param heartbeat_interval: Seconds between heartbeats, as asked of the bot.
+        :param rate_limit: Requests allowed per channel per window - 0 for no limit.
+        :param rate_limit_window: Seconds until a channel's rate limit resets.
+        :param logger:
+        """
+        self.token = token
+        self.heartbeat_interval = heartbeat_interval
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+
+        self.connected = asyncio.Event()
+        self.requests = []
+        self.identifies = 0
+        self.resumes = 0
+        self.heartbeats = 0
+        self.limited = 0
+
+        self._guilds = [
+            self._guild_payload(FIRST_GUILD_ID + index, channels, members)
+            for index in range(guilds)
+        ]
+        self._messages = {
+            int(channel["id"]): {} for guild in self._guilds for channel in guild["channels"]
+        }
+        self._sessions = {}
+        self._shard_count = shard_count
+        self._injected = collections.deque()
+        self._buckets = {}
+        self._ids = itertools.count(FIRST_MESSAGE_ID)
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+
+        self._runner = None
+        self._port = 0
+        self._original_base = None
+
+    @property
+    def api_url(self) -> str:
+        """
+        The base URL of the REST API - as py-cord's Route.base.
+        """
+        return f"http://127.0.0.1:{self._port}/api/v{API_VERSION}"
+
+    @property
+    def gateway_url(self) -> str:
+        """
+        The URL of the gateway.
+        """
+        return f"ws://127.0.0.1:{self._port}/gateway"
+
+    @property
+    def channel_ids(self) -> List[int]:
+        """
+        The ids of every text channel - in order.
+        """
+        return list(self._messages)
+
+    def messages(self, channel_id: int) -> List[Dict[str, Any]]:
+        """
+        The payloads of the messages in a channel - oldest first.
+
+        :param channel_id:
+        :return:
+        """
+        return list(self._messages[channel_id].values())
+
+    async def __aenter__(self) -> FakeDiscordServer:
+        """
+        Start the server, and point py-cord's REST routes at it.
+        """
+        await self.start()
+        self._original_base = Route.__dict__["base"]
+        api_url = self.api_url
+        setattr(Route, "base", property(lambda _: api_url))
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        """
+        Point py-cord back at discord, and stop the server.
+        """
+        setattr(Route, "base", self._original_base)
+        await self.stop()
+
+    async def start(self) -> None:
+        """
+        Start listening - on a free local port.
+        """
+        app = web.Application(middlewares=[self._rest_middleware])
+        app.router.add_get("/gateway", self._gateway)
+        api = f"/api/v{API_VERSION}"
+        app.router.add_get(f"{api}/users/@me", self._get_me)
+        app.router.add_get(f"{api}/gateway", self._get_gateway)
+        app.router.add_get(f"{api}/gateway/bot", self._get_gateway)
+        app.router.add_get(f"{api}/channels/{{channel_id}}", self._get_channel)
+        app.router.add_get(f"{api}/channels/{{channel_id}}/messages", self._get_messages)
+        app.router.add_post(f"{api}/channels/{{channel_id}}/messages", self._post_message)
+        app.router.add_patch(
+            f"{api}/channels/{{channel_id}}/messages/{{message_id}}", self._patch_message
+        )
+        app.router.add_delete(
+            f"{api}/channels/{{channel_id}}/messages/{{message_id}}", self._delete_message
+        )
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        # The port the OS chose
+        server: Any = site._server  # pylint: disable=protected-access
+        self._port = server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """
+        Close every gateway connection, and stop listening.
+        """
+        for session in self._sessions.values():
+            if session.socket is not None:
+                await session.socket.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # Driving the fake discord
+
+    async def send_message(
+        self, content: str, author: int = 0, channel: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Have a member send a message - dispatched to the bot as MESSAGE_CREATE.
+
+        :param content:
+        :param author: The index of the member sending it.
+        :param channel: The index of the channel - counting across every guild.
+        :return: The message's payload.
+        """
+        message = self._new_message(self.channel_ids[channel], content, user_payload(author))
+        await self.dispatch("MESSAGE_CREATE", message)
+        return message
+
+    def seed_history(self, count: int, channel: int = 0, author: int = 0) -> None:
+        """
+        Add messages to a channel's history - without dispatching them.
+
+        :param count:
+        :param channel: The index of the channel - counting across every guild.
+        :param author: The index of the member who sent them.
+        :return:
+        """
+        channel_id = self.channel_ids[channel]
+        for index in range(count):
+            self._new_message(channel_id, f"history message {index}", user_payload(author))
+
+    async def edit_message(self, message_id: int, content: str) -> None:
+        """
+        Edit a message - dispatched to the bot as MESSAGE_UPDATE.
+
+        :param message_id:
+        :param content:
+        :return:
+        """
+        message = self._find_message(message_id)
+        message.update(content=content, edited_timestamp=TIMESTAMP)
+        await self.dispatch("MESSAGE_UPDATE", dict(message))
+
+    async def delete_message(self, message_id: int) -> None:
+        """
+        Delete a message - dispatched to the bot as MESSAGE_DELETE.
+
+        :param message_id:
+        :return:
+        """
+        message = self._find_message(message_id)
+        del self._messages[int(message["channel_id"])][message_id]
+        await self.dispatch(
+            "MESSAGE_DELETE",
+            {
+                "id": message["id"],
+                "channel_id": message["channel_id"],
+                "guild_id": message.get("guild_id"),
+            },
+        )
+
+    def inject_rate_limit(
+        self, count: int = 1, retry_after: float = 0.1, is_global: bool = False
+    ) -> None:
+        """
+        Answer the next REST requests (other than logging in) with 429s.
+
+        :param count: The number of requests to answer with a 429.
+        :param retry_after: Seconds the bot is asked to wait.
+        :param is_global: Should the limits be global - rather than for the route?
+        :return:
+        """
+        self._injected.extend(InjectedLimit(retry_after, is_global) for _ in range(count))
+
+    async def drop_connections(self, resumable: bool = True) -> None:
+        """
+        Close every gateway connection - as discord does from time to time.
+
+        :param resumable: Can the sessions be resumed? If not, the bot has to identify again.
+        :return:
+        """
+        self.connected.clear()
+        for session in list(self._sessions.values()):
+            if session.socket is None:
+                continue
+            if resumable:
+                await session.socket.close(code=4000)
+            else:
+                await session.socket.send_json({"op": INVALIDATE_SESSION, "d": False})
+                del self._sessions[session.session_id]
+
+    async def dispatch(self, event: str, data: Dict[str, Any]) -> None:
+        """
+        Send a dispatch to the shard(s) it belongs to.
+
+        Shards which are disconnected have it replayed when they resume.
+        :param event:
+        :param data:
+        :return:
+        """
+        guild_id = data.get("guild_id")
+        for session in self._sessions.values():
+            if guild_id is not None and self._shard_of(int(guild_id)) != session.shard[0]:
+                continue
+            await self._send_dispatch(session, event, data)
+
+    # Gateway
+
+    async def _gateway(self, request: web.Request) -> web.WebSocketResponse:
+        """
+        A gateway connection - from HELLO until it closes.
+        """
+        socket = web.WebSocketResponse(autoclose=False)
+        await socket.prepare(request)
+        await socket.send_json(
+            {"op": HELLO, "d": {"heartbeat_interval": self.heartbeat_interval * 1000}}
+        )
+
+        session: Optional[_Session] = None
+        try:
+            async for frame in socket:
+                if frame.type != WSMsgType.TEXT:
+                    break
+                session = await self._gateway_frame(socket, session, json.loads(frame.data))
+        finally:
+            if session is not None and session.socket is socket:
+                session.socket = None
+            if not socket.closed:
+                await socket.close()
+        return socket
+
+    async def _gateway_frame(
+        self,
+        socket: web.WebSocketResponse,
+        session: Optional[_Session],
+        frame: Dict[str, Any],
+    ) -> Optional[_Session]:
+        """
+        Handle a frame from the bot.
+
+        :param socket:
+        :param session: The session on this connection - if any yet.
+        :param frame:
+        :return: The session on this connection - after the frame.
+        """
+        op = frame.get("op")
+        data: Dict[str, Any] = frame.get("d") or {}
+
+        if op == HEARTBEAT:
+            self.heartbeats += 1
+            await socket.send_json({"op": HEARTBEAT_ACK})
+        elif op == IDENTIFY:
+            return await self._identify(socket, data)
+        elif op == RESUME:
+            return await self._resume(socket, data)
+        elif op == REQUEST_MEMBERS and session is not None:
+            await self._send_members(session, data)
+        return session
+
+    async def _identify(
+        self, socket: web.WebSocketResponse, data: Dict[str, Any]
+    ) -> Optional[_Session]:
+        """
+        Start a new session - sending READY, then each guild.
+
+        :param socket:
+        :param data: The IDENTIFY payload.
+        :return:
+        """
+        if data.get("token") != self.token:
+            await socket.close(code=4004)
+            return None
+
+        self.identifies += 1
+        shard_id, shard_count = data.get("shard", [0, 1])
+        session = _Session(
+            f"session-{self.identifies}", (shard_id, shard_count), socket=socket
+        )
+        self._sessions[session.session_id] = session
+
+        guilds = [
+            guild for guild in self._guilds if self._shard_of(int(guild["id"])) == shard_id
+        ]
+        await self._send_dispatch(
+            session,
+            "READY",
+            {
+                "v": API_VERSION,
+                "user": bot_user_payload(),
+                "guilds": [{"id": guild["id"], "unavailable": True} for guild in guilds],
+                "session_id": session.session_id,
+                "resume_gateway_url": self.gateway_url,
+                "shard": [shard_id, shard_count],
+                "application": {"id": str(BOT_ID), "flags": 0},
+            },
+        )
+        for guild in guilds:
+            await self._send_dispatch(session, "GUILD_CREATE", guild)
+
+        self._note_connected()
+        return session
+
+    async def _resume(
+        self, socket: web.WebSocketResponse, data: Dict[str, Any]
+    ) -> Optional[_Session]:
+        """
+        Resume a session - replaying everything the bot missed, then RESUMED.
+
+        :param socket:
+        :param data: The RESUME payload.
+        :return:
+        """
+        session = self._sessions.get(data.get("session_id", ""))
+        if session is None or data.get("token") != self.token:
+            await socket.send_json({"op": INVALIDATE_SESSION, "d": False})
+            return None
+
+        self.resumes += 1
+        session.socket = socket
+        seen = data.get("seq") or 0
+        for dispatch in list(session.log):
+            if dispatch["s"] > seen:
+                await socket.send_json(dispatch)
+        await self._send_dispatch(session, "RESUMED", {})
+
+        self._note_connected()
+        return session
+
+    async def _send_members(self, session: _Session, data: Dict[str, Any]) -> None:
+        """
+        Answer a request for the members of a guild - in one chunk.
+
+        :param session:
+        :param data: The REQUEST_GUILD_MEMBERS payload.
+        :return:
+        """
+        guild_id = str(data.get("guild_id"))
+        guild = next((guild for guild in self._guilds if guild["id"] == guild_id), None)
+        if guild is None:
+            return
+        await self._send_dispatch(
+            session,
+            "GUILD_MEMBERS_CHUNK",
+            {
+                "guild_id": guild_id,
+                "members": guild["members"],
+                "chunk_index": 0,
+                "chunk_count": 1,
+                "nonce": data.get("nonce"),
+            },
+        )
+
+    async def _send_dispatch(
+        self, session: _Session, event: str, data: Dict[str, Any]
+    ) -> None:
+        """
+        Send a dispatch on a session - or hold it to replay, if the session is disconnected.
+
+        :param session:
+        :param event:
+        :param data:
+        :return:
+        """
+        session.sequence += 1
+        dispatch = {"op": DISPATCH, "t": event, "s": session.sequence, "d": data}
+        session.log.append(dispatch)
+        if session.socket is not None and not session.socket.closed:
+            await session.socket.send_json(dispatch)
+
+    def _note_connected(self) -> None:
+        """
+        Set connected - if every session has a connection.
+        """
+        if all(session.socket is not None for session in self._sessions.values()):
+            self.connected.set()
+
+    def _shard_of(self, guild_id: int) -> int:
+        """
+        The shard a guild belongs to - as discord assigns them.
+
+        :param guild_id:
+        :return:
+        """
+        shard_counts = {session.shard[1] for session in self._sessions.values()}
+        shard_count = max(shard_counts) if shard_counts else self._shard_count
+        return (guild_id >> 22) % shard_count
+
+    # REST API
+
+    @web.middleware
+    async def _rest_middleware(
+        self, request: web.Request, handler: Any
+    ) -> web.StreamResponse:
+        """
+        Check the token, record the request, and apply rate limits - for the REST API.
+        """
+        if request.path == "/gateway":
+            response: web.StreamResponse = await handler(request)
+            return response
+
+        if request.headers.get("Authorization") != f"Bot {self.token}":
+            return self._error(401, "401: Unauthorized")
+
+        json_body = request.can_read_body and request.content_type == "application/json"
+        body = await request.json() if json_body else None
+        self.requests.append((request.method, request.path, body))
+
+        logging_in = request.path.endswith(("/users/@me", "/gateway", "/gateway/bot"))
+        if self._injected and not logging_in:
+            injected = self._injected.popleft()
+            return self._too_many(injected.retry_after, injected.is_global)
+
+        bucket = f"{request.method} {request.match_info.get('channel_id', request.path)}"
+        headers = self._take_from_bucket(bucket)
+        if headers is None:
+            started, _ = self._buckets[bucket]
+            return self._too_many(self.rate_limit_window - (time.monotonic() - started))
+
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    def _take_from_bucket(self, bucket: str) -> Optional[Dict[str, str]]:
+        """
+        Count a request against its rate limit bucket.
+
+        :param bucket:
+        :return: The rate limit headers for the response - None if the bucket is exhausted.
+        """
+        if not self.rate_limit:
+            return {}
+
+        now = time.monotonic()
+        started, used = self._buckets.get(bucket, (now, 0))
+        if now - started >= self.rate_limit_window:
+            started, used = now, 0
+        if used >= self.rate_limit:
+            return None
+
+        used += 1
+        self._buckets[bucket] = (started, used)
+        return {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(self.rate_limit - used),
+            "X-RateLimit-Reset-After": f"{self.rate_limit_window - (now - started):.3f}",
+            "X-RateLimit-Bucket": bucket,
+        }
+
+    def _too_many(self, retry_after: float, is_global: bool = False) -> web.Response:
+        """
+        A 429 response - as discord sends them.
+
+        :param retry_after:
+        :param is_global:
+        :return:
+        """
+        self.limited += 1
+        headers = {"Via": "1.1 fake", "Retry-After": str(max(1, round(retry_after)))}
+        if is_global:
+            headers["X-RateLimit-Global"] = "true"
+        return json_response(
+            {
+                "message": "You are being rate limited.",
+                "retry_after": retry_after,
+                "global": is_global,
+            },
+            status=429,
+            headers=headers,
+        )
+
+    @staticmethod
+    def _error(status: int, message: str) -> web.Response:
+        """
+        An error response - as discord sends them.
+
+        :param status:
+        :param message:
+        :return:
+        """
+        return json_response({"message": message, "code": 0}, status=status)
+
+    async def _get_me(self, _: web.Request) -> web.Response:
+        """
+        The bot's own user - used to log in.
+        """
+        return json_response(bot_user_payload())
+
+    async def _get_gateway(self, _: web.Request) -> web.Response:
+        """
+        Where the gateway is - and how many shards to use.
+        """
+        return json_response(
+            {
+                "url": self.gateway_url,
+                "shards": self._shard_count,
+                "session_start_limit": {
+                    "total": 1000,
+                    "remaining": 1000,
+                    "reset_after": 0,
+                    "max_concurrency": 1,
+                },
+            }
+        )
+
+    async def _get_channel(self, request: web.Request) -> web.Response:
+        """
+        A channel - by id.
+        """
+        channel_id = request.match_info["channel_id"]
+        for guild in self._guilds:
+            for channel in guild["channels"]:
+                if channel["id"] == channel_id:
+                    return json_response(channel)
+        return self._error(404, "Unknown Channel")
+
+    async def _get_messages(self, request: web.Request) -> web.Response:
+        """
+        A page of a channel's history - newest first, as discord gives them.
+        """
+        channel = self._messages.get(int(request.match_info["channel_id"]))
+        if channel is None:
+            return self._error(404, "Unknown Channel")
+
+        limit = int(request.query.get("limit", 50))
+        ids = list(channel)
+        if "after" in request.query:
+            after = int(request.query["after"])
+            page = [message_id for message_id in ids if message_id > after][:limit]
+        else:
+            before = int(request.query.get("before", FIRST_MESSAGE_ID * 10))
+            page = [message_id for message_id in ids if message_id < before][-limit:]
+
+        return json_response([channel[message_id] for message_id in reversed(page)])
+
+    async def _post_message(self, request: web.Request) -> web.Response:
+        """
+        The bot sending a message - echoed back over the gateway, as discord does.
+        """
+        channel_id = int(request.match_info["channel_id"])
+        if channel_id not in self._messages:
+            return self._error(404, "Unknown Channel")
+
+        if request.content_type == "application/json":
+            body = await request.json()
+        else:
+            form = await request.post()
+            body = json.loads(str(form.get("payload_json", "{}")))
+
+        author = bot_user_payload()
+        message = self._new_message(channel_id, body.get("content") or "", author)
+        if body.get("message_reference"):
+            # Snowflakes are sent as ints - but discord always returns them as strings
+            message["message_reference"] = {
+                key: str(value) if key.endswith("_id") and value is not None else value
+                for key, value in body["message_reference"].items()
+            }
+        await self.dispatch("MESSAGE_CREATE", message)
+        return json_response(message)
+
+    async def _patch_message(self, request: web.Request) -> web.Response:
+        """
+        The bot editing one of its messages.
+        """
+        message_id = int(request.match_info["message_id"])
+        body = await request.json()
+        try:
+            await self.edit_message(message_id, body.get("content") or "")
+        except KeyError:
+            return self._error(404, "Unknown Message")
+        return json_response(self._find_message(message_id))
+
+    async def _delete_message(self, request: web.Request) -> web.Response:
+        """
+        The bot deleting a message.
+        """
+        try:
+            await self.delete_message(int(request.match_info["message_id"]))
+        except KeyError:
+            return self._error(404, "Unknown Message")
+        return web.Response(status=204)
+
+    # Payloads
+
+    def _new_message(
+        self, channel_id: int, content: str, author: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Store a new message in a channel.
+
+        :param channel_id:
+        :param content:
+        :param author: The user payload of the author.
+        :return: The message's payload.
+        """
+        guild_id = next(
+            guild["id"]
+            for guild in self._guilds
+            if any(int(channel["id"]) == channel_id for channel in guild["channels"])
+        )
+        message_id = next(self._ids)
+        message = {
+            "id": str(message_id),
+            "channel_id": str(channel_id),
+            "guild_id": guild_id,
+            "author": author,
+            "member": {"roles": [], "joined_at": TIMESTAMP, "deaf": False, "mute": False},
+            "content": content,
+            "timestamp": TIMESTAMP,
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+        }
+        self._messages[channel_id][message_id] = message
+        return message
+
+    def _find_message(self, message_id: int) -> Dict[str, Any]:
+        """
+        A stored message - by id.
+
+        :param message_id:
+        :return:
+        """
+        for channel in self._messages.values():
+            if message_id in channel:
+                return channel[message_id]
+        raise KeyError(message_id)
+
+    @staticmethod
+    def _guild_payload(guild_id: int, channels: int, members: int) -> Dict[str, Any]:
+        """
+        The GUILD_CREATE payload for a guild.
+
+        :param guild_id:
+        :param channels: The number of text channels.
+        :param members: The number of members, other than the bot.
+        :return:
+        """
+        offset = (guild_id - FIRST_GUILD_ID) * channels
+        bot = {
+            "user": bot_user_payload(),
+            "roles": [],
+            "joined_at": TIMESTAMP,
+            "deaf": False,
+            "mute": False,
+        }
+        return {
+            "id": str(guild_id),
+            "name": f"fake guild {guild_id - FIRST_GUILD_ID}",
+            "unavailable": False,
+            "owner_id": str(FIRST_USER_ID),
+            "roles": [
+                {
+                    "id": str(guild_id),
+                    "name": "@everyone",
+                    # View channels, send messages and read message history
+                    "permissions": str(1024 | 2048 | 65536),
+                    "position": 0,
+                    "color": 0,
+                    "hoist": False,
+                    "managed": False,
+                    "mentionable": False,
+                }
+            ],
+            "channels": [
+                {
+                    "id": str(FIRST_CHANNEL_ID + offset + index),
+                    "type": 0,
+                    "name": f"channel-{index}",
+                    "position": index,
+                    "guild_id": str(guild_id),
+                    "permission_overwrites": [],
+                }
+                for index in range(channels)
+            ],
+            "members": [bot] + [member_payload(index) for index in range(members)],
+            "member_count": members + 1,
+            "threads": [],
+            "emojis": [],
+            "stickers": [],
+            "features": [],
+        }
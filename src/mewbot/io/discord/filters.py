@@ -0,0 +1,123 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Decides which discord events are worth putting on the wire at all.
+
+Checks are made on plain ids, before any event is built - so events which would only be thrown
+away by every trigger cost as little as possible.
+"""
+
+from __future__ import annotations
+
+from typing import FrozenSet, Optional
+
+import dataclasses
+
+
+@dataclasses.dataclass(frozen=True)
+class DiscordEventFilter:
+    """
+    Allow and deny sets for the guilds, channels and authors which events can come from.
+
+    Empty allow sets allow everything - deny sets always take precedence over allow sets.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # One allow and one deny set per id type, and the two flags.
+
+    allowed_guilds: FrozenSet[int] = frozenset()
+    denied_guilds: FrozenSet[int] = frozenset()
+    # A thread is allowed (or denied) if either it, or its parent channel, is
+    allowed_channels: FrozenSet[int] = frozenset()
+    denied_channels: FrozenSet[int] = frozenset()
+    allowed_authors: FrozenSet[int] = frozenset()
+    denied_authors: FrozenSet[int] = frozenset()
+    # Drop events caused by bots
+    ignore_bots: bool = False
+    # Drop events caused by this bot
+    ignore_self: bool = False
+
+    def admits(  # pylint: disable=too-many-arguments
+        self,
+        guild_id: Optional[int],
+        channel_id: int,
+        parent_id: Optional[int],
+        *,
+        author_id: int,
+        author_is_bot: bool,
+        self_id: Optional[int],
+    ) -> bool:
+        """
+        Should an event from the given place, and by the given author, be put on the wire?
+
+        :param guild_id: The guild the event occurred in - None for direct messages.
+        :param channel_id: The channel (or thread) the event occurred in.
+        :param parent_id: If the event occurred in a thread, the channel the thread is in.
+        :param author_id: The user who caused the event.
+        :param author_is_bot: Is that user a bot?
+        :param self_id: The user id of this bot - if known.
+        :return:
+        """
+        if not self.admits_author(author_id, author_is_bot, self_id):
+            return False
+
+        return self.admits_place(guild_id, channel_id, parent_id)
+
+    def admits_place(
+        self, guild_id: Optional[int], channel_id: int, parent_id: Optional[int]
+    ) -> bool:
+        """
+        Should an event from the given place, whoever caused it, be put on the wire?
+
+        :param guild_id: The guild the event occurred in - None for direct messages.
+        :param channel_id: The channel (or thread) the event occurred in.
+        :param parent_id: If the event occurred in a thread, the channel the thread is in.
+        :return:
+        """
+        if guild_id is not None and not self.admits_guild(guild_id):
+            return False
+
+        if channel_id in self.denied_channels or parent_id in self.denied_channels:
+            return False
+        if (
+            self.allowed_channels
+            and channel_id not in self.allowed_channels
+            and parent_id not in self.allowed_channels
+        ):
+            return False
+
+        return True
+
+    def admits_author(
+        self, author_id: int, author_is_bot: bool, self_id: Optional[int]
+    ) -> bool:
+        """
+        Should an event caused by the given author be put on the wire?
+
+        :param author_id: The user who caused the event.
+        :param author_is_bot: Is that user a bot?
+        :param self_id: The user id of this bot - if known.
+        :return:
+        """
+        if self.ignore_self and author_id == self_id:
+            return False
+        if self.ignore_bots and author_is_bot:
+            return False
+        if author_id in self.denied_authors:
+            return False
+        if self.allowed_authors and author_id not in self.allowed_authors:
+            return False
+        return True
+
+    def admits_guild(self, guild_id: int) -> bool:
+        """
+        Should an event from the given guild be put on the wire?
+
+        :param guild_id:
+        :return:
+        """
+        if guild_id in self.denied_guilds:
+            return False
+        return not self.allowed_guilds or guild_id in self.allowed_guilds
@@ -0,0 +1,222 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Buffers events between the discord gateway and the InputQueue - without ever waiting.
+
+Putting events straight onto a bounded InputQueue means the gateway handlers wait whenever the
+triggers fall behind - and the pending handlers pile up behind them.
+The buffer accepts every event immediately, and sheds events by its overflow policy once full.
+A pump task moves events from the buffer to the InputQueue - that is the only place which waits.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Deque, Dict, List, Optional
+
+import asyncio
+import collections
+import dataclasses
+import enum
+import logging
+
+from mewbot.api.v1 import InputEvent, InputQueue
+
+from mewbot.io.discord.edits import edit_key, merge_edits
+from mewbot.io.discord.metrics import DiscordMetrics
+from mewbot.io.discord.tracing import EventTracer
+
+
+class OverflowPolicy(enum.Enum):
+    """
+    What to do with a new event when the ingress buffer is full.
+    """
+
+    # Drop the event which has been waiting longest - keeping the newest events
+    DROP_OLDEST = "drop-oldest"
+    # Drop the new event - keeping the events which were there first
+    DROP_NEWEST = "drop-newest"
+    # Fold an edit into an edit of the same message which is already waiting.
+    # When there is no such edit, the oldest event is dropped.
+    COALESCE_EDITS = "coalesce-edits"
+
+
+@dataclasses.dataclass
+class IngressCounters:
+    """
+    Counts of the events which have passed through (or been shed by) the ingress buffer.
+    """
+
+    accepted: int = 0
+    delivered: int = 0
+    dropped_oldest: int = 0
+    dropped_newest: int = 0
+    coalesced: int = 0
+    # The most events which have been waiting in the buffer at once
+    high_water: int = 0
+
+    @property
+    def shed(self) -> int:
+        """
+        The number of events which never made it to the InputQueue as they were.
+        """
+        return self.dropped_oldest + self.dropped_newest + self.coalesced
+
+
+class IngressBuffer:
+    """
+    A bounded buffer, which events can always be put into without waiting.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # The settings, the waiting events (and an index of them), and the state of the pump.
+
+    _capacity: int
+    _policy: OverflowPolicy
+    _logger: logging.Logger
+
+    # Each event sits in a one item list - so a waiting edit can be replaced in place
+    _slots: Deque[List[InputEvent]]
+    # The waiting edit for each message id - used when coalescing
+    _edits: Dict[int, List[InputEvent]]
+    _ready: asyncio.Event
+    _shedding: bool
+
+    counters: IngressCounters
+
+    def __init__(
+        self,
+        capacity: int,
+        policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """
+        Prepare an empty buffer.
+
+        :param capacity: The most events which can wait in the buffer.
+        :param policy: What to do with new events when the buffer is full.
+        :param logger:
+        """
+        assert capacity > 0, "The ingress buffer needs to be able to hold at least one event"
+
+        self._capacity = capacity
+        self._policy = policy
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+
+        self._slots = collections.deque()
+        self._edits = {}
+        self._ready = asyncio.Event()
+        self._shedding = False
+
+        self.counters = IngressCounters()
+
+    def __len__(self) -> int:
+        """
+        The number of events waiting to be moved to the InputQueue.
+        """
+        return len(self._slots)
+
+    def put(self, event: InputEvent) -> None:
+        """
+        Accept an event into the buffer - shedding an event if the buffer is full.
+
+        :param event:
+        :return:
+        """
+        self.counters.accepted += 1
+
+        if len(self._slots) >= self._capacity and not self._make_room(event):
+            return
+
+        slot = [event]
+        self._slots.append(slot)
+        key = edit_key(event)
+        if key is not None:
+            self._edits[key] = slot
+
+        self.counters.high_water = max(self.counters.high_water, len(self._slots))
+        self._ready.set()
+
+    def _make_room(self, event: InputEvent) -> bool:
+        """
+        Called when the buffer is full - applies the overflow policy.
+
+        :param event: The event being put into the buffer.
+        :return: Should the event still be added to the buffer?
+        """
+        if not self._shedding:
+            self._shedding = True
+            self._logger.warning(
+                "Ingress buffer is full (%s events) - shedding events by %s",
+                self._capacity,
+                self._policy.value,
+            )
+
+        if self._policy is OverflowPolicy.DROP_NEWEST:
+            self.counters.dropped_newest += 1
+            return False
+
+        if self._policy is OverflowPolicy.COALESCE_EDITS:
+            key = edit_key(event)
+            waiting = self._edits.get(key) if key is not None else None
+            if waiting is not None:
+                waiting[0] = merge_edits(waiting[0], event)
+                self.counters.coalesced += 1
+                return False
+
+        self._forget(self._slots.popleft())
+        self.counters.dropped_oldest += 1
+        return True
+
+    def _forget(self, slot: List[InputEvent]) -> None:
+        """
+        Stop tracking an edit which has left the buffer.
+
+        :param slot:
+        :return:
+        """
+        key = edit_key(slot[0])
+        if key is not None and self._edits.get(key) is slot:
+            del self._edits[key]
+
+    async def run(
+        self,
+        queue: InputQueue,
+        metrics: Optional[DiscordMetrics] = None,
+        tracer: Optional[EventTracer] = None,
+        delivered: Optional[Callable[[InputEvent], None]] = None,
+    ) -> None:
+        """
+        Move events from the buffer to the given queue - until cancelled.
+
+        :param queue:
+        :param metrics: Where the time spent waiting on the queue is recorded - if anywhere.
+        :param tracer: Stamps events as they are put on the queue - if given.
+        :param delivered:
+            Called with each event once it is on the queue - events shed never are.
+        :return:
+        """
+        while True:
+            await self._ready.wait()
+
+            while self._slots:
+                slot = self._slots.popleft()
+                self._forget(slot)
+                if metrics is None:
+                    await queue.put(slot[0])
+                else:
+                    with metrics.queue_put_seconds.time():
+                        await queue.put(slot[0])
+                if tracer is not None:
+                    tracer.enqueued(slot[0])
+                if delivered is not None:
+                    delivered(slot[0])
+                self.counters.delivered += 1
+
+            self._ready.clear()
+            if self._shedding:
+                self._shedding = False
+                self._logger.info(
+                    "Ingress buffer has drained - %s events shed so far", self.counters.shed
+                )
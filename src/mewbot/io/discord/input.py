@@ -0,0 +1,294 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+The Input which connects to discord, and puts the events it sees on the wire.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional, Set, Type
+
+import asyncio
+import logging
+
+import discord
+from mewbot.api.v1 import Input, InputEvent, InputQueue
+
+from mewbot.io.discord.backfill import BackfillConfig
+from mewbot.io.discord.client import (
+    CacheConfig,
+    InternalMewbotDiscordClient,
+    InternalMewbotShardedDiscordClient,
+    ShardConfig,
+)
+from mewbot.io.discord.cursors import ChannelCursors
+from mewbot.io.discord.edits import EditDebouncer
+from mewbot.io.discord.events import (
+    DiscordCompactMessageCreationEvent,
+    DiscordCompactMessageDeleteInputEvent,
+    DiscordCompactMessageEditInputEvent,
+    DiscordMessageCreationEvent,
+    DiscordMessageDeleteInputEvent,
+    DiscordMessageEditInputEvent,
+    DiscordRawMessageDeleteInputEvent,
+    DiscordRawMessageEditInputEvent,
+    DiscordUserJoinInputEvent,
+)
+from mewbot.io.discord.filters import DiscordEventFilter
+from mewbot.io.discord.ingress import IngressBuffer
+from mewbot.io.discord.metrics import DiscordMetrics, MetricsServer
+from mewbot.io.discord.recording import GatewayRecorder
+from mewbot.io.discord.tracing import EventTracer
+
+if TYPE_CHECKING:
+    from mewbot.io.discord.workers import ShardWorkerPool
+
+
+class DiscordInput(Input):
+    """
+    Uses py-cord as a backend to connect, receive and send messages to discord.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # The client's settings are held here, as well as passed to it.
+
+    _logger: logging.Logger
+    _token: str
+    _startup_queue_depth: int
+    _cursors: ChannelCursors
+    _ingress: Optional[IngressBuffer]
+    _workers: Optional[ShardWorkerPool]
+    _metrics: Optional[DiscordMetrics]
+    _metrics_server: Optional[MetricsServer]
+    _tracer: Optional[EventTracer]
+    _recorder: Optional[GatewayRecorder]
+    _client: InternalMewbotDiscordClient
+
+    def __init__(  # pylint: disable=too-many-arguments, too-many-locals
+        self,
+        token: str,
+        startup_queue_depth: int = 0,
+        backfill_config: Optional[BackfillConfig] = None,
+        cursors: Optional[ChannelCursors] = None,
+        *,
+        intents: Optional[discord.Intents] = None,
+        event_filter: Optional[DiscordEventFilter] = None,
+        clean_message_text: bool = True,
+        compact_events: bool = False,
+        raw_message_events: bool = False,
+        suppress_unchanged_edits: bool = False,
+        edit_debounce: float = 0.0,
+        ingress: Optional[IngressBuffer] = None,
+        shards: Optional[ShardConfig] = None,
+        workers: Optional[ShardWorkerPool] = None,
+        cache: Optional[CacheConfig] = None,
+        metrics: Optional[DiscordMetrics] = None,
+        metrics_port: int = 0,
+        tracer: Optional[EventTracer] = None,
+        recorder: Optional[GatewayRecorder] = None,
+    ) -> None:
+        """
+        Initialize the Discord Input.
+
+        :param token: The token need to authenticate this bot to the discord server
+        :param startup_queue_depth:
+            During startup, the number of DiscordTextInputEvents to put on the wire
+            (Other forms of event are not always possible).
+        :param backfill_config:
+            Which channels to retrieve startup messages from, and how.
+        :param cursors:
+            Records the last message dispatched from each channel - possibly across restarts.
+        :param intents:
+            The gateway intents to connect with - defaults to all of them.
+        :param event_filter:
+            Decides which events are put on the wire - defaults to all of them.
+        :param clean_message_text:
+            Should the text of new messages have mentions resolved (or be the raw content)?
+        :param compact_events:
+            Should message events hold compact snapshots, rather than the full messages?
+        :param raw_message_events:
+            Should edit and delete events be built from the raw gateway events - so they are
+            produced for messages which are not in the cache?
+        :param suppress_unchanged_edits:
+            Should edits which leave the content as it was (e.g. link embeds resolving) be
+            dropped?
+        :param edit_debounce:
+            Seconds to hold edits for - merging further edits to the same message into them.
+            0 puts each edit on the wire as it comes.
+        :param ingress:
+            Buffers live events on their way to the InputQueue - if None, they are put
+            straight onto it.
+        :param shards:
+            Which gateway shards to run, with the auto-sharded client - if None, the bot runs
+            unsharded.
+        :param workers:
+            Runs the gateway shards in worker processes - if set, this Input's own client only
+            logs in (for output), and puts the workers' events on the wire.
+        :param cache:
+            How much the client holds on to - defaults to py-cord's defaults.
+        :param metrics:
+            Where events received, filtered and put on the wire are counted - if anywhere.
+        :param metrics_port:
+            Serve the metrics on this (local) port while running - 0 to not serve them.
+        :param tracer:
+            Stamps messages as they are received and put on the wire - if given.
+        :param recorder:
+            Records every dispatch from the gateway to a log, for replaying - if given.
+        """
+        assert startup_queue_depth >= 0, "Does not support a negative startup_queue_depth"
+
+        super().__init__()
+
+        if intents is None:
+            intents = discord.Intents.all()
+        options = (cache if cache is not None else CacheConfig()).client_options()
+        self._client = (
+            InternalMewbotDiscordClient(intents=intents, **options)
+            if shards is None
+            else InternalMewbotShardedDiscordClient(
+                intents=intents, **options, **shards.client_options()
+            )
+        )
+        self._token = token
+        self._logger = logging.getLogger(__name__ + "DiscordInput")
+
+        self._startup_queue_depth = startup_queue_depth
+        self._cursors = cursors if cursors is not None else ChannelCursors()
+        self._ingress = ingress
+        self._workers = workers
+        self._metrics = metrics
+        self._tracer = tracer
+        self._recorder = recorder
+        self._metrics_server = (
+            MetricsServer(metrics, metrics_port, logger=self._logger)
+            if metrics is not None and metrics_port
+            else None
+        )
+
+        self._client._logger = self._logger
+        self._client._startup_queue_depth = self._startup_queue_depth
+        self._client._backfill_config = (
+            backfill_config if backfill_config is not None else BackfillConfig()
+        )
+        self._client._cursors = self._cursors
+        self._client._event_filter = (
+            event_filter if event_filter is not None else DiscordEventFilter()
+        )
+        self._client._clean_message_text = clean_message_text
+        self._client._compact_events = compact_events
+        self._client._raw_message_events = raw_message_events
+        self._client._suppress_unchanged_edits = suppress_unchanged_edits
+        self._client._edits = (
+            EditDebouncer(
+                edit_debounce,
+                self._client._put_live_event,
+                suppress_unchanged_edits,
+                self._logger,
+            )
+            if edit_debounce > 0
+            else None
+        )
+        self._client._ingress = ingress
+        self._client._metrics = metrics
+        self._client._tracer = tracer
+        if metrics is not None:
+            metrics.watch_latency(self._client.shard_latencies)
+        if recorder is not None:
+            recorder.install(self._client.gateway_parsers())
+        self._client.queue = self.queue
+
+    def bind(self, queue: InputQueue) -> None:
+        """
+        Bind the queues into this Input class.
+
+        :param queue:
+        :return:
+        """
+        self.queue = queue
+        self._client.queue = queue
+
+    def get_client(self) -> InternalMewbotDiscordClient:
+        """
+        Return the internal client which the Input uses to talk to discord.
+
+        We need the client in the output to allow certain OutputEvents to affect discord.
+        :return:
+        """
+        return self._client
+
+    @staticmethod
+    def produces_inputs() -> Set[Type[InputEvent]]:
+        """
+        Defines the set of input events this Input class can produce.
+        """
+        return {
+            DiscordUserJoinInputEvent,
+            DiscordMessageCreationEvent,
+            DiscordMessageEditInputEvent,
+            DiscordMessageDeleteInputEvent,
+            DiscordCompactMessageCreationEvent,
+            DiscordCompactMessageEditInputEvent,
+            DiscordCompactMessageDeleteInputEvent,
+            DiscordRawMessageEditInputEvent,
+            DiscordRawMessageDeleteInputEvent,
+        }
+
+    async def run(self) -> None:
+        """
+        Fires up a discord client to run this service.
+
+        Token needs to be set by this point.
+        """
+        self._cursors.open()
+        flusher = asyncio.create_task(self._cursors.run())
+        pump = (
+            asyncio.create_task(
+                self._ingress.run(
+                    self.queue,
+                    self._metrics,
+                    self._tracer,
+                    # The workers keep the cursors of their own shards
+                    self._client.note_delivered if self._workers is None else None,
+                )
+            )
+            if self._ingress is not None and self.queue is not None
+            else None
+        )
+
+        if self._metrics_server is not None:
+            await self._metrics_server.start()
+
+        self._logger.info("About to connect to Discord")
+
+        try:
+            await self._connect()
+        finally:
+            # Edits being debounced would otherwise be lost
+            await self._client.flush_edits()
+            # Already closed if the connection ended - but not if the Input was cancelled
+            await self._client.close()
+            flusher.cancel()
+            if pump is not None:
+                pump.cancel()
+            self._cursors.close()
+            if self._metrics_server is not None:
+                await self._metrics_server.stop()
+            if self._tracer is not None:
+                self._tracer.close()
+            if self._recorder is not None:
+                self._recorder.close()
+
+    async def _connect(self) -> None:
+        """
+        Connect to discord - and receive events until the client is closed.
+        """
+        if self._workers is None:
+            await self._client.start(self._token)
+            return
+
+        await self._client.login(self._token)
+        # pylint: disable=protected-access
+        # The events are put on the wire as though the client had produced them
+        await self._workers.run(self._client, self._client._put_live_event)
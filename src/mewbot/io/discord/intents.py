@@ -0,0 +1,248 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Works out which gateway intents are needed to produce the events the bot actually uses.
+
+Discord only sends the gateway events covered by the intents the bot connects with.
+Asking for everything (presences, typing, voice states) costs bandwidth and parsing time for
+events which are never put on the wire.
+
+The same examination of the loaded triggers shows which of them consume events which the
+DiscordIO's settings will never produce (e.g. full message events, with compact events on).
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Type
+
+import inspect
+
+import discord
+from mewbot.api.registry import ComponentRegistry
+from mewbot.api.v1 import InputEvent, Trigger
+
+from mewbot.io.discord.events import (
+    DiscordCompactMessageCreationEvent,
+    DiscordCompactMessageDeleteInputEvent,
+    DiscordCompactMessageEditInputEvent,
+    DiscordInputEvent,
+    DiscordMessageCreationEvent,
+    DiscordMessageDeleteInputEvent,
+    DiscordMessageEditInputEvent,
+    DiscordRawMessageDeleteInputEvent,
+    DiscordRawMessageEditInputEvent,
+    DiscordUserJoinInputEvent,
+)
+
+# Needed whatever else is used - the channel and guild caches are built from these events
+BASE_INTENTS: Tuple[str, ...] = ("guilds",)
+
+# Needed for any message event - the content intent is needed for the message to have content
+MESSAGE_INTENTS: Tuple[str, ...] = ("guild_messages", "dm_messages", "message_content")
+
+# The intents which have to be enabled for each of the input events to be produced
+EVENT_INTENTS: Dict[Type[InputEvent], Tuple[str, ...]] = {
+    DiscordMessageCreationEvent: MESSAGE_INTENTS,
+    DiscordMessageEditInputEvent: MESSAGE_INTENTS,
+    DiscordMessageDeleteInputEvent: MESSAGE_INTENTS,
+    DiscordCompactMessageCreationEvent: MESSAGE_INTENTS,
+    DiscordCompactMessageEditInputEvent: MESSAGE_INTENTS,
+    DiscordCompactMessageDeleteInputEvent: MESSAGE_INTENTS,
+    DiscordRawMessageEditInputEvent: MESSAGE_INTENTS,
+    DiscordRawMessageDeleteInputEvent: MESSAGE_INTENTS,
+    DiscordUserJoinInputEvent: ("members",),
+}
+
+# Events which stand in for each other - which of them is produced depends on the settings
+EVENT_ALTERNATIVES: Tuple[Tuple[Type[InputEvent], ...], ...] = (
+    (DiscordMessageCreationEvent, DiscordCompactMessageCreationEvent),
+    (
+        DiscordMessageEditInputEvent,
+        DiscordCompactMessageEditInputEvent,
+        DiscordRawMessageEditInputEvent,
+    ),
+    (
+        DiscordMessageDeleteInputEvent,
+        DiscordCompactMessageDeleteInputEvent,
+        DiscordRawMessageDeleteInputEvent,
+    ),
+)
+
+# Reading message history needs the content intent for the messages to have any content
+HISTORY_INTENTS: Tuple[str, ...] = ("message_content",)
+
+# The intents which have to be enabled to cache members by each of the member cache flags
+MEMBER_CACHE_INTENTS: Dict[str, Tuple[str, ...]] = {
+    "joined": ("members",),
+    "voice": ("voice_states",),
+}
+
+# Requesting the members of each guild on connecting needs the members intent
+CHUNKING_INTENTS: Tuple[str, ...] = ("members",)
+
+
+def consumed_input_events() -> Set[Type[InputEvent]]:
+    """
+    The input event types which the loaded triggers could consume.
+
+    Every trigger class which has been loaded is examined - so this should be called after the
+    bot's behaviours have been loaded.
+    :return:
+    """
+    consumed: Set[Type[InputEvent]] = set()
+
+    for trigger in _loaded_triggers():
+        consumed.update(trigger.consumes_inputs())
+
+    return consumed
+
+
+def produced_input_events(
+    compact_events: bool, raw_message_events: bool, workers: bool
+) -> Set[Type[InputEvent]]:
+    """
+    The input event types a DiscordInput produces with the given settings.
+
+    :param compact_events: Are compact events produced in place of the full message events?
+    :param raw_message_events: Are edits and deletes produced from the raw gateway events?
+    :param workers: Are the shards run by worker processes? Only compact events are forwarded.
+    :return:
+    """
+    compact = compact_events or workers
+    produced: Set[Type[InputEvent]] = {
+        DiscordCompactMessageCreationEvent if compact else DiscordMessageCreationEvent
+    }
+
+    if raw_message_events:
+        produced.update((DiscordRawMessageEditInputEvent, DiscordRawMessageDeleteInputEvent))
+    elif compact:
+        produced.update(
+            (DiscordCompactMessageEditInputEvent, DiscordCompactMessageDeleteInputEvent)
+        )
+    else:
+        produced.update((DiscordMessageEditInputEvent, DiscordMessageDeleteInputEvent))
+
+    if not workers:
+        produced.add(DiscordUserJoinInputEvent)
+
+    return produced
+
+
+def unproduced_input_events(produced: Set[Type[InputEvent]]) -> Dict[str, List[str]]:
+    """
+    The discord events which loaded triggers consume - but which will never be produced.
+
+    A trigger which also consumes a stand-in for the event (e.g. the raw edit for the edit) is
+    given that instead - so does not miss the event.
+    :param produced: The input event types which will be produced.
+    :return: The names of the events each trigger would miss, by the name of the trigger.
+    """
+    missed: Dict[str, List[str]] = {}
+
+    for trigger in _loaded_triggers():
+        consumed = trigger.consumes_inputs()
+        for event_type in sorted(consumed, key=lambda event_type: event_type.__name__):
+            if not issubclass(event_type, DiscordInputEvent):
+                continue
+            family = next(
+                (family for family in EVENT_ALTERNATIVES if event_type in family),
+                (event_type,),
+            )
+            if not any(
+                issubclass(made, wanted)
+                for wanted in family
+                if wanted in consumed
+                for made in produced
+            ):
+                missed.setdefault(trigger.__name__, []).append(event_type.__name__)
+
+    return missed
+
+
+def check_consumed_events(produced: Set[Type[InputEvent]]) -> None:
+    """
+    Refuse to go on if a loaded trigger consumes discord events which will never be produced.
+
+    Compact events, raw message events and shard workers each replace some of the events - a
+    trigger written for the ones replaced would otherwise never fire.
+    :param produced: The input event types which will be produced.
+    """
+    missed = unproduced_input_events(produced)
+    if missed:
+        raise ValueError(
+            "Triggers consume discord events which compact_events, raw_message_events or "
+            "shard_workers stop being produced: "
+            + "; ".join(f"{name} ({', '.join(events)})" for name, events in missed.items())
+        )
+
+
+def _loaded_triggers() -> Iterator[Type[Trigger]]:
+    """
+    Every concrete trigger class which has been loaded.
+    """
+    for component in ComponentRegistry.registered:
+        if issubclass(component, Trigger) and not inspect.isabstract(component):
+            yield component
+
+
+def intents_for_events(
+    consumed: Iterable[Type[InputEvent]], reads_history: bool = False
+) -> Tuple[discord.Intents, Dict[str, List[str]]]:
+    """
+    The smallest set of intents which covers every discord event that could be consumed.
+
+    A consumer of a base class (e.g. DiscordInputEvent) consumes all the events derived from it.
+    :param consumed: The input event types which might be consumed.
+    :param reads_history: Will message history be read (e.g. for the startup backfill)?
+    :return: The intents, along with the reasons each was enabled.
+    """
+    reasons: Dict[str, List[str]] = {name: ["always needed"] for name in BASE_INTENTS}
+
+    consumed = tuple(consumed)
+    for event_type, needs in EVENT_INTENTS.items():
+        if not any(issubclass(event_type, consumer) for consumer in consumed):
+            continue
+        for name in needs:
+            reasons.setdefault(name, []).append(event_type.__name__)
+
+    if reads_history:
+        for name in HISTORY_INTENTS:
+            reasons.setdefault(name, []).append("reading message history")
+
+    return intents_from_names(reasons), reasons
+
+
+def intents_from_names(names: Iterable[str]) -> discord.Intents:
+    """
+    Build an Intents object with only the named intents enabled.
+
+    :param names: Names of intents, as used by discord.Intents (e.g. "guild_messages").
+    :return:
+    """
+    intents = discord.Intents.none()
+
+    for name in names:
+        if name not in discord.Intents.VALID_FLAGS:
+            raise ValueError(f"Unknown discord intent '{name}'")
+        setattr(intents, name, True)
+
+    return intents
+
+
+def member_cache_flags_from_names(names: Iterable[str]) -> discord.MemberCacheFlags:
+    """
+    Build a MemberCacheFlags object with only the named flags enabled.
+
+    :param names: Names of flags, as used by discord.MemberCacheFlags (e.g. "joined").
+    :return:
+    """
+    flags = discord.MemberCacheFlags.none()
+
+    for name in names:
+        if name not in discord.MemberCacheFlags.VALID_FLAGS:
+            raise ValueError(f"Unknown discord member cache flag '{name}'")
+        setattr(flags, name, True)
+
+    return flags
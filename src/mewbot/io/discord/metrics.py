@@ -0,0 +1,497 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Counters and latency histograms for the discord IO - exported in the Prometheus text format.
+
+The registry can be read with DiscordMetrics.render (a pull callback), or served over HTTP by
+MetricsServer for Prometheus to scrape.
+
+With shard workers, the gateway is read in the worker processes - so events received and
+filtered, and heartbeat latency, are not counted in the main process.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import bisect
+import contextlib
+import dataclasses
+import logging
+import time
+
+from aiohttp import web
+
+from mewbot.io.discord.pool import RateLimitWatcher
+
+# Upper bounds, in seconds, of the histogram buckets - from a millisecond to a minute
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# The content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    """
+    A label value, escaped for the Prometheus text format.
+
+    :param value:
+    :return:
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    """
+    A sample value, as the Prometheus text format writes it.
+
+    :param value:
+    :return:
+    """
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:  # pylint: disable=too-few-public-methods
+    """
+    A named metric - optionally split into series by the value of one label.
+    """
+
+    name: str
+    help: str
+    label: Optional[str]
+    kind: str = "untyped"
+
+    def __init__(self, name: str, help_text: str, label: Optional[str] = None) -> None:
+        """
+        Prepare the metric - it has no series until something is recorded.
+
+        :param name:
+        :param help_text:
+        :param label: The name of the label series are split by - if any.
+        """
+        self.name = name
+        self.help = help_text
+        self.label = label
+
+    def _labels(self, value: str, extra: str = "") -> str:
+        """
+        The label set of a series, as written in the text format.
+
+        :param value: The series' value of the label.
+        :param extra: Further labels - already written out.
+        :return:
+        """
+        labels = [f'{self.label}="{_escape(value)}"'] if self.label is not None else []
+        if extra:
+            labels.append(extra)
+        return "{" + ",".join(labels) + "}" if labels else ""
+
+    def render(self) -> List[str]:
+        """
+        The lines for this metric in the text format.
+        """
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """
+    A total which only goes up.
+    """
+
+    kind = "counter"
+
+    _values: Dict[str, float]
+
+    def __init__(self, name: str, help_text: str, label: Optional[str] = None) -> None:
+        """
+        Prepare the counter.
+
+        :param name:
+        :param help_text:
+        :param label:
+        """
+        super().__init__(name, help_text, label)
+        self._values = {}
+
+    def inc(self, label: str = "", amount: float = 1.0) -> None:
+        """
+        Add to the total of a series.
+
+        :param label: The series' value of the label.
+        :param amount:
+        :return:
+        """
+        self._values[label] = self._values.get(label, 0.0) + amount
+
+    def value(self, label: str = "") -> float:
+        """
+        The total of a series - 0 if nothing was recorded.
+
+        :param label:
+        :return:
+        """
+        return self._values.get(label, 0.0)
+
+    def render(self) -> List[str]:
+        """
+        The lines for this counter in the text format.
+        """
+        lines = super().render()
+        for label, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{self._labels(label)} {_number(value)}")
+        return lines
+
+
+@dataclasses.dataclass
+class _Series:
+    """
+    The observations of one series of a histogram.
+    """
+
+    # The number of observations in each bucket - not cumulative
+    counts: List[int]
+    total: float = 0.0
+    count: int = 0
+
+
+class Histogram(_Metric):
+    """
+    The distribution of a duration - counted into buckets.
+    """
+
+    kind = "histogram"
+
+    _buckets: Tuple[float, ...]
+    _series: Dict[str, _Series]
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label: Optional[str] = None,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        """
+        Prepare the histogram.
+
+        :param name:
+        :param help_text:
+        :param label:
+        :param buckets: The upper bounds of the buckets - a +Inf bucket is always added.
+        """
+        super().__init__(name, help_text, label)
+        self._buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value: float, label: str = "") -> None:
+        """
+        Record an observation.
+
+        :param value:
+        :param label: The series' value of the label.
+        :return:
+        """
+        series = self._series.get(label)
+        if series is None:
+            series = self._series[label] = _Series([0] * (len(self._buckets) + 1))
+
+        # The first bucket whose upper bound is at least the value - past the end for +Inf
+        series.counts[bisect.bisect_left(self._buckets, value)] += 1
+        series.total += value
+        series.count += 1
+
+    @contextlib.contextmanager
+    def time(self, label: str = "") -> Iterator[None]:
+        """
+        Observe the time taken by the body of the with statement.
+
+        :param label:
+        :return:
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, label)
+
+    def count(self, label: str = "") -> int:
+        """
+        The number of observations in a series.
+
+        :param label:
+        :return:
+        """
+        series = self._series.get(label)
+        return series.count if series is not None else 0
+
+    def render(self) -> List[str]:
+        """
+        The lines for this histogram in the text format.
+        """
+        lines = super().render()
+        for label, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self._buckets + (float("inf"),), series.counts):
+                cumulative += count
+                bucket = self._labels(label, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(label)} {_number(series.total)}")
+            lines.append(f"{self.name}_count{self._labels(label)} {series.count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    A value which goes up and down - read from its sources when rendered.
+    """
+
+    kind = "gauge"
+
+    _sources: List[Callable[[], Dict[str, float]]]
+
+    def __init__(self, name: str, help_text: str, label: Optional[str] = None) -> None:
+        """
+        Prepare the gauge - it has no value until a source is added.
+
+        :param name:
+        :param help_text:
+        :param label:
+        """
+        super().__init__(name, help_text, label)
+        self._sources = []
+
+    def add_source(self, source: Callable[[], Dict[str, float]]) -> None:
+        """
+        Add a callable giving the current value of some series - by their value of the label.
+
+        :param source:
+        :return:
+        """
+        self._sources.append(source)
+
+    def values(self) -> Dict[str, float]:
+        """
+        The current value of each series.
+        """
+        values: Dict[str, float] = {}
+        for source in self._sources:
+            values.update(source())
+        return values
+
+    def render(self) -> List[str]:
+        """
+        The lines for this gauge in the text format.
+        """
+        lines = super().render()
+        for label, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{self._labels(label)} {_number(value)}")
+        return lines
+
+
+class DiscordMetrics:
+    """
+    The metrics kept by the discord IO.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # One attribute per metric - so the hot paths can reach them directly.
+
+    gateway_events: Counter
+    filtered_events: Counter
+    queue_put_seconds: Histogram
+    output_send_seconds: Histogram
+    rate_limits: Counter
+    rate_limit_retry_after_seconds: Counter
+    backfill_seconds: Histogram
+    reply_latency_seconds: Histogram
+    heartbeat_latency_seconds: Gauge
+
+    def __init__(self, prefix: str = "mewbot_discord") -> None:
+        """
+        Prepare the metrics - all empty.
+
+        :param prefix: Put in front of the name of every metric.
+        """
+        self.gateway_events = Counter(
+            f"{prefix}_gateway_events_total",
+            "Events dispatched by the discord client, by event.",
+            "event",
+        )
+        self.filtered_events = Counter(
+            f"{prefix}_filtered_events_total",
+            "Events held back by the event filter, by event.",
+            "event",
+        )
+        self.queue_put_seconds = Histogram(
+            f"{prefix}_queue_put_seconds",
+            "Time spent waiting to put input events on the InputQueue.",
+        )
+        self.output_send_seconds = Histogram(
+            f"{prefix}_output_send_seconds",
+            "Time taken to send output events to discord, by output event type.",
+            "event_type",
+        )
+        self.rate_limits = Counter(
+            f"{prefix}_rate_limits_total", "429 responses received from discord."
+        )
+        self.rate_limit_retry_after_seconds = Counter(
+            f"{prefix}_rate_limit_retry_after_seconds_total",
+            "Seconds discord has asked the bot to wait, over all 429 responses.",
+        )
+        self.backfill_seconds = Histogram(
+            f"{prefix}_backfill_seconds",
+            "Time taken to retrieve messages from channel histories, by kind of backfill.",
+            "kind",
+            buckets=DEFAULT_BUCKETS + (120.0, 300.0, 600.0),
+        )
+        self.reply_latency_seconds = Histogram(
+            f"{prefix}_reply_latency_seconds",
+            "Time from a message arriving from the gateway to a reply to it being sent.",
+        )
+        self.heartbeat_latency_seconds = Gauge(
+            f"{prefix}_heartbeat_latency_seconds",
+            "The latest gateway heartbeat latency, by shard.",
+            "shard",
+        )
+
+    def all(self) -> List[_Metric]:
+        """
+        Every metric - in the order they are rendered.
+        """
+        return [
+            self.gateway_events,
+            self.filtered_events,
+            self.queue_put_seconds,
+            self.output_send_seconds,
+            self.rate_limits,
+            self.rate_limit_retry_after_seconds,
+            self.backfill_seconds,
+            self.reply_latency_seconds,
+            self.heartbeat_latency_seconds,
+        ]
+
+    def note_rate_limited(self, retry_after: float) -> None:
+        """
+        Record a 429 received from discord.
+
+        :param retry_after: Seconds discord has asked the bot to wait.
+        :return:
+        """
+        self.rate_limits.inc()
+        self.rate_limit_retry_after_seconds.inc(amount=retry_after)
+
+    def watch_rate_limits(self) -> None:
+        """
+        Count every 429 py-cord logs - whichever bot was sending.
+        """
+        RateLimitWatcher.install().listen(self.note_rate_limited)
+
+    def watch_latency(self, latencies: Callable[[], Dict[int, float]]) -> None:
+        """
+        Read heartbeat latencies, by shard id, from the given callable whenever rendered.
+
+        :param latencies: e.g. the shard_latencies method of the client.
+        :return:
+        """
+
+        def read() -> Dict[str, float]:
+            # py-cord reports infinite latency before the first heartbeat
+            return {
+                str(shard_id): latency
+                for shard_id, latency in latencies().items()
+                if latency != float("inf")
+            }
+
+        self.heartbeat_latency_seconds.add_source(read)
+
+    def render(self) -> str:
+        """
+        Every metric, in the Prometheus text format.
+        """
+        lines: List[str] = []
+        for metric in self.all():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves the metrics over HTTP - at /metrics, for Prometheus to scrape.
+    """
+
+    _metrics: DiscordMetrics
+    _host: str
+    _port: int
+    _logger: logging.Logger
+    _runner: Optional[web.AppRunner]
+
+    def __init__(
+        self,
+        metrics: DiscordMetrics,
+        port: int,
+        host: str = "127.0.0.1",
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """
+        Prepare the server - it does not listen until started.
+
+        :param metrics:
+        :param port:
+        :param host: Defaults to only listening locally.
+        :param logger:
+        """
+        self._metrics = metrics
+        self._host = host
+        self._port = port
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+        self._runner = None
+
+    async def _handle(self, _: web.Request) -> web.Response:
+        """
+        Respond to a scrape with the current metrics.
+        """
+        return web.Response(
+            body=self._metrics.render().encode(), headers={"Content-Type": CONTENT_TYPE}
+        )
+
+    async def start(self) -> None:
+        """
+        Start listening.
+        """
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+
+        self._logger.info("Serving metrics on http://%s:%s/metrics", self._host, self._port)
+
+    async def stop(self) -> None:
+        """
+        Stop listening.
+        """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
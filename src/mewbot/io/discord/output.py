@@ -0,0 +1,474 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Writes output events to discord.
+
+Each output event type is sent by a handler registered against it.
+The handler for an event is the one registered against the nearest class in the event type's
+MRO - so handlers for new event types can be registered without touching DiscordOutput.
+"""
+
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    ClassVar,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Type,
+    TypeVar,
+)
+
+import functools
+import logging
+import time
+import uuid
+
+import discord
+from mewbot.api.v1 import Output, OutputEvent
+
+from mewbot.io.discord.attachments import (
+    DEFAULT_UPLOAD_LIMIT,
+    DiscordAttachment,
+    batches,
+    oversized,
+)
+from mewbot.io.discord.channels import ChannelResolver
+from mewbot.io.discord.coalesce import OutputCoalescer, OutputTarget
+from mewbot.io.discord.events import (
+    DiscordOutputEvent,
+    DiscordPostToChannelOutputEvent,
+    DiscordReplyIntoMessageChannelOutputEvent,
+    DiscordReplyToMessageOutputEvent,
+)
+from mewbot.io.discord.metrics import DiscordMetrics
+from mewbot.io.discord.pool import OutputPool
+from mewbot.io.discord.scheduler import ChannelOutputScheduler, OutputAction
+from mewbot.io.discord.tracing import EventTracer
+
+if TYPE_CHECKING:
+    from mewbot.io.discord.client import InternalMewbotDiscordClient
+
+# Sends an output event - returning True if it was sent
+OutputHandler = Callable[["DiscordOutput", Any], Awaitable[bool]]
+HandlerT = TypeVar("HandlerT", bound=OutputHandler)
+
+
+class DiscordOutput(Output):
+    """
+    Output class to write events to connected Discord servers.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # Each of the optional stages output can pass through is held separately.
+
+    output_uuid: str
+
+    # The handler registered against each output event type - on this class alone.
+    # Each subclass gets its own, and falls back to those of its bases.
+    _handlers: ClassVar[Dict[Type[OutputEvent], OutputHandler]] = {}
+    # The handler found for each event type seen - None if there is none
+    _resolved: ClassVar[Dict[Type[OutputEvent], Optional[OutputHandler]]] = {}
+
+    _client: InternalMewbotDiscordClient
+    _scheduler: Optional[ChannelOutputScheduler]
+    _coalescer: Optional[OutputCoalescer]
+    _channels: ChannelResolver
+    _pool: OutputPool
+    _metrics: Optional[DiscordMetrics]
+    _tracer: Optional[EventTracer]
+    _upload_limit: int
+    _logger: logging.Logger
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        active_client: InternalMewbotDiscordClient,
+        *,
+        scheduler: Optional[ChannelOutputScheduler] = None,
+        coalesce_window: float = 0.0,
+        coalesce_separator: str = "\n",
+        channels: Optional[ChannelResolver] = None,
+        upload_limit: int = 0,
+        pool: Optional[OutputPool] = None,
+        metrics: Optional[DiscordMetrics] = None,
+        tracer: Optional[EventTracer] = None,
+    ):
+        """
+        Initialise this class with a client to effect changes to discord beyond replying.
+
+        :param active_client:
+        :param scheduler:
+            Queues output per channel, to be sent concurrently across channels.
+            If None, output is sent before output() returns.
+        :param coalesce_window:
+            Seconds to hold text output for - joining texts sent to the same place meanwhile
+            into one message. 0 sends every event as its own message.
+        :param coalesce_separator:
+            Placed between joined texts.
+        :param channels:
+            Finds channels to post to by id - defaults to one with the default cache settings.
+        :param upload_limit:
+            The largest file, in bytes, which will be uploaded. 0 uses the limit of the guild
+            being posted to.
+        :param pool:
+            The bots output can be sent with - defaults to just the active client.
+        :param metrics:
+            Where the time taken to send each event is recorded - if anywhere.
+        :param tracer:
+            Completes the trace of the message each reply is to - if given.
+        """
+        self._client = active_client
+        self._channels = channels if channels is not None else ChannelResolver(active_client)
+        self._upload_limit = upload_limit
+        self._pool = pool if pool is not None else OutputPool(active_client)
+        self._metrics = metrics
+        self._tracer = tracer
+        self._logger = logging.getLogger(__name__ + "DiscordOutput")
+        self._scheduler = scheduler
+        self._coalescer = (
+            OutputCoalescer(coalesce_window, self._send, coalesce_separator)
+            if coalesce_window > 0
+            else None
+        )
+
+        self.output_uuid = str(uuid.uuid4())
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        """
+        Give each subclass a registry of its own - so its handlers do not leak to its bases.
+        """
+        super().__init_subclass__(**kwargs)
+        cls._handlers = {}
+        cls._resolved = {}
+
+    @classmethod
+    def register_handler(
+        cls, event_type: Type[OutputEvent]
+    ) -> Callable[[HandlerT], HandlerT]:
+        """
+        Decorator registering a handler to send the given type of output event.
+
+        The handler is called with the DiscordOutput and the event, and is used for subclasses
+        of the event type which have no handler of their own.
+        Registering against an already handled type replaces the existing handler.
+        Handlers registered on a subclass of DiscordOutput are only used by that subclass (and
+        its own subclasses) - handlers registered on DiscordOutput are used by all of them.
+
+            @DiscordOutput.register_handler(MyPollOutputEvent)
+            async def send_poll(output: DiscordOutput, event: MyPollOutputEvent) -> bool:
+                ...
+
+        :param event_type:
+        :return:
+        """
+
+        def register(handler: HandlerT) -> HandlerT:
+            cls._handlers[event_type] = handler
+            cls._forget_resolved()
+            return handler
+
+        return register
+
+    @classmethod
+    def handler_for(cls, event_type: Type[OutputEvent]) -> Optional[OutputHandler]:
+        """
+        The handler which sends the given type of output event - if there is one.
+
+        Found by walking the type's MRO the first time it is seen, then cached.
+        :param event_type:
+        :return:
+        """
+        try:
+            return cls._resolved[event_type]
+        except KeyError:
+            pass
+
+        handlers = cls._registered()
+        handler = next(
+            (handlers[base] for base in event_type.__mro__ if base in handlers),
+            None,
+        )
+        cls._resolved[event_type] = handler
+        return handler
+
+    @classmethod
+    def _registered(cls) -> Dict[Type[OutputEvent], OutputHandler]:
+        """
+        The handlers this class uses - those registered on it over those of its bases.
+
+        :return:
+        """
+        handlers: Dict[Type[OutputEvent], OutputHandler] = {}
+        for klass in reversed(cls.__mro__):
+            handlers.update(vars(klass).get("_handlers", {}))
+        return handlers
+
+    @classmethod
+    def _forget_resolved(cls) -> None:
+        """
+        Drop the handlers found for this class, and its subclasses - which share its handlers.
+        """
+        pending: List[type] = [cls]
+        while pending:
+            klass = pending.pop()
+            vars(klass)["_resolved"].clear()
+            pending.extend(klass.__subclasses__())
+
+    @classmethod
+    def consumes_outputs(cls) -> Set[Type[OutputEvent]]:
+        """
+        Defines the set of output events that this Output class can consume.
+
+        Only the root types are given - those which are not subclasses of another handled type.
+        The bot runner calls output once for each of these an event is an instance of, so
+        listing subclasses as well would send their events more than once.
+        """
+        handled = set(cls._registered())
+        return {
+            event_type
+            for event_type in handled
+            if not any(base in handled for base in event_type.__mro__[1:])
+        }
+
+    async def output(self, event: OutputEvent) -> bool:
+        """
+        Does the work of transmitting the event to the world.
+
+        If there is a scheduler (or coalescing is enabled), the event is only queued to be sent -
+        True means it was queued.
+        :param event:
+        :return:
+        """
+        handler = self.handler_for(type(event))
+        if handler is None:
+            return False
+
+        if self._coalescer is not None and isinstance(event, DiscordOutputEvent):
+            target = self._coalesce_target(event)
+            if target is not None:
+                await self._coalescer.add(target, event)
+                return True
+
+        return await self._send(event, handler)
+
+    async def close(self) -> None:
+        """
+        Send any output still being held back - then close the other bots in the pool.
+
+        Called as the IO stops.
+        """
+        if self._coalescer is not None:
+            await self._coalescer.flush()
+        if self._scheduler is not None:
+            await self._scheduler.join()
+        await self._pool.close()
+
+    async def _send(
+        self, event: OutputEvent, handler: Optional[OutputHandler] = None
+    ) -> bool:
+        """
+        Send the event - or queue it to be sent, if there is a scheduler.
+
+        Events with no known channel are sent straight away, even if there is a scheduler.
+        :param event:
+        :param handler: The handler for the event - looked up if not given.
+        :return:
+        """
+        if handler is None:
+            handler = self.handler_for(type(event))
+            if handler is None:
+                return False
+
+        action: OutputAction = (
+            functools.partial(handler, self, event)
+            if self._metrics is None and self._tracer is None
+            else functools.partial(self._timed, handler, event)
+        )
+
+        channel_id = self._channel_for(event) if self._scheduler is not None else None
+        if self._scheduler is None or channel_id is None:
+            return await action()
+
+        self._scheduler.submit(channel_id, action)
+        return True
+
+    async def _timed(self, handler: OutputHandler, event: OutputEvent) -> bool:
+        """
+        Send the event with the given handler - recording the time taken, and the whole trace.
+
+        :param handler:
+        :param event:
+        :return:
+        """
+        start = time.monotonic()
+        sent = await handler(self, event)
+        end = time.monotonic()
+
+        total = self._tracer.sent(event, start, end) if self._tracer is not None else None
+        if self._metrics is not None:
+            self._metrics.output_send_seconds.observe(end - start, type(event).__name__)
+            if total is not None:
+                self._metrics.reply_latency_seconds.observe(total)
+        return sent
+
+    @staticmethod
+    def _channel_for(event: OutputEvent) -> Optional[int]:
+        """
+        The id of the channel the given event will be sent to - if known.
+
+        :param event:
+        :return:
+        """
+        if isinstance(event, DiscordPostToChannelOutputEvent):
+            return event.channel_id
+
+        if isinstance(event, DiscordOutputEvent) and event.message is not None:
+            return event.message.channel.id
+
+        return None
+
+    @staticmethod
+    def _coalesce_target(event: DiscordOutputEvent) -> Optional[OutputTarget]:
+        """
+        Where the given event's text is going - if it can be joined with other text sent there.
+
+        Replies are only joined with other replies to the same message.
+        :param event:
+        :return:
+        """
+        if isinstance(event, DiscordPostToChannelOutputEvent):
+            if event.picture is not None or event.attachments:
+                return None
+            return event.channel_id, None
+
+        if isinstance(event, DiscordReplyToMessageOutputEvent):
+            return event.message.channel.id, event.message.id
+
+        # Subclasses from elsewhere may not be plain text - so are never joined
+        if (
+            type(event) in (DiscordReplyIntoMessageChannelOutputEvent, DiscordOutputEvent)
+            and event.message is not None
+        ):
+            return event.message.channel.id, None
+
+        return None
+
+    async def _process_reply_to_message(
+        self, event: DiscordReplyToMessageOutputEvent
+    ) -> bool:
+        """
+        Process a DiscordReplyToMessageOutputEvent event.
+
+        :param event:
+        :return:
+        """
+        message = await self._pool.message(event.message)
+        # PartialMessage borrows reply from Message - which confuses the type checker
+        await message.reply(event.text)  # type: ignore[misc]
+        return True
+
+    async def _process_reply_into_message_channel_event(
+        self, event: DiscordReplyIntoMessageChannelOutputEvent
+    ) -> bool:
+        """
+        Reply into the same channel which produced the message.
+
+        :param event:
+        :return:
+        """
+        channel = await self._pool.channel(event.message.channel)
+        await channel.send(event.text)
+        return True
+
+    async def _process_bare_event(self, event: DiscordOutputEvent) -> bool:
+        """
+        Process a bare DiscordOutputEvent event.
+
+        :param event:
+        :return:
+        """
+        # Don't know how to send this message
+        if event.message is None:
+            return False
+
+        channel = await self._pool.channel(event.message.channel)
+        await channel.send(event.text)
+        return True
+
+    async def _process_post_to_channel_output_evnet(
+        self, event: DiscordPostToChannelOutputEvent
+    ) -> bool:
+        """
+        Process a DiscordPostToChannelOutputEvent.
+
+        This instructs the bot to post to an existing channel.
+        The sizes of any files are checked before anything is sent - or the channel looked up.
+        More than 10 files are sent over several messages - the text is sent with the first.
+        :param event:
+        :return:
+        """
+        attachments = list(event.attachments)
+        if event.picture is not None:
+            attachments.insert(0, DiscordAttachment.named(event.picture, "picture"))
+
+        try:
+            problems = oversized(attachments, self._upload_limit_for(event.channel_id))
+        except OSError as exp:
+            self._logger.warning("Cannot attach file to post - %s", exp)
+            return False
+        if problems:
+            self._logger.warning("Files are too large to post - %s", ", ".join(problems))
+            return False
+
+        resolved = await self._channels.resolve(event.channel_id)
+        if resolved is None:
+            return False
+        channel = await self._pool.channel(resolved)
+
+        if not attachments:
+            await channel.send(event.text)
+            return True
+
+        for number, group in enumerate(batches(attachments)):
+            await channel.send(
+                event.text if number == 0 else None,
+                files=[attachment.file() for attachment in group],
+            )
+
+        return True
+
+    def _upload_limit_for(self, channel_id: int) -> int:
+        """
+        The largest file which can be uploaded to the given channel - without a network call.
+
+        :param channel_id:
+        :return:
+        """
+        if self._upload_limit:
+            return self._upload_limit
+
+        guild = getattr(self._client.get_channel(channel_id), "guild", None)
+        if isinstance(guild, discord.Guild):
+            return guild.filesize_limit
+        return DEFAULT_UPLOAD_LIMIT
+
+
+DiscordOutput.register_handler(DiscordOutputEvent)(
+    DiscordOutput._process_bare_event  # pylint: disable=protected-access
+)
+DiscordOutput.register_handler(DiscordReplyToMessageOutputEvent)(
+    DiscordOutput._process_reply_to_message  # pylint: disable=protected-access
+)
+DiscordOutput.register_handler(DiscordReplyIntoMessageChannelOutputEvent)(
+    DiscordOutput._process_reply_into_message_channel_event  # pylint: disable=protected-access
+)
+DiscordOutput.register_handler(DiscordPostToChannelOutputEvent)(
+    DiscordOutput._process_post_to_channel_output_evnet  # pylint: disable=protected-access
+)
@@ -0,0 +1,329 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Spreads output between several bots in the same guilds - so output is not held to one bot's
+rate limits.
+
+The first bot is the one the DiscordInput connects as. The others only log in - they send
+over REST, and never connect to the gateway.
+Each channel is sent to by one bot (channel affinity) - or, under "least-limited", by the
+first bot, starting from that one, which is not currently rate limited.
+
+Rate limits are seen through py-cord's log - it logs each 429 it receives (then waits and
+retries). The bot which was sending at the time is recorded in a context variable, so the
+429 can be put down to it.
+With a scheduler, the bot is chosen before the scheduler's rate limit buckets are waited on -
+so each bot is held to its own limits - and that bot then sends.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import asyncio
+import contextvars
+import dataclasses
+import enum
+import functools
+import logging
+import time
+
+import discord
+
+from mewbot.io.discord.events import ActionableMessage
+
+# py-cord logs each 429 it receives with this message - the retry after time is its first arg
+RATE_LIMITED_MESSAGE = "We are being rate limited."
+
+# Called with the retry after time of each 429 received while sending
+_LIMITED: contextvars.ContextVar[Optional[Callable[[float], None]]] = contextvars.ContextVar(
+    "discord_output_limited", default=None
+)
+
+# The channel, and the bot chosen to send the next output to it from this task
+_CHOSEN: contextvars.ContextVar[Optional[Tuple[int, int]]] = contextvars.ContextVar(
+    "discord_output_chosen", default=None
+)
+
+# Channels which belong to the one bot - DMs and group DMs
+_PRIVATE_TYPES = (discord.ChannelType.private, discord.ChannelType.group)
+
+
+class PoolStrategy(enum.Enum):
+    """
+    How the bot to send each message with is chosen.
+    """
+
+    # Each channel is always sent to by the same bot
+    AFFINITY = "affinity"
+    # The channel's own bot, unless it is rate limited - then the next one which is not
+    LEAST_LIMITED = "least-limited"
+
+
+@dataclasses.dataclass
+class PoolMember:
+    """
+    One of the bots in the pool - and how it has fared.
+    """
+
+    client: discord.Client
+    # The token to log in with - empty if the client is already logged in
+    token: str = ""
+    sent: int = 0
+    limited: int = 0
+    # Total seconds discord has asked this bot to wait
+    retry_after: float = 0.0
+    # Monotonic time before which this bot is (as far as is known) rate limited
+    limited_until: float = 0.0
+    # Logs the bot in - resulting in whether it could be
+    login: Optional[asyncio.Task[bool]] = dataclasses.field(default=None, repr=False)
+
+
+class RateLimitWatcher(logging.Handler):
+    """
+    Watches py-cord's HTTP log for 429s - and reports them to the bot which was sending.
+
+    Listeners are also told of every 429 - whichever bot was sending.
+    """
+
+    _listeners: List[Callable[[float], None]]
+
+    def __init__(self, level: int = logging.NOTSET) -> None:
+        """
+        Prepare the watcher - with no listeners.
+
+        :param level:
+        """
+        super().__init__(level)
+        self._listeners = []
+
+    def listen(self, listener: Callable[[float], None]) -> None:
+        """
+        Call the given listener with the retry after time of every 429.
+
+        :param listener:
+        :return:
+        """
+        self._listeners.append(listener)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        Report a 429 to the bot which was sending - if any.
+
+        :param record:
+        :return:
+        """
+        if not str(record.msg).startswith(RATE_LIMITED_MESSAGE) or not record.args:
+            return
+
+        if not isinstance(record.args, tuple) or not isinstance(record.args[0], (int, float)):
+            return
+        retry_after = float(record.args[0])
+
+        report = _LIMITED.get()
+        if report is not None:
+            report(retry_after)
+        for listener in self._listeners:
+            listener(retry_after)
+
+    @classmethod
+    def install(cls) -> RateLimitWatcher:
+        """
+        Attach a watcher to py-cord's HTTP log - once.
+
+        :return: The watcher attached.
+        """
+        logger = logging.getLogger("discord.http")
+        for handler in logger.handlers:
+            if isinstance(handler, cls):
+                return handler
+
+        watcher = cls(logging.WARNING)
+        logger.addHandler(watcher)
+        return watcher
+
+
+class OutputPool:
+    """
+    The bots which output can be sent with - and the choice between them.
+    """
+
+    _members: List[PoolMember]
+    _strategy: PoolStrategy
+    _logger: logging.Logger
+
+    def __init__(
+        self,
+        client: discord.Client,
+        tokens: Sequence[str] = (),
+        strategy: PoolStrategy = PoolStrategy.AFFINITY,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """
+        Prepare the pool - the other bots are logged in as they are first used.
+
+        :param client: The bot the input connects as - DMs are always sent with it.
+        :param tokens: Tokens for the other bots - which must be in the same guilds.
+        :param strategy:
+        :param logger:
+        """
+        self._members = [PoolMember(client)] + [
+            PoolMember(discord.Client(intents=discord.Intents.none()), token)
+            for token in tokens
+        ]
+        self._strategy = strategy
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+
+        if len(self._members) > 1:
+            RateLimitWatcher.install()
+
+    @property
+    def members(self) -> Sequence[PoolMember]:
+        """
+        The bots in the pool - the input's bot first.
+        """
+        return self._members
+
+    def choose(self, channel_id: int) -> int:
+        """
+        The index of the bot to send to the given channel with.
+
+        :param channel_id:
+        :return:
+        """
+        count = len(self._members)
+        home = channel_id % count
+        if self._strategy is PoolStrategy.AFFINITY or count == 1:
+            return home
+
+        now = time.monotonic()
+        order = [(home + offset) % count for offset in range(count)]
+        for index in order:
+            if self._members[index].limited_until <= now:
+                return index
+        return min(order, key=lambda index: self._members[index].limited_until)
+
+    def sender_for(self, channel_id: int) -> int:
+        """
+        Choose the bot to send the next output to a channel with - from the current task.
+
+        Output sent to the channel from this task is then sent by that bot - so a scheduler can
+        keep to the rate limits of the bot which will actually send.
+        :param channel_id:
+        :return: The index of the bot.
+        """
+        channel = self._members[0].client.get_channel(channel_id)
+        index = self._index_for(channel_id, getattr(channel, "type", None))
+        _CHOSEN.set((channel_id, index))
+        return index
+
+    async def close(self) -> None:
+        """
+        Close the other bots' clients - the input's bot is closed by the input.
+        """
+        for member in self._members[1:]:
+            if member.login is not None and not member.login.done():
+                member.login.cancel()
+            await member.client.close()
+
+    async def channel(self, channel: discord.abc.Messageable) -> discord.abc.Messageable:
+        """
+        The given channel, as seen by the bot chosen to send to it.
+
+        Any 429s received while sending (from this task) are put down to that bot.
+        :param channel: A channel belonging to the input's bot.
+        :return:
+        """
+        index = await self._enter(channel)
+        if index == 0:
+            return channel
+
+        client = self._members[index].client
+        return client.get_partial_messageable(
+            getattr(channel, "id"), type=getattr(channel, "type", None)
+        )
+
+    async def message(self, message: ActionableMessage) -> ActionableMessage:
+        """
+        The given message, as seen by the bot chosen to send to its channel.
+
+        :param message: A message belonging to the input's bot.
+        :return:
+        """
+        channel = await self.channel(message.channel)
+        if channel is message.channel:
+            return message
+
+        assert isinstance(channel, discord.PartialMessageable)
+        return channel.get_partial_message(message.id)
+
+    async def _enter(self, channel: discord.abc.Messageable) -> int:
+        """
+        Choose the bot to send to the channel with, and make sure it is logged in.
+
+        :param channel:
+        :return: The index of the bot.
+        """
+        chosen = _CHOSEN.get()
+        if len(self._members) == 1:
+            index = 0
+        elif chosen is not None and chosen[0] == getattr(channel, "id"):
+            index = chosen[1]
+        else:
+            index = self._index_for(getattr(channel, "id"), getattr(channel, "type", None))
+
+        member = self._members[index]
+        if member.token:
+            if member.login is None:
+                member.login = asyncio.create_task(self._login(index))
+            if not await asyncio.shield(member.login):
+                index, member = 0, self._members[0]
+
+        member.sent += 1
+        _LIMITED.set(functools.partial(self.note_limited, index))
+        return index
+
+    def _index_for(self, channel_id: int, channel_type: Any) -> int:
+        """
+        The index of the bot to send to a channel of the given type with.
+
+        :param channel_id:
+        :param channel_type: None if not known.
+        :return:
+        """
+        # Each bot has its own DM channels - so DMs are always sent by the input's bot
+        if len(self._members) == 1 or channel_type in _PRIVATE_TYPES:
+            return 0
+        return self.choose(channel_id)
+
+    async def _login(self, index: int) -> bool:
+        """
+        Log one of the other bots in - output meant for it is sent by the input's bot if not.
+
+        :param index:
+        :return: Could the bot log in?
+        """
+        member = self._members[index]
+        try:
+            await member.client.login(member.token)
+        except (discord.LoginFailure, discord.HTTPException):
+            self._logger.exception("Bot %s in the output pool cannot log in", index)
+            return False
+        return True
+
+    def note_limited(self, index: int, retry_after: float) -> None:
+        """
+        Record that a bot has been rate limited.
+
+        :param index:
+        :param retry_after: Seconds discord has asked the bot to wait.
+        :return:
+        """
+        member = self._members[index]
+        member.limited += 1
+        member.retry_after += retry_after
+        member.limited_until = max(member.limited_until, time.monotonic() + retry_after)
+
+        self._logger.debug("Bot %s in the output pool limited for %.2fs", index, retry_after)
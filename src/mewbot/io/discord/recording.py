@@ -0,0 +1,159 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Records the raw dispatches the client receives from the gateway - so they can be replayed.
+
+The log is gzipped JSONL. The first line is a header, and each further line is a dispatch:
+
+    {"version": 1, "started": 1700000000.0}
+    {"t": 0.0, "e": "READY", "d": {...}}
+    {"t": 0.52, "e": "GUILD_CREATE", "d": {...}}
+    {"t": 3.1, "e": "MESSAGE_CREATE", "d": {...}}
+
+"t" is the seconds since the recording started, "e" the event name and "d" its payload - as
+py-cord received them, before parsing.
+
+Every dispatch is recorded - the READY, GUILD_CREATE and member chunks are needed to rebuild
+the guilds, channels and members the later events refer to.
+With shard workers, the gateway is read in the worker processes - so nothing is recorded.
+"""
+
+from __future__ import annotations
+
+from typing import IO, Any, Callable, Dict, Iterator, Optional
+
+import dataclasses
+import gzip
+import json
+import logging
+import time
+
+LOG_VERSION = 1
+
+Parser = Callable[[Any], None]
+
+
+@dataclasses.dataclass(frozen=True)
+class RecordedDispatch:
+    """
+    A dispatch from the gateway, as recorded.
+    """
+
+    # Seconds since the recording started
+    offset: float
+    event: str
+    data: Any
+
+
+class GatewayRecorder:
+    """
+    Writes every dispatch the client parses to a compressed log.
+    """
+
+    _path: str
+    _log: Optional[IO[str]]
+    _started: float
+    _logger: logging.Logger
+
+    recorded: int
+
+    def __init__(self, path: str, logger: Optional[logging.Logger] = None) -> None:
+        """
+        Prepare the recorder - the log is not written until it is installed.
+
+        :param path: The file to write the log to - replacing any there.
+        :param logger:
+        """
+        self._path = path
+        self._log = None
+        self._started = 0.0
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+
+        self.recorded = 0
+
+    def install(self, parsers: Dict[str, Parser]) -> None:
+        """
+        Wrap each of the client's gateway parsers, so what they are given is recorded first.
+
+        Must be done before the client connects - the gateway takes the parsers on connecting.
+        :param parsers: The client's gateway parsers - see gateway_parsers on the client.
+        :return:
+        """
+        try:
+            # Held open until close
+            self._log = gzip.open(  # pylint: disable=consider-using-with
+                self._path, "wt", encoding="utf-8"
+            )
+        except OSError:
+            self._logger.exception("Cannot open gateway log %s", self._path)
+            return
+
+        self._started = time.monotonic()
+        self._log.write(json.dumps({"version": LOG_VERSION, "started": time.time()}) + "\n")
+
+        for event, parser in parsers.items():
+            parsers[event] = self._recording(event, parser)
+
+    def _recording(self, event: str, parser: Parser) -> Parser:
+        """
+        Wrap a parser so its payloads are recorded before it parses them.
+
+        :param event:
+        :param parser:
+        :return:
+        """
+
+        def parse(data: Any) -> None:
+            self.record(event, data)
+            parser(data)
+
+        return parse
+
+    def record(self, event: str, data: Any) -> None:
+        """
+        Write a dispatch to the log.
+
+        The payload is serialised straight away - the parsers may change it.
+        :param event:
+        :param data:
+        :return:
+        """
+        if self._log is None:
+            return
+
+        offset = round(time.monotonic() - self._started, 6)
+        line = json.dumps({"t": offset, "e": event, "d": data}, separators=(",", ":"))
+        self._log.write(line + "\n")
+        self.recorded += 1
+
+    def close(self) -> None:
+        """
+        Finish the log - nothing more is recorded.
+        """
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+            self._logger.info("Recorded %s dispatches to %s", self.recorded, self._path)
+
+
+def read_log(path: str) -> Iterator[RecordedDispatch]:
+    """
+    The dispatches in a log written by a GatewayRecorder - in the order they were received.
+
+    A log cut short (e.g. by the bot being killed) is read up to where it ends.
+    :param path:
+    :return:
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as log:
+        header = json.loads(log.readline() or "{}")
+        if header.get("version") != LOG_VERSION:
+            raise ValueError(f"{path} is not a version {LOG_VERSION} gateway log")
+
+        try:
+            for line in log:
+                record = json.loads(line)
+                yield RecordedDispatch(record["t"], record["e"], record["d"])
+        except (EOFError, json.JSONDecodeError):
+            return
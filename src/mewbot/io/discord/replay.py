@@ -0,0 +1,99 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+An Input which replays a recorded gateway log - to reproduce incidents, or load test triggers.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import asyncio
+import dataclasses
+
+from mewbot.io.discord.client import CacheConfig
+from mewbot.io.discord.input import DiscordInput
+from mewbot.io.discord.recording import read_log
+
+
+class DiscordReplayInput(DiscordInput):
+    """
+    Feeds a log written by a GatewayRecorder through a client which never connects to discord.
+
+    Each recorded payload is parsed by py-cord and handled by the client, as it was live - so the
+    same input events are put on the wire, in the same order, every time.
+    Nothing is sent to discord: there is no startup backfill, and guilds are not chunked
+    (the member chunks in the log are replayed instead).
+
+    Logs are replayed through an unsharded client - so should be recorded from a single shard.
+    """
+
+    _log_path: str
+    _speed: float
+
+    def __init__(self, log_path: str, speed: float = 1.0, **options: Any) -> None:
+        """
+        Prepare to replay the log - the replay starts when the Input is run.
+
+        :param log_path: The log to replay.
+        :param speed:
+            How many times faster than recorded to replay - 0 for as fast as possible.
+        :param options:
+            Keyword arguments for the DiscordInput - e.g. intents, event_filter, compact_events.
+            The startup backfill, stored cursors, shards and workers are not available.
+        """
+        assert speed >= 0, "The replay speed cannot be negative"
+        assert not options.get("shards") and not options.get(
+            "workers"
+        ), "Logs are replayed through an unsharded client"
+
+        cache = options.pop("cache", None) or CacheConfig()
+        super().__init__(
+            "", cache=dataclasses.replace(cache, chunk_guilds_at_startup=False), **options
+        )
+
+        self._log_path = log_path
+        self._speed = speed
+
+    async def _connect(self) -> None:
+        """
+        Replay the log - once every event in it is on the wire, the Input stops.
+        """
+        parsers = self._client.gateway_parsers()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        replayed = 0
+        ready = False
+
+        self._logger.info("Replaying %s at %sx", self._log_path, self._speed or "max")
+
+        for dispatch in read_log(self._log_path):
+            if self._speed:
+                delay = start + dispatch.offset / self._speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            parser = parsers.get(dispatch.event)
+            if parser is None:
+                self._logger.debug("No parser for %s - skipping", dispatch.event)
+                continue
+
+            try:
+                parser(dispatch.data)
+            except Exception:  # pylint: disable=broad-except
+                self._logger.exception("Failed to replay %s", dispatch.event)
+                continue
+
+            replayed += 1
+            ready = ready or dispatch.event == "READY"
+            # Let the handlers for this dispatch run before parsing the next
+            await asyncio.sleep(0)
+
+        # py-cord holds the ready event back until the guilds have stopped arriving
+        if ready:
+            await self._client.wait_until_ready()
+        await self._client.drain()
+
+        self._logger.info("Replayed %s dispatches from %s", replayed, self._log_path)
@@ -0,0 +1,270 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Schedules output to discord - in order within each channel, concurrently across channels.
+
+Sending inline means a rate limited (or slow) channel holds up output to every other channel.
+The scheduler keeps one ordered queue per channel, and drains the queues concurrently - up to a
+global concurrency cap.
+Discord's limits are kept to up front - by token buckets for each channel, and for the bot as a
+whole - rather than by waiting out a 429.
+When output is spread over several bots, the limits are each bot's own - so the buckets are
+kept for the bot which will send (see OutputPool.sender_for).
+"""
+
+from __future__ import annotations
+
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import asyncio
+import collections
+import logging
+import time
+
+# Discord allows roughly 5 messages every 5 seconds into each channel
+CHANNEL_BURST = 5
+CHANNEL_RATE = 1.0
+# And 50 requests a second, across all routes, for each bot
+GLOBAL_BURST = 50
+GLOBAL_RATE = 50.0
+
+OutputAction = Callable[[], Awaitable[bool]]
+
+
+class TokenBucket:  # pylint: disable=too-few-public-methods
+    """
+    Allows bursts of up to capacity actions, refilling at rate actions per second.
+    """
+
+    _capacity: float
+    _rate: float
+    _tokens: float
+    _updated: float
+
+    def __init__(self, capacity: float, rate: float) -> None:
+        """
+        Start with a full bucket.
+
+        :param capacity: The most actions which can be taken at once.
+        :param rate: Actions per second, once the bucket is empty.
+        """
+        assert capacity >= 1 and rate > 0, "A token bucket needs a capacity and a rate"
+
+        self._capacity = capacity
+        self._rate = rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        """
+        Add the tokens which have accrued since the last refill.
+        """
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    @property
+    def full(self) -> bool:
+        """
+        Has the bucket refilled to its capacity - so is no different from a new one?
+        """
+        self._refill()
+        return self._tokens >= self._capacity
+
+    async def acquire(self) -> None:
+        """
+        Wait until an action can be taken, and take it.
+        """
+        self._refill()
+        while self._tokens < 1:
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+            self._refill()
+        self._tokens -= 1
+
+
+class ChannelOutputScheduler:
+    """
+    One ordered queue of output actions per channel - drained concurrently across channels.
+
+    A worker task is started for a channel when an action is queued for it, and stops once the
+    channel's queue is empty - so idle channels cost nothing.
+    A channel's bucket is kept while it refills, and dropped once idle and full again - so the
+    buckets held are only those of channels output went to recently.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # The limits, and the queue, bucket and worker of each channel.
+
+    _logger: logging.Logger
+    _concurrency: asyncio.Semaphore
+    _channel_burst: int
+    _channel_rate: float
+    _global_burst: int
+    _global_rate: float
+    # Chooses which bot will take the next action in a channel - buckets are kept for each
+    _sender: Callable[[int], int]
+
+    _queues: Dict[int, Deque[OutputAction]]
+    # Keyed by the bot sending, then the channel
+    _buckets: Dict[Tuple[int, int], TokenBucket]
+    # Keyed by the bot sending
+    _global_buckets: Dict[int, TokenBucket]
+    _workers: Dict[int, asyncio.Task[None]]
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        concurrency: int,
+        *,
+        channel_burst: int = CHANNEL_BURST,
+        channel_rate: float = CHANNEL_RATE,
+        global_burst: int = GLOBAL_BURST,
+        global_rate: float = GLOBAL_RATE,
+        sender: Optional[Callable[[int], int]] = None,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """
+        Prepare the scheduler - no tasks are started until output is submitted.
+
+        :param concurrency: The most actions which can be in progress at once, across channels.
+        :param channel_burst: The most actions which can be taken at once in a channel.
+        :param channel_rate: Actions per second in a channel, once the burst is used up.
+        :param global_burst: The most actions which can be taken at once, across channels.
+        :param global_rate: Actions per second across channels, once the burst is used up.
+        :param sender:
+            Called with the channel before each action - returns which bot will take it.
+            None if there is only the one bot.
+        :param logger:
+        """
+        assert concurrency > 0, "The scheduler needs to be able to send at least one message"
+
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+        self._concurrency = asyncio.Semaphore(concurrency)
+        self._channel_burst = channel_burst
+        self._channel_rate = channel_rate
+        self._global_burst = global_burst
+        self._global_rate = global_rate
+        self._sender = sender if sender is not None else lambda _: 0
+
+        self._queues = {}
+        self._buckets = {}
+        self._global_buckets = {}
+        self._workers = {}
+
+    def pending(self, channel_id: Optional[int] = None) -> int:
+        """
+        The number of actions waiting to be taken - in one channel, or in all of them.
+
+        :param channel_id:
+        :return:
+        """
+        if channel_id is not None:
+            return len(self._queues.get(channel_id, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def buckets_held(self) -> int:
+        """
+        The number of channel rate limit buckets being held - as they have not refilled.
+        """
+        return len(self._buckets)
+
+    def submit(self, channel_id: int, action: OutputAction) -> None:
+        """
+        Queue an action to be taken in the given channel - after those already queued there.
+
+        :param channel_id:
+        :param action: Called to take the action, when it is the channel's turn.
+        :return:
+        """
+        self._queues.setdefault(channel_id, collections.deque()).append(action)
+
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.create_task(self._drain(channel_id))
+
+    async def join(self) -> None:
+        """
+        Wait until every queued action has been taken.
+        """
+        while self._workers:
+            await asyncio.gather(*self._workers.values())
+
+    async def _drain(self, channel_id: int) -> None:
+        """
+        Take each of the actions queued for a channel, in order.
+
+        :param channel_id:
+        :return:
+        """
+        queue = self._queues[channel_id]
+
+        try:
+            while queue:
+                action = queue.popleft()
+                sender = self._sender(channel_id)
+
+                # Waiting on the channel's limit should not hold up other channels
+                await self._bucket(sender, channel_id).acquire()
+                async with self._concurrency:
+                    await self._global_bucket(sender).acquire()
+                    await self._take(channel_id, action)
+        finally:
+            del self._workers[channel_id]
+            if not queue:
+                del self._queues[channel_id]
+            self._drop_full_buckets()
+
+    def _bucket(self, sender: int, channel_id: int) -> TokenBucket:
+        """
+        The bucket for a bot's actions in a channel.
+
+        :param sender:
+        :param channel_id:
+        :return:
+        """
+        bucket = self._buckets.get((sender, channel_id))
+        if bucket is None:
+            bucket = self._buckets[sender, channel_id] = TokenBucket(
+                self._channel_burst, self._channel_rate
+            )
+        return bucket
+
+    def _global_bucket(self, sender: int) -> TokenBucket:
+        """
+        The bucket for a bot's actions across every channel.
+
+        :param sender:
+        :return:
+        """
+        bucket = self._global_buckets.get(sender)
+        if bucket is None:
+            bucket = self._global_buckets[sender] = TokenBucket(
+                self._global_burst, self._global_rate
+            )
+        return bucket
+
+    def _drop_full_buckets(self) -> None:
+        """
+        Forget the buckets of idle channels which have refilled - a new one would be the same.
+        """
+        for key in [
+            key
+            for key, bucket in self._buckets.items()
+            if key[1] not in self._queues and bucket.full
+        ]:
+            del self._buckets[key]
+
+    async def _take(self, channel_id: int, action: OutputAction) -> None:
+        """
+        Take an action - logging (rather than raising) any failure.
+
+        :param channel_id:
+        :param action:
+        :return:
+        """
+        try:
+            if not await action():
+                self._logger.warning("Output to channel %s was not sent", channel_id)
+        except Exception:  # pylint: disable=broad-except
+            self._logger.exception("Failed to send output to channel %s", channel_id)
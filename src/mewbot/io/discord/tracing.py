@@ -0,0 +1,219 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Traces the latency of replies - from the gateway event which prompted them to their sending.
+
+Each message received from the gateway is stamped (by message id) when it is received, and
+when its input event is put on the InputQueue. Output events replying to the message carry
+it - so when one is sent, the time between each stage is known:
+
+    queue    - received from the gateway, to put on the InputQueue
+    pipeline - put on the InputQueue, to the output starting to send (triggers and actions)
+    send     - the output being sent (the REST calls)
+
+A sample of these spans can be written to a JSONL file, to be analysed offline.
+
+With shard workers, the gateway is read in the worker processes - so nothing is traced.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Sequence, TextIO
+
+import collections
+import dataclasses
+import json
+import logging
+import random
+import time
+
+from mewbot.api.v1 import InputEvent, OutputEvent
+
+from mewbot.io.discord.edits import edit_key
+from mewbot.io.discord.events import (
+    DiscordCompactMessageCreationEvent,
+    DiscordMessageCreationEvent,
+    DiscordOutputEvent,
+)
+
+
+def received_key(event: str, args: Sequence[Any]) -> Optional[int]:
+    """
+    The id of the message a gateway event is about - if it is one a reply might be sent to.
+
+    :param event: The name of the event, as dispatched by the client.
+    :param args: The arguments the event is dispatched with.
+    :return:
+    """
+    if event == "message":
+        return int(args[0].id)
+    if event == "message_edit":
+        return int(args[1].id)
+    if event == "raw_message_edit":
+        return int(args[0].message_id)
+    return None
+
+
+def input_key(event: InputEvent) -> Optional[int]:
+    """
+    The id of the message an input event is about - if it is one a reply might be sent to.
+
+    :param event:
+    :return:
+    """
+    if isinstance(event, DiscordMessageCreationEvent):
+        return int(event.message.id)
+    if isinstance(event, DiscordCompactMessageCreationEvent):
+        return event.snapshot.message_id
+    return edit_key(event)
+
+
+def output_key(event: OutputEvent) -> Optional[int]:
+    """
+    The id of the message an output event replies to - if any.
+
+    :param event:
+    :return:
+    """
+    if isinstance(event, DiscordOutputEvent) and event.message is not None:
+        return int(event.message.id)
+    return None
+
+
+@dataclasses.dataclass
+class EventTrace:
+    """
+    The monotonic times a message passed through each stage of the input.
+    """
+
+    received: float
+    enqueued: Optional[float] = None
+    # The type of input event the message became
+    input_type: str = ""
+
+
+class EventTracer:
+    """
+    Stamps messages as they pass through the input - and completes the trace as replies are sent.
+    """
+
+    _capacity: int
+    _sample_rate: float
+    _sink_path: str
+    _sink: Optional[TextIO]
+    _logger: logging.Logger
+
+    # The trace of each recent message - oldest first
+    _traces: collections.OrderedDict[int, EventTrace]
+
+    def __init__(
+        self,
+        sink_path: str = "",
+        sample_rate: float = 1.0,
+        capacity: int = 4096,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """
+        Prepare the tracer.
+
+        :param sink_path: The JSONL file sampled spans are appended to - "" to not write them.
+        :param sample_rate: The fraction of spans to write.
+        :param capacity: The most messages to hold traces for - the oldest are forgotten.
+        :param logger:
+        """
+        assert 0.0 <= sample_rate <= 1.0, "The sample rate must be between 0 and 1"
+        assert capacity > 0, "The tracer needs to be able to hold at least one trace"
+
+        self._capacity = capacity
+        self._sample_rate = sample_rate
+        self._sink_path = sink_path
+        self._sink = None
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+
+        self._traces = collections.OrderedDict()
+
+    def received(self, key: int) -> None:
+        """
+        Stamp a message as received from the gateway.
+
+        :param key: The id of the message.
+        :return:
+        """
+        self._traces[key] = EventTrace(time.monotonic())
+        self._traces.move_to_end(key)
+        if len(self._traces) > self._capacity:
+            self._traces.popitem(last=False)
+
+    def enqueued(self, event: InputEvent) -> None:
+        """
+        Stamp the message an input event is about as put on the InputQueue.
+
+        Events about messages which were not received from the gateway (e.g. retrieved from a
+        channel's history) are not traced.
+        :param event:
+        :return:
+        """
+        key = input_key(event)
+        trace = self._traces.get(key) if key is not None else None
+        if trace is not None and trace.enqueued is None:
+            trace.enqueued = time.monotonic()
+            trace.input_type = type(event).__name__
+
+    def sent(self, event: OutputEvent, start: float, end: float) -> Optional[float]:
+        """
+        Complete the trace of the message an output event replied to.
+
+        :param event:
+        :param start: The monotonic time the output started being sent.
+        :param end: The monotonic time it had been sent.
+        :return: Seconds from the message being received to the reply being sent - if traced.
+        """
+        key = output_key(event)
+        trace = self._traces.get(key) if key is not None else None
+        if trace is None or trace.enqueued is None:
+            return None
+
+        if self._sink_path and random.random() < self._sample_rate:
+            self._write(
+                {
+                    "time": time.time(),
+                    "message_id": key,
+                    "input": trace.input_type,
+                    "output": type(event).__name__,
+                    "queue": trace.enqueued - trace.received,
+                    "pipeline": start - trace.enqueued,
+                    "send": end - start,
+                    "total": end - trace.received,
+                }
+            )
+        return end - trace.received
+
+    def _write(self, span: Dict[str, Any]) -> None:
+        """
+        Append a span to the sink - opening it, if needed.
+
+        :param span:
+        :return:
+        """
+        if self._sink is None:
+            try:
+                # Held open until close
+                self._sink = open(  # pylint: disable=consider-using-with
+                    self._sink_path, "a", encoding="utf-8"
+                )
+            except OSError:
+                self._logger.exception("Cannot open trace sink %s", self._sink_path)
+                self._sink_path = ""
+                return
+
+        self._sink.write(json.dumps(span) + "\n")
+
+    def close(self) -> None:
+        """
+        Close the sink - it is reopened if more spans are written.
+        """
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
@@ -0,0 +1,424 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""
+Runs groups of gateway shards in worker processes - so parsing gateway traffic uses many cores.
+
+Each worker connects its shards, filters their events and turns them into compact events.
+These are sent in batches over a multiprocessing queue to the main process - which puts them
+on the InputQueue as though its own client had produced them.
+
+Only compact events are forwarded - full messages and members hold the worker's connection
+state, and cannot be sent between processes.
+The main process's client only logs in - it is used for output over REST, and never connects
+to the gateway.
+
+Each worker runs the startup backfill for its own shards' channels. The startup_queue_depth is
+divided between the workers, in proportion to their shards - so no more old messages are put
+on the wire between them than one client would have.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+import asyncio
+import dataclasses
+import logging
+import multiprocessing
+import queue
+import sys
+
+import discord
+from mewbot.api.v1 import InputEvent
+
+from mewbot.io.discord.backfill import BackfillConfig
+from mewbot.io.discord.client import CacheConfig, ShardConfig
+from mewbot.io.discord.cursors import ChannelCursors
+from mewbot.io.discord.events import (
+    DiscordCompactMessageCreationEvent,
+    DiscordCompactMessageDeleteInputEvent,
+    DiscordCompactMessageEditInputEvent,
+    DiscordRawMessageDeleteInputEvent,
+    DiscordRawMessageEditInputEvent,
+)
+from mewbot.io.discord.filters import DiscordEventFilter
+from mewbot.io.discord.input import DiscordInput
+
+# Events which hold the client - so can rebuild a message to reply to
+CLIENT_EVENTS = (DiscordCompactMessageCreationEvent, DiscordCompactMessageEditInputEvent)
+# The events which can be sent from a worker to the main process
+FORWARDED_EVENTS = CLIENT_EVENTS + (
+    DiscordCompactMessageDeleteInputEvent,
+    DiscordRawMessageEditInputEvent,
+    DiscordRawMessageDeleteInputEvent,
+)
+
+# The most events sent from a worker at once - each batch is pickled and sent as one item
+BATCH_SIZE = 256
+# Batches which can be waiting for the main process - beyond this, workers wait for it
+CHANNEL_DEPTH = 64
+# Seconds between checks that the workers are still alive, when there is nothing to read
+POLL_INTERVAL = 0.5
+
+# Seconds before a worker which has died is restarted - doubled each time it dies again
+RESTART_DELAY = 1.0
+RESTART_DELAY_MAX = 60.0
+# Restarts in a row after which the pool gives up on a worker, and stops
+MAX_RESTARTS = 5
+# Seconds a worker has to stay up for its earlier restarts to be forgotten
+STABLE_AFTER = 300.0
+
+# Exit codes for failures which restarting the worker would not fix
+EXIT_LOGIN_FAILURE = 3
+EXIT_INTENTS_REQUIRED = 4
+
+
+@dataclasses.dataclass(frozen=True)
+class ShardWorkerSpec:
+    """
+    Everything a worker process needs to run its shards - sent to it when it is started.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # Mirrors the settings of the DiscordInput the worker stands in for.
+
+    token: str
+    intents: discord.Intents
+    # The total number of shards the bot is split into
+    shard_count: int
+    # The shards this worker runs - empty until the shards are divided between the workers
+    shard_ids: Tuple[int, ...] = ()
+    # The old messages retrieved on startup - across every worker, until divided between them
+    startup_queue_depth: int = 0
+    backfill_config: BackfillConfig = dataclasses.field(default_factory=BackfillConfig)
+    # The workers share the one store - each only writes the channels its shards see
+    cursor_store: str = ""
+    cursor_flush_interval: float = 5.0
+    event_filter: DiscordEventFilter = dataclasses.field(default_factory=DiscordEventFilter)
+    clean_message_text: bool = True
+    raw_message_events: bool = False
+    suppress_unchanged_edits: bool = False
+    edit_debounce: float = 0.0
+    cache: CacheConfig = dataclasses.field(default_factory=CacheConfig)
+
+
+def divide_shards(shard_count: int, workers: int) -> List[Tuple[int, ...]]:
+    """
+    Divide the shards between the workers, as evenly as possible.
+
+    Shards are dealt out in turn - so each worker gets a spread of guilds.
+    :param shard_count:
+    :param workers:
+    :return:
+    """
+    workers = min(workers, shard_count)
+    return [tuple(range(index, shard_count, workers)) for index in range(workers)]
+
+
+def divide_depth(depth: int, groups: Sequence[Tuple[int, ...]]) -> List[int]:
+    """
+    Divide the startup_queue_depth between the workers - in proportion to their shards.
+
+    The shares add up to the depth. Each worker takes its share from its own shards' channels.
+    :param depth:
+    :param groups: The shards of each worker.
+    :return: The depth for each worker.
+    """
+    shards = sum(len(group) for group in groups)
+    shares = [depth * len(group) // shards for group in groups]
+    # Rounding down loses less than one message per worker - hand those out in turn
+    for index in range(depth - sum(shares)):
+        shares[index] += 1
+    return shares
+
+
+def run_worker(
+    spec: ShardWorkerSpec, channel: "multiprocessing.Queue[List[InputEvent]]"
+) -> None:
+    """
+    The entry point of a worker process - runs its shards until the process is stopped.
+
+    :param spec:
+    :param channel: Batches of events are sent to the main process over this.
+    :return:
+    """
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    # The exit code tells the main process why the worker stopped
+    try:
+        asyncio.run(_run_shards(spec, channel))
+    except discord.LoginFailure:
+        logger.exception("Worker for shards %s could not log in", spec.shard_ids)
+        sys.exit(EXIT_LOGIN_FAILURE)
+    except discord.PrivilegedIntentsRequired:
+        logger.exception("Worker for shards %s needs privileged intents", spec.shard_ids)
+        sys.exit(EXIT_INTENTS_REQUIRED)
+
+
+async def _run_shards(
+    spec: ShardWorkerSpec, channel: "multiprocessing.Queue[List[InputEvent]]"
+) -> None:
+    """
+    Run a DiscordInput for the worker's shards - forwarding the events it produces.
+
+    :param spec:
+    :param channel:
+    :return:
+    """
+    discord_input = DiscordInput(
+        spec.token,
+        spec.startup_queue_depth,
+        spec.backfill_config,
+        ChannelCursors(spec.cursor_store, spec.cursor_flush_interval),
+        intents=spec.intents,
+        event_filter=spec.event_filter,
+        clean_message_text=spec.clean_message_text,
+        compact_events=True,
+        raw_message_events=spec.raw_message_events,
+        suppress_unchanged_edits=spec.suppress_unchanged_edits,
+        edit_debounce=spec.edit_debounce,
+        shards=ShardConfig(shard_count=spec.shard_count, shard_ids=spec.shard_ids),
+        cache=spec.cache,
+    )
+    events: "asyncio.Queue[InputEvent]" = asyncio.Queue(BATCH_SIZE * CHANNEL_DEPTH)
+    discord_input.bind(events)
+
+    forwarder = asyncio.create_task(_forward(events, channel))
+    try:
+        await discord_input.run()
+    finally:
+        forwarder.cancel()
+
+
+async def _forward(
+    events: "asyncio.Queue[InputEvent]", channel: "multiprocessing.Queue[List[InputEvent]]"
+) -> None:
+    """
+    Send events to the main process in batches - as many as are waiting, up to BATCH_SIZE.
+
+    :param events:
+    :param channel:
+    :return:
+    """
+    logger = logging.getLogger(__name__)
+    loop = asyncio.get_running_loop()
+
+    while True:
+        batch: List[InputEvent] = []
+        event: Optional[InputEvent] = await events.get()
+        while event is not None and len(batch) < BATCH_SIZE:
+            if isinstance(event, FORWARDED_EVENTS):
+                # The worker's client cannot be sent - the main process attaches its own
+                batch.append(attach_client(event, None))
+            else:
+                logger.debug("Cannot forward %s from a worker", type(event).__name__)
+            event = events.get_nowait() if not events.empty() else None
+
+        if batch:
+            # Blocks while the main process is behind - which holds the shards' events back
+            await loop.run_in_executor(None, channel.put, batch)
+
+
+def attach_client(event: InputEvent, client: Optional[discord.Client]) -> InputEvent:
+    """
+    Set the client an event uses to rebuild its message - if it holds one.
+
+    :param event:
+    :param client:
+    :return: The event.
+    """
+    if isinstance(event, CLIENT_EVENTS):
+        event.client = client
+    return event
+
+
+@dataclasses.dataclass
+class _Worker:
+    """
+    A worker process - and how often it has had to be restarted.
+    """
+
+    index: int
+    spec: ShardWorkerSpec
+    # None while the worker is waiting to be (re)started
+    process: Any = None
+    # Restarts since the worker last stayed up for STABLE_AFTER seconds
+    restarts: int = 0
+    started_at: float = 0.0
+    # The worker is not restarted before this time
+    restart_at: float = 0.0
+
+
+class ShardWorkerPool:  # pylint: disable=too-few-public-methods
+    """
+    Starts worker processes for groups of shards, and collects the events they produce.
+
+    A worker which dies is restarted - its shards reconnect and, if back-filling is enabled,
+    pick up from the cursors. Restarts back off exponentially, and after MAX_RESTARTS in a row
+    the pool stops. It stops at once if a worker could not log in, or needs privileged intents
+    - restarting would not help.
+    """
+
+    _spec: ShardWorkerSpec
+    _workers: int
+    _logger: logging.Logger
+
+    def __init__(
+        self, spec: ShardWorkerSpec, workers: int, logger: Optional[logging.Logger] = None
+    ) -> None:
+        """
+        Prepare the pool - no processes are started until run is called.
+
+        :param spec: Settings for the workers - the shards are divided between them.
+        :param workers: The number of worker processes to run.
+        :param logger:
+        """
+        assert workers > 0, "A pool needs at least one worker"
+
+        self._spec = spec
+        self._workers = workers
+        self._logger = logger if logger is not None else logging.getLogger(__name__)
+
+    async def run(
+        self,
+        client: discord.Client,
+        deliver: Callable[[InputEvent], Awaitable[None]],
+    ) -> None:
+        """
+        Run the workers, delivering their events - until cancelled.
+
+        :param client: Logged in - used to find the shard count, and attached to the events.
+        :param deliver: Called with each event from the workers.
+        :return:
+        """
+        spec = self._spec
+        if not spec.shard_count:
+            shard_count, _ = await client.http.get_bot_gateway()
+            self._logger.info("Discord suggests %s shards", shard_count)
+            spec = dataclasses.replace(spec, shard_count=shard_count)
+
+        context = multiprocessing.get_context("spawn")
+        channel: "multiprocessing.Queue[List[InputEvent]]" = context.Queue(CHANNEL_DEPTH)
+        workers = [
+            _Worker(index, worker_spec)
+            for index, worker_spec in enumerate(self._worker_specs(spec))
+        ]
+
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                for worker in workers:
+                    self._supervise(context, worker, channel, loop.time())
+
+                batch = await loop.run_in_executor(None, _receive, channel)
+                for event in batch or []:
+                    await deliver(attach_client(event, client))
+        finally:
+            processes = [worker.process for worker in workers if worker.process is not None]
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+            channel.close()
+
+    def _worker_specs(self, spec: ShardWorkerSpec) -> List[ShardWorkerSpec]:
+        """
+        The settings for each worker - with its shards, and its share of the startup depth.
+
+        :param spec: Settings for all the workers - with the shard count known.
+        :return:
+        """
+        groups = divide_shards(spec.shard_count, self._workers)
+        return [
+            dataclasses.replace(spec, shard_ids=group, startup_queue_depth=depth)
+            for group, depth in zip(groups, divide_depth(spec.startup_queue_depth, groups))
+        ]
+
+    def _supervise(
+        self,
+        context: Any,
+        worker: _Worker,
+        channel: "multiprocessing.Queue[List[InputEvent]]",
+        now: float,
+    ) -> None:
+        """
+        Start the worker if it is not running - and it is time to (re)start it.
+
+        :param context: The multiprocessing context to start the worker with.
+        :param worker:
+        :param channel:
+        :param now: The current time, in seconds.
+        :return:
+        """
+        if worker.process is not None:
+            if worker.process.is_alive():
+                return
+            self._note_exit(worker, now)
+
+        if now < worker.restart_at:
+            return
+
+        worker.process = context.Process(
+            target=run_worker,
+            args=(worker.spec, channel),
+            name=f"discord-shards-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = now
+        self._logger.info(
+            "Started worker %s for shards %s", worker.index, worker.spec.shard_ids
+        )
+
+    def _note_exit(self, worker: _Worker, now: float) -> None:
+        """
+        Work out when a worker which has died should be restarted - or stop the pool.
+
+        :param worker:
+        :param now:
+        :return:
+        """
+        exitcode = worker.process.exitcode
+        worker.process = None
+
+        if exitcode == EXIT_LOGIN_FAILURE:
+            raise discord.LoginFailure(f"Worker {worker.index} could not log in")
+        if exitcode == EXIT_INTENTS_REQUIRED:
+            raise discord.PrivilegedIntentsRequired(worker.spec.shard_ids[0])
+
+        if now - worker.started_at >= STABLE_AFTER:
+            worker.restarts = 0
+        if worker.restarts >= MAX_RESTARTS:
+            raise RuntimeError(
+                f"Worker {worker.index} (shards {worker.spec.shard_ids}) exited with "
+                f"{exitcode} after {worker.restarts} restarts in a row - giving up"
+            )
+
+        delay = min(RESTART_DELAY * 2**worker.restarts, RESTART_DELAY_MAX)
+        worker.restarts += 1
+        worker.restart_at = now + delay
+        self._logger.error(
+            "Worker %s (shards %s) exited with %s - restarting it in %.0f seconds",
+            worker.index,
+            worker.spec.shard_ids,
+            exitcode,
+            delay,
+        )
+
+
+def _receive(
+    channel: "multiprocessing.Queue[List[InputEvent]]",
+) -> Optional[List[InputEvent]]:
+    """
+    Wait a short while for a batch of events - so the workers can be checked on in between.
+
+    :param channel:
+    :return:
+    """
+    try:
+        return channel.get(timeout=POLL_INTERVAL)
+    except queue.Empty:
+        return None
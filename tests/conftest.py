@@ -0,0 +1,68 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Fixtures shared between the discord IO tests."""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Optional, Type
+
+import asyncio
+import logging
+
+import discord
+import pytest
+from mewbot.api.registry import ComponentRegistry
+from mewbot.api.v1 import Trigger
+
+from mewbot.io.discord.client import InternalMewbotDiscordClient
+from mewbot.io.discord.filters import DiscordEventFilter
+
+
+@pytest.fixture
+def loaded_triggers(monkeypatch: pytest.MonkeyPatch) -> Callable[..., None]:
+    """
+    Make only the given triggers appear to be loaded.
+
+    Triggers stay registered once imported - so other tests' triggers would otherwise be seen.
+    """
+
+    def load(*triggers: Type[Trigger]) -> None:
+        registered: Any = [
+            component
+            for component in ComponentRegistry.registered
+            if not issubclass(component, Trigger)
+        ]
+        monkeypatch.setattr(ComponentRegistry, "registered", registered + list(triggers))
+
+    return load
+
+
+@pytest.fixture
+def make_client() -> Callable[..., InternalMewbotDiscordClient]:
+    """
+    Make clients, which are never connected, with empty message caches.
+
+    Their settings are the ones a DiscordInput would give them - before connecting them.
+    """
+
+    def make(
+        event_filter: Optional[DiscordEventFilter] = None,
+        *,
+        raw_message_events: bool = True,
+        suppress_unchanged_edits: bool = False,
+    ) -> InternalMewbotDiscordClient:
+        # pylint: disable=protected-access
+        client = InternalMewbotDiscordClient(intents=discord.Intents.none())
+        client._logger = logging.getLogger(__name__)
+        client._event_filter = (
+            event_filter if event_filter is not None else DiscordEventFilter()
+        )
+        client._compact_events = False
+        client._raw_message_events = raw_message_events
+        client._suppress_unchanged_edits = suppress_unchanged_edits
+        client.queue = asyncio.Queue()
+        return client
+
+    return make
@@ -0,0 +1,128 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing attaching files to posts."""
+
+from __future__ import annotations
+
+from typing import Any, List, Optional
+
+import pathlib
+
+import discord
+
+from mewbot.io.discord.attachments import (
+    DiscordAttachment,
+    MemoryViewReader,
+    batches,
+    oversized,
+)
+from mewbot.io.discord.events import DiscordPostToChannelOutputEvent
+from mewbot.io.discord.output import DiscordOutput
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+class FakeChannel:
+    """Records what is sent to it - reading any files as py-cord would."""
+
+    def __init__(self) -> None:
+        self.sent: List[Any] = []
+
+    async def send(self, content: Optional[str] = None, files: Any = None) -> None:
+        """Record the content, and the name and data of each file."""
+        self.sent.append((content, [(file.filename, file.fp.read()) for file in files or []]))
+
+
+class FakeResolver:
+    """Hands out the one channel - counting lookups."""
+
+    def __init__(self, channel: FakeChannel) -> None:
+        self.channel = channel
+        self.lookups = 0
+
+    async def resolve(self, _channel_id: int) -> Any:
+        """The channel."""
+        self.lookups += 1
+        return self.channel
+
+
+def make_output(resolver: FakeResolver, upload_limit: int = 0) -> DiscordOutput:
+    """An output which posts to the fake channel."""
+    client: Any = type("Client", (), {"get_channel": lambda self, _: None})()
+    return DiscordOutput(
+        active_client=client, channels=resolver, upload_limit=upload_limit  # type: ignore
+    )
+
+
+class TestAttachments:
+    """Testing attaching files to posts."""
+
+    def test_reader_does_not_copy_up_front(self) -> None:
+        """Data should be read in chunks through the view - and can be re-read."""
+        data = bytearray(b"0123456789")
+        reader = MemoryViewReader(data)
+
+        # The reader holds a view - so changes to the data are seen
+        data[0:1] = b"X"
+        assert reader.read(4) == b"X123"
+
+        buffer = bytearray(4)
+        assert reader.readinto(buffer) == 4
+        assert bytes(buffer) == b"4567"
+        assert reader.read() == b"89"
+
+        reader.seek(0)
+        assert reader.read(1) == b"X"
+
+    def test_names_and_sizes(self, tmp_path: pathlib.Path) -> None:
+        """Names should come from the path, or be made up from the data's type."""
+        path = tmp_path / "chart.svg"
+        path.write_bytes(b"<svg/>")
+
+        assert DiscordAttachment(path).name() == "chart.svg"
+        assert DiscordAttachment(path).size() == 6
+        assert DiscordAttachment(memoryview(PNG)).name("picture") == "picture.png"
+        assert DiscordAttachment(b"data").name() == "attachment.bin"
+        assert DiscordAttachment(b"data", "notes.txt").name() == "notes.txt"
+        assert DiscordAttachment.named(PNG, "picture").filename == "picture.png"
+        assert DiscordAttachment.named(path, "picture").filename == "chart.svg"
+        assert isinstance(DiscordAttachment(PNG).file(), discord.File)
+
+    def test_limits(self) -> None:
+        """Large files should be reported, and many files batched ten at a time."""
+        attachments = [DiscordAttachment(b"x" * size) for size in (10, 20, 30)]
+
+        assert oversized(attachments, 20) == ["attachment2.bin is 30 bytes"]
+        assert [len(x) for x in batches([DiscordAttachment(b"x")] * 23)] == [10, 10, 3]
+
+    async def test_post_with_attachments(self) -> None:
+        """The picture, then the attachments, should be sent - the text with the first batch."""
+        channel = FakeChannel()
+        output = make_output(FakeResolver(channel))
+
+        event = DiscordPostToChannelOutputEvent(
+            "chart", None, 1, memoryview(PNG), [DiscordAttachment(b"a")] * 10
+        )
+        assert await output.output(event)
+
+        assert [(content, len(files)) for content, files in channel.sent] == [
+            ("chart", 10),
+            (None, 1),
+        ]
+        assert channel.sent[0][1][0] == ("picture.png", PNG)
+
+    async def test_size_checked_before_network(self) -> None:
+        """Posts with files over the limit should not be sent - or the channel looked up."""
+        channel = FakeChannel()
+        resolver = FakeResolver(channel)
+        output = make_output(resolver, upload_limit=50)
+
+        assert not await output.output(DiscordPostToChannelOutputEvent("chart", None, 1, PNG))
+        assert resolver.lookups == 0
+        assert not channel.sent
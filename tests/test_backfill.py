@@ -0,0 +1,199 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the startup backfill of old messages."""
+
+from __future__ import annotations
+
+import types
+from typing import Any, AsyncIterator, List
+
+import asyncio
+import datetime
+import logging
+import pathlib
+
+import discord
+
+from mewbot.io.discord.backfill import BackfillConfig, DiscordBackfill
+from mewbot.io.discord.cursors import ChannelCursors
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class FakeTextChannel(discord.TextChannel):
+    """A text channel which serves its history from memory, and records concurrent fetches."""
+
+    active: int = 0
+    peak: int = 0
+
+    def __init__(  # pylint: disable=super-init-not-called
+        self, channel_id: int, guild_id: int, message_times: List[int]
+    ) -> None:
+        self.id = channel_id
+        self.guild = types.SimpleNamespace(id=guild_id)  # type: ignore
+        # History is served newest first - as discord does
+        self.messages = [
+            types.SimpleNamespace(
+                # Ids are snowflakes - so they sort in time order
+                id=stamp * 1000 + channel_id,
+                channel=self,
+                content=f"{channel_id}-{stamp}",
+                created_at=datetime.datetime.fromtimestamp(stamp, tz=datetime.timezone.utc),
+            )
+            for stamp in sorted(message_times, reverse=True)
+        ]
+        self.requested_limit: Any = None
+        self.served = 0
+
+    def history(self, **kwargs: Any) -> AsyncIterator[Any]:  # type: ignore
+        """Serve the history of this channel - recording the requested limit."""
+        self.requested_limit = kwargs.get("limit")
+        messages = self.messages
+        if kwargs.get("after") is not None:
+            messages = [x for x in messages if x.id > kwargs["after"].id]
+        if kwargs.get("oldest_first"):
+            messages = list(reversed(messages))
+        return self._history(messages, kwargs.get("limit"))
+
+    async def _history(self, messages: List[Any], limit: Any) -> AsyncIterator[Any]:
+        # Only the (simulated) request for the page counts as fetching
+        FakeTextChannel.active += 1
+        FakeTextChannel.peak = max(FakeTextChannel.peak, FakeTextChannel.active)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            FakeTextChannel.active -= 1
+
+        for message in messages[:limit]:
+            self.served += 1
+            yield message
+
+
+def make_backfill(queue_depth: int, **kwargs: Any) -> DiscordBackfill:
+    """Build a backfill with the given settings."""
+    return DiscordBackfill(queue_depth, BackfillConfig(**kwargs), logging.getLogger(__name__))
+
+
+class TestDiscordBackfill:
+    """Testing the startup backfill of old messages."""
+
+    async def test_retrieves_newest_messages_across_channels(self) -> None:
+        """The newest messages, across all channels, should be returned."""
+        channels = [
+            FakeTextChannel(1, 10, [1, 4, 7]),
+            FakeTextChannel(2, 10, [2, 5, 8]),
+            FakeTextChannel(3, 20, [3, 6, 9]),
+        ]
+
+        messages = await make_backfill(4).retrieve(channels)
+
+        assert [x.content for x in messages] == ["3-6", "1-7", "2-8", "3-9"]
+
+    async def test_stops_reading_once_settled(self) -> None:
+        """Histories should only be read until the newest messages are known."""
+        busy = FakeTextChannel(1, 10, list(range(100, 200)))
+        quiet = FakeTextChannel(2, 10, [1, 2, 3])
+
+        messages = await make_backfill(10).retrieve([busy, quiet])
+
+        assert [x.content for x in messages] == [f"1-{x}" for x in range(190, 200)]
+        assert quiet.served == 1
+        assert busy.served <= 11
+
+    async def test_per_channel_depth(self) -> None:
+        """No more than the per channel depth should be requested from each channel."""
+        channels = [FakeTextChannel(1, 10, [1, 4, 7]), FakeTextChannel(2, 10, [2, 5, 8])]
+
+        messages = await make_backfill(4, channel_depth=1).retrieve(channels)
+
+        assert [x.content for x in messages] == ["1-7", "2-8"]
+        assert all(channel.requested_limit == 1 for channel in channels)
+
+    async def test_include_lists(self) -> None:
+        """Only the included guilds and channels should be fetched."""
+        channels = [
+            FakeTextChannel(1, 10, [1]),
+            FakeTextChannel(2, 10, [2]),
+            FakeTextChannel(3, 20, [3]),
+        ]
+
+        messages = await make_backfill(5, guild_ids={10}).retrieve(channels)
+        assert {x.content for x in messages} == {"1-1", "2-2"}
+
+        messages = await make_backfill(5, channel_ids={2, 3}).retrieve(channels)
+        assert {x.content for x in messages} == {"2-2", "3-3"}
+
+    async def test_bounded_concurrency(self) -> None:
+        """No more than the configured number of histories should be fetched at once."""
+        FakeTextChannel.peak = 0
+        channels = [FakeTextChannel(x, 10, [x]) for x in range(1, 20)]
+
+        messages = await make_backfill(100, concurrency=3).retrieve(channels)
+
+        assert len(messages) == 19
+        assert FakeTextChannel.peak == 3
+
+    async def test_resumes_from_stored_positions(self) -> None:
+        """Channels with a position replay everything after it - merged in time order."""
+        resumed = FakeTextChannel(1, 10, list(range(1, 20)))
+        fresh = FakeTextChannel(2, 10, [5, 15, 25])
+
+        backfill = make_backfill(2)
+        messages = [x async for x in backfill.stream([resumed, fresh], {1: 14 * 1000 + 1})]
+
+        assert [x.content for x in messages] == [
+            "1-15",
+            "2-15",
+            "1-16",
+            "1-17",
+            "1-18",
+            "1-19",
+            "2-25",
+        ]
+
+    async def test_gap_fill_ignores_include_lists(self) -> None:
+        """Every channel seen live should be filled - not just those selected for backfill."""
+        first = FakeTextChannel(1, 10, [1, 2, 3])
+        second = FakeTextChannel(2, 20, [1, 2, 3])
+        unseen = FakeTextChannel(3, 20, [1, 2, 3])
+
+        backfill = make_backfill(0, guild_ids={10})
+        positions = {1: 2 * 1000 + 1, 2: 1 * 1000 + 2}
+        messages = [x async for x in backfill.gap_fill([first, second, unseen], positions)]
+
+        assert [x.content for x in messages] == ["2-2", "1-3", "2-3"]
+
+
+class TestChannelCursors:
+    """Testing the storing of the last message dispatched from each channel."""
+
+    def test_positions_only_move_forward(self) -> None:
+        """Noting an older message should not move the position back."""
+        cursors = ChannelCursors()
+
+        cursors.note(1, 20)
+        cursors.note(1, 10)
+
+        assert cursors.get(1) == 20
+        assert cursors.get(2) is None
+
+    def test_positions_persist(self, tmp_path: pathlib.Path) -> None:
+        """Positions should survive being closed and re-opened."""
+        path = str(tmp_path / "cursors.sqlite")
+
+        cursors = ChannelCursors(path, flush_interval=60)
+        cursors.open()
+        cursors.note(1, 20)
+        cursors.note(2, 30)
+        cursors.close()
+
+        reopened = ChannelCursors(path)
+        reopened.open()
+
+        assert reopened.loaded == {1: 20, 2: 30}
+        assert reopened.get(2) == 30
+        reopened.close()
@@ -0,0 +1,65 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the client cache settings."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import discord
+import pytest
+
+from mewbot.io.discord import DiscordIO
+from mewbot.io.discord.client import CacheConfig
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class TestCacheConfig:
+    """Options passed to the client."""
+
+    def test_defaults(self) -> None:
+        """Only the message cache size is always passed - as py-cord's default."""
+        assert CacheConfig().client_options() == {"max_messages": 1000}
+
+    def test_needed_intents(self) -> None:
+        """Caching joined members, and chunking, need the members intent."""
+        config = CacheConfig(
+            member_cache=("joined", "interaction"), chunk_guilds_at_startup=True
+        )
+
+        assert config.needed_intents() == {
+            "members": ["caching joined members", "chunking guilds at startup"]
+        }
+
+
+class TestCacheIO:
+    """Cache settings on the IOConfig."""
+
+    def test_reduced_caches(self) -> None:
+        """No message or member cache, and no chunking."""
+        config = DiscordIO()
+        config.token = "token"
+        config.intents = ["guilds", "members"]
+        config.max_messages = 0
+        config.member_cache = []
+        config.chunk_guilds_at_startup = False
+
+        client: Any = config.get_inputs()[0].get_client()  # type: ignore[attr-defined]
+        # pylint: disable=protected-access
+        state = client._connection
+
+        assert state.max_messages is None
+        assert state.member_cache_flags == discord.MemberCacheFlags.none()
+        assert not state._chunk_guilds
+
+    def test_unknown_flag(self) -> None:
+        """Mistakes are found on load - not on connecting."""
+        config = DiscordIO()
+
+        with pytest.raises(ValueError):
+            config.member_cache = ["everyone"]
@@ -0,0 +1,100 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the resolution of channel ids to channels which can be posted to."""
+
+from __future__ import annotations
+
+import types
+from typing import Any, Dict, List
+
+import asyncio
+
+import discord
+
+from mewbot.io.discord.channels import ChannelResolver
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class FakeTextChannel(discord.TextChannel):
+    """A text channel with only an id."""
+
+    def __init__(self, channel_id: int) -> None:  # pylint: disable=super-init-not-called
+        self.id = channel_id
+
+
+class FakeClient:
+    """Serves some channels from its cache, and others over (counted) REST calls."""
+
+    def __init__(self, cached: Dict[int, Any], remote: Dict[int, Any]) -> None:
+        self.cached = cached
+        self.remote = remote
+        self.fetches: List[int] = []
+
+    def get_channel(self, channel_id: int) -> Any:
+        """The channel, if it is in the cache."""
+        return self.cached.get(channel_id)
+
+    async def fetch_channel(self, channel_id: int) -> Any:
+        """The channel, fetched over (simulated) REST."""
+        self.fetches.append(channel_id)
+        await asyncio.sleep(0.001)
+        if channel_id not in self.remote:
+            response: Any = types.SimpleNamespace(status=404, reason="Not Found")
+            raise discord.NotFound(response, "Unknown Channel")
+        return self.remote[channel_id]
+
+
+def make_resolver(client: FakeClient, **kwargs: Any) -> ChannelResolver:
+    """Build a resolver around the fake client."""
+    return ChannelResolver(client, **kwargs)  # type: ignore
+
+
+class TestChannelResolver:
+    """Testing the resolution of channel ids to channels which can be posted to."""
+
+    async def test_cache_first(self) -> None:
+        """Guild text channels in the cache should be used - without any fetch."""
+        channel = FakeTextChannel(1)
+        client = FakeClient({1: channel}, {})
+
+        assert await make_resolver(client).resolve(1) is channel
+        assert not client.fetches
+
+    async def test_fetched_channels_are_held(self) -> None:
+        """A fetched channel should be held - and concurrent lookups share one fetch."""
+        channel = FakeTextChannel(2)
+        client = FakeClient({}, {2: channel})
+        resolver = make_resolver(client)
+
+        found = await asyncio.gather(*(resolver.resolve(2) for _ in range(3)))
+        assert found == [channel] * 3
+        assert await resolver.resolve(2) is channel
+        assert client.fetches == [2]
+
+    async def test_misses_are_held(self) -> None:
+        """Channels which do not exist should not be fetched again until the miss expires."""
+        client = FakeClient({}, {})
+        resolver = make_resolver(client, negative_ttl=0.02)
+
+        assert await resolver.resolve(3) is None
+        assert await resolver.resolve(3) is None
+        assert client.fetches == [3]
+
+        await asyncio.sleep(0.03)
+        assert await resolver.resolve(3) is None
+        assert client.fetches == [3, 3]
+
+    async def test_least_recently_used_is_evicted(self) -> None:
+        """Once full, the least recently used channel should be dropped."""
+        client = FakeClient({}, {x: FakeTextChannel(x) for x in range(3)})
+        resolver = make_resolver(client, max_size=2)
+
+        for channel_id in (0, 1, 0, 2, 0, 1):
+            await resolver.resolve(channel_id)
+
+        assert client.fetches == [0, 1, 2, 1]
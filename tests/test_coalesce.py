@@ -0,0 +1,121 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the merging of bursts of output into fewer messages."""
+
+from __future__ import annotations
+
+import types
+from typing import Any, List
+
+import asyncio
+
+from mewbot.io.discord.coalesce import OutputCoalescer, split_message
+from mewbot.io.discord.events import (
+    DiscordOutputEvent,
+    DiscordReplyIntoMessageChannelOutputEvent,
+    DiscordReplyToMessageOutputEvent,
+)
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+def message(message_id: int, channel_id: int = 1) -> Any:
+    """A stand-in for a discord.Message."""
+    return types.SimpleNamespace(id=message_id, channel=types.SimpleNamespace(id=channel_id))
+
+
+def make_coalescer(sent: List[DiscordOutputEvent], limit: int = 2000) -> OutputCoalescer:
+    """A coalescer which records what it sends."""
+
+    async def send(event: DiscordOutputEvent) -> bool:
+        sent.append(event)
+        return True
+
+    return OutputCoalescer(0.01, send, separator="\n", limit=limit)
+
+
+class TestSplitMessage:
+    """Testing splitting text to fit discord's limit."""
+
+    def test_short_text_is_kept(self) -> None:
+        """Text within the limit should be one piece."""
+        assert split_message("hello", 10) == ["hello"]
+
+    def test_splits_at_breaks(self) -> None:
+        """Line breaks, then spaces, should be preferred to cutting words."""
+        assert split_message("aaaa\nbbbb cccc", 10) == ["aaaa", "bbbb cccc"]
+        assert split_message("aaaa bbbb cccc", 10) == ["aaaa bbbb", "cccc"]
+        assert split_message("a" * 25, 10) == ["a" * 10, "a" * 10, "a" * 5]
+
+
+class TestOutputCoalescer:
+    """Testing the merging of bursts of output into fewer messages."""
+
+    async def test_merges_within_window(self) -> None:
+        """Texts to one channel within the window should be sent as one message."""
+        sent: List[DiscordOutputEvent] = []
+        coalescer = make_coalescer(sent)
+        for text in ("one", "two", "three"):
+            await coalescer.add(
+                (1, None), DiscordReplyIntoMessageChannelOutputEvent(text, message(10))
+            )
+        assert not sent
+
+        await asyncio.sleep(0.03)
+
+        assert [x.text for x in sent] == ["one\ntwo\nthree"]
+
+    async def test_replies_to_different_messages_are_not_merged(self) -> None:
+        """Replies should only be merged with replies to the same message - in order."""
+        sent: List[DiscordOutputEvent] = []
+        coalescer = make_coalescer(sent)
+        await coalescer.add((1, 10), DiscordReplyToMessageOutputEvent("a", message(10)))
+        await coalescer.add((1, 10), DiscordReplyToMessageOutputEvent("b", message(10)))
+        await coalescer.add((1, 11), DiscordReplyToMessageOutputEvent("c", message(11)))
+        await coalescer.flush()
+
+        assert [(x.text, getattr(x.message, "id")) for x in sent] == [("a\nb", 10), ("c", 11)]
+
+    async def test_limit(self) -> None:
+        """Held text should be sent before it would go over the limit."""
+        sent: List[DiscordOutputEvent] = []
+        coalescer = make_coalescer(sent, limit=10)
+        for text in ("aaaa", "bbbb", "cccc"):
+            await coalescer.add((1, None), DiscordOutputEvent(text, message(10)))
+        await coalescer.flush()
+
+        assert [x.text for x in sent] == ["aaaa\nbbbb", "cccc"]
+
+    async def test_sends_to_a_channel_in_order(self) -> None:
+        """A slow send should not be overtaken by the next window closing."""
+        sent: List[str] = []
+
+        async def send(event: DiscordOutputEvent) -> bool:
+            if event.text == "slow":
+                await asyncio.sleep(0.05)
+            sent.append(event.text)
+            return True
+
+        coalescer = OutputCoalescer(0.01, send)
+        await coalescer.add((1, 10), DiscordReplyToMessageOutputEvent("slow", message(10)))
+        await asyncio.sleep(0.02)
+        await coalescer.add((1, 11), DiscordReplyToMessageOutputEvent("fast", message(11)))
+        await asyncio.sleep(0.1)
+
+        assert sent == ["slow", "fast"]
+
+    async def test_flush_waits_for_sends(self) -> None:
+        """Flushing should return once everything held, or being sent, has been sent."""
+        sent: List[DiscordOutputEvent] = []
+        coalescer = make_coalescer(sent)
+        await coalescer.add((1, 10), DiscordReplyToMessageOutputEvent("a", message(10)))
+        await coalescer.add((1, 11), DiscordReplyToMessageOutputEvent("b", message(11)))
+        await coalescer.add((2, None), DiscordOutputEvent("c", message(12, 2)))
+
+        await coalescer.flush()
+
+        assert [x.text for x in sent] == ["a", "b", "c"]
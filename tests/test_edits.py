@@ -0,0 +1,168 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the dropping and merging of message edits."""
+
+from __future__ import annotations
+
+import types
+from typing import Any, Callable, List, Optional
+
+import asyncio
+
+import discord
+from mewbot.api.v1 import InputEvent
+
+from mewbot.io.discord.client import InternalMewbotDiscordClient
+from mewbot.io.discord.edits import EditDebouncer, merge_edits, unchanged
+from mewbot.io.discord.events import (
+    DiscordMessageEditInputEvent,
+    DiscordRawMessageEditInputEvent,
+    DiscordUserJoinInputEvent,
+)
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+# pylint: disable=protected-access
+#  The debouncer's timers are checked directly
+
+MakeClient = Callable[..., InternalMewbotDiscordClient]
+
+
+def edit(message_id: int, before: str, after: str) -> DiscordMessageEditInputEvent:
+    """An edit of the given message."""
+    message: Any = types.SimpleNamespace(id=message_id)
+    return DiscordMessageEditInputEvent(
+        text_before=before, message_before=message, text_after=after, message_after=message
+    )
+
+
+def raw_edit(message_id: int, after: Optional[str]) -> DiscordRawMessageEditInputEvent:
+    """An edit of a message which was not in the cache."""
+    return DiscordRawMessageEditInputEvent(
+        message_id=message_id,
+        channel_id=20,
+        guild_id=None,
+        text_after=after,
+        text_before=None,
+        author_id=None,
+    )
+
+
+class Delivered:
+    """Collects the events the debouncer puts on the wire."""
+
+    events: List[InputEvent]
+
+    def __init__(self) -> None:
+        self.events = []
+
+    async def __call__(self, event: InputEvent) -> None:
+        self.events.append(event)
+
+
+class TestMerge:
+    """Merging two edits of the same message into one."""
+
+    def test_merged_text(self) -> None:
+        """The text runs from before the first edit to after the last."""
+        merged = merge_edits(edit(1, "a", "b"), edit(1, "b", "c"))
+
+        assert isinstance(merged, DiscordMessageEditInputEvent)
+        assert (merged.text_before, merged.text_after) == ("a", "c")
+
+    def test_raw_edit_without_content(self) -> None:
+        """A later raw edit which did not touch the content keeps the earlier content."""
+        merged = merge_edits(raw_edit(1, "new"), raw_edit(1, None))
+
+        assert isinstance(merged, DiscordRawMessageEditInputEvent)
+        assert merged.text_after == "new"
+
+    def test_unchanged(self) -> None:
+        """Edits are unchanged if the text is the same - or raw edits carry no content."""
+        assert unchanged(edit(1, "a", "a"))
+        assert not unchanged(edit(1, "a", "b"))
+        assert unchanged(raw_edit(1, None))
+        assert not unchanged(raw_edit(1, "a"))
+
+
+class TestDebouncer:
+    """Holding edits for a window."""
+
+    async def test_burst_merged(self) -> None:
+        """A burst of edits to one message becomes one event - other events pass straight on."""
+        delivered = Delivered()
+        debouncer = EditDebouncer(0.01, delivered)
+        join: Any = DiscordUserJoinInputEvent(member=types.SimpleNamespace(id=5))  # type: ignore
+
+        await debouncer.add(edit(1, "a", "b"))
+        await debouncer.add(join)
+        await debouncer.add(edit(1, "b", "c"))
+        await debouncer.add(edit(2, "x", "y"))
+        assert delivered.events == [join]
+
+        await asyncio.sleep(0.05)
+
+        assert delivered.events == [
+            join,
+            edit(1, "a", "c"),
+            edit(2, "x", "y"),
+        ]
+
+    async def test_reverted_edit_suppressed(self) -> None:
+        """An edit which was undone within the window produces nothing."""
+        delivered = Delivered()
+        debouncer = EditDebouncer(10.0, delivered, suppress_unchanged=True)
+
+        await debouncer.add(edit(1, "a", "b"))
+        await debouncer.add(edit(1, "b", "a"))
+        await debouncer.add(edit(2, "x", "y"))
+        await debouncer.flush()
+
+        assert delivered.events == [edit(2, "x", "y")]
+
+    async def test_timers_held_while_sending(self) -> None:
+        """A timer still putting its edit on the wire is held on to - and let go once done."""
+        release = asyncio.Event()
+
+        async def deliver(_: InputEvent) -> None:
+            await release.wait()
+
+        debouncer = EditDebouncer(0.01, deliver)
+        await debouncer.add(edit(1, "a", "b"))
+        await asyncio.sleep(0.03)
+
+        assert not debouncer._pending
+        assert len(debouncer._timers) == 1
+
+        release.set()
+        await asyncio.sleep(0.01)
+
+        assert not debouncer._timers
+
+
+class TestClientSuppression:
+    """The client dropping edits which change nothing."""
+
+    async def test_raw_edit_without_content(self, make_client: MakeClient) -> None:
+        """Embeds resolving on an uncached message do not become an edit."""
+        client = make_client(suppress_unchanged_edits=True)
+        payload = discord.RawMessageUpdateEvent(
+            {"id": "10", "channel_id": "20", "embeds": []}  # type: ignore[typeddict-unknown-key]
+        )
+
+        await client.on_raw_message_edit(payload)
+
+        assert client.queue.empty()  # type: ignore[union-attr]
+
+    async def test_raw_edit_with_content(self, make_client: MakeClient) -> None:
+        """Edits with content are still passed on - there is nothing to compare them with."""
+        client = make_client(suppress_unchanged_edits=True)
+        data: Any = {"id": "10", "channel_id": "20", "content": "after"}
+        payload = discord.RawMessageUpdateEvent(data)
+
+        await client.on_raw_message_edit(payload)
+
+        assert not client.queue.empty()  # type: ignore[union-attr]
@@ -0,0 +1,105 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the message events."""
+
+from __future__ import annotations
+
+import types
+from typing import Any
+
+import dataclasses
+import datetime
+
+import discord
+
+from mewbot.io.discord.events import (
+    DiscordCompactMessageCreationEvent,
+    DiscordMessageCreationEvent,
+    DiscordMessageSnapshot,
+)
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+def make_message(guild: Any = None) -> Any:
+    """A stand-in for a discord.Message, with only the attributes a snapshot reads."""
+    return types.SimpleNamespace(
+        id=1000,
+        channel=types.SimpleNamespace(id=10, type=discord.ChannelType.text),
+        guild=guild,
+        author=types.SimpleNamespace(id=100),
+        content="hello <@100>",
+        clean_content="hello @someone",
+        created_at=datetime.datetime.fromtimestamp(1, tz=datetime.timezone.utc),
+        edited_at=None,
+    )
+
+
+class TestDiscordMessageCreationEvent:
+    """Testing the text of new messages - worked out when first read."""
+
+    def test_text_worked_out(self) -> None:
+        """Without text, the message's content is cleaned - or not, as requested."""
+        message = make_message()
+
+        assert DiscordMessageCreationEvent.from_message(message).text == "hello @someone"
+        assert DiscordMessageCreationEvent.from_message(message, False).text == (
+            "hello <@100>"
+        )
+
+    def test_text_is_a_field(self) -> None:
+        """The text can be replaced and set - and is shown with the other fields."""
+        event = DiscordMessageCreationEvent.from_message(make_message())
+
+        replaced = dataclasses.replace(event, text="replaced")
+        event.text = "set"
+
+        assert (replaced.text, event.text) == ("replaced", "set")
+        assert "text" in [field.name for field in dataclasses.fields(event)]
+        assert "text='set'" in repr(event)
+
+
+class TestDiscordMessageSnapshot:
+    """Testing the compact snapshot events."""
+
+    def test_snapshot_holds_plain_values(self) -> None:
+        """Only ids, content and timestamps should be kept - in slots."""
+        snapshot = DiscordMessageSnapshot.from_message(
+            make_message(types.SimpleNamespace(id=5))
+        )
+
+        assert snapshot == DiscordMessageSnapshot(
+            message_id=1000,
+            channel_id=10,
+            channel_type=discord.ChannelType.text.value,
+            guild_id=5,
+            author_id=100,
+            content="hello <@100>",
+            created_at=1.0,
+            edited_at=None,
+        )
+        assert not hasattr(snapshot, "__dict__")
+
+    def test_partial_message_without_cached_channel(self) -> None:
+        """A partial message should be rebuilt when the channel is not in the cache."""
+        channel = discord.PartialMessageable(
+            state=None, id=10, type=discord.ChannelType.text  # type: ignore
+        )
+        client: Any = types.SimpleNamespace(
+            get_channel=lambda _: None,
+            get_partial_messageable=lambda channel_id, type: channel,
+        )
+
+        event = DiscordCompactMessageCreationEvent(
+            text="hello",
+            snapshot=DiscordMessageSnapshot.from_message(make_message()),
+            client=client,
+        )
+
+        message = event.message
+        assert message.id == 1000
+        assert message.channel is channel
@@ -0,0 +1,140 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the DiscordInput and DiscordOutput against the fake discord."""
+
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Optional, Tuple
+
+import asyncio
+import contextlib
+
+import discord
+
+from mewbot.io.discord import (
+    DiscordInput,
+    DiscordMessageCreationEvent,
+    DiscordMessageDeleteInputEvent,
+    DiscordMessageEditInputEvent,
+    DiscordOutput,
+    DiscordReplyToMessageOutputEvent,
+)
+from mewbot.io.discord.fake_discord import FakeDiscordServer
+from mewbot.io.discord.metrics import DiscordMetrics
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+INTENTS = discord.Intents(guilds=True, guild_messages=True, message_content=True)
+
+
+@contextlib.asynccontextmanager
+async def connected(
+    server: FakeDiscordServer, metrics: Optional[DiscordMetrics] = None, **options: Any
+) -> AsyncIterator[Tuple[DiscordInput, asyncio.Queue[object]]]:
+    """A DiscordInput, running against the fake discord - and the queue it puts events on."""
+    queue: asyncio.Queue[object] = asyncio.Queue()
+    discord_input = DiscordInput(server.token, intents=INTENTS, metrics=metrics, **options)
+    discord_input.bind(queue)  # type: ignore[arg-type]
+
+    running = asyncio.create_task(discord_input.run())
+    try:
+        # py-cord waits a couple of seconds after READY for further guilds
+        await asyncio.wait_for(discord_input.get_client().wait_until_ready(), 5)
+        yield discord_input, queue
+    finally:
+        await discord_input.get_client().close()
+        running.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await running
+
+
+async def next_event(queue: asyncio.Queue[object]) -> object:
+    """The next event put on the queue - failing if there is none soon."""
+    return await asyncio.wait_for(queue.get(), 5)
+
+
+class TestFakeGateway:
+    """Events from the fake gateway."""
+
+    async def test_message_events(self) -> None:
+        """New, edited and deleted messages become events."""
+        async with FakeDiscordServer(channels=2) as server, connected(server) as (_, queue):
+            message = await server.send_message("hello", channel=1)
+            created = await next_event(queue)
+            assert isinstance(created, DiscordMessageCreationEvent)
+            assert created.text == "hello"
+            assert created.message.channel.id == server.channel_ids[1]
+
+            await server.edit_message(int(message["id"]), "hello again")
+            edited = await next_event(queue)
+            await server.delete_message(int(message["id"]))
+            deleted = await next_event(queue)
+
+        assert isinstance(edited, DiscordMessageEditInputEvent)
+        assert (edited.text_before, edited.text_after) == ("hello", "hello again")
+        assert isinstance(deleted, DiscordMessageDeleteInputEvent)
+
+    async def test_resume(self) -> None:
+        """Messages sent while the connection was down are replayed on resuming."""
+        async with FakeDiscordServer() as server, connected(server) as (_, queue):
+            await server.drop_connections()
+            await server.send_message("while away")
+            await asyncio.wait_for(server.connected.wait(), 5)
+
+            event = await next_event(queue)
+
+        assert isinstance(event, DiscordMessageCreationEvent)
+        assert event.text == "while away"
+        assert (server.identifies, server.resumes) == (1, 1)
+
+    async def test_debounced_edit_sent_on_stopping(self) -> None:
+        """An edit still being debounced when the input stops is put on the wire."""
+        async with FakeDiscordServer() as server, connected(server, edit_debounce=60) as (
+            discord_input,
+            queue,
+        ):
+            message = await server.send_message("hello")
+            await next_event(queue)
+            await server.edit_message(int(message["id"]), "hello again")
+            client: Any = discord_input.get_client()
+            # Wait (for up to 5s) for the edit to arrive at the debouncer
+            for _ in range(500):
+                if client._edits._pending:  # pylint: disable=protected-access
+                    break
+                await asyncio.sleep(0.01)
+
+        edited = queue.get_nowait()
+        assert isinstance(edited, DiscordMessageEditInputEvent)
+        assert edited.text_after == "hello again"
+
+
+class TestFakeRest:
+    """Output sent to the fake REST API."""
+
+    async def test_reply_with_rate_limit(self) -> None:
+        """A 429 is waited out - and the reply still sent."""
+        metrics = DiscordMetrics()
+        metrics.watch_rate_limits()
+        async with FakeDiscordServer(rate_limit=5) as server, connected(server, metrics) as (
+            discord_input,
+            queue,
+        ):
+            await server.send_message("ping")
+            event = await next_event(queue)
+            assert isinstance(event, DiscordMessageCreationEvent)
+
+            server.inject_rate_limit(retry_after=0.05)
+            output = DiscordOutput(discord_input.get_client())
+            assert await output.output(
+                DiscordReplyToMessageOutputEvent(text="pong", message=event.message)
+            )
+
+        _, reply = server.messages(server.channel_ids[0])
+        assert reply["content"] == "pong"
+        assert reply["message_reference"]["message_id"] == str(event.message.id)
+        assert server.limited == 1
+        assert metrics.rate_limits.value() == 1
@@ -0,0 +1,76 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the filter which decides which events go on the wire."""
+
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from mewbot.io.discord.filters import DiscordEventFilter
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+# An author which no filter in these tests is set up to hold back
+ANYONE: Dict[str, Any] = {"author_id": 100, "author_is_bot": False, "self_id": None}
+
+
+class TestDiscordEventFilter:
+    """Testing the filter which decides which events go on the wire."""
+
+    def test_default_admits_everything(self) -> None:
+        """With no settings, every event should be admitted."""
+        event_filter = DiscordEventFilter()
+
+        assert event_filter.admits(1, 2, None, author_id=3, author_is_bot=True, self_id=3)
+        assert event_filter.admits(None, 2, None, **ANYONE)
+
+    def test_guilds(self) -> None:
+        """Guild allow and deny sets - deny taking precedence."""
+        event_filter = DiscordEventFilter(
+            allowed_guilds=frozenset({1, 2}), denied_guilds=frozenset({2})
+        )
+
+        assert event_filter.admits(1, 10, None, **ANYONE)
+        assert not event_filter.admits(2, 10, None, **ANYONE)
+        assert not event_filter.admits(3, 10, None, **ANYONE)
+        # Direct messages are not in any guild
+        assert event_filter.admits(None, 10, None, **ANYONE)
+
+    def test_channels_and_threads(self) -> None:
+        """Threads should follow the settings of their parent channel."""
+        event_filter = DiscordEventFilter(
+            allowed_channels=frozenset({10}), denied_channels=frozenset({11})
+        )
+
+        assert event_filter.admits(1, 10, None, **ANYONE)
+        assert event_filter.admits(1, 50, 10, **ANYONE)
+        assert not event_filter.admits(1, 11, None, **ANYONE)
+        assert not event_filter.admits(1, 50, 12, **ANYONE)
+
+    def test_authors(self) -> None:
+        """Author sets, bots and the bot itself."""
+        event_filter = DiscordEventFilter(
+            denied_authors=frozenset({101}), ignore_bots=True, ignore_self=True
+        )
+
+        assert event_filter.admits(
+            1, 10, None, author_id=100, author_is_bot=False, self_id=999
+        )
+        assert not event_filter.admits(
+            1, 10, None, author_id=101, author_is_bot=False, self_id=999
+        )
+        assert not event_filter.admits(
+            1, 10, None, author_id=102, author_is_bot=True, self_id=999
+        )
+        assert not event_filter.admits(
+            1, 10, None, author_id=999, author_is_bot=False, self_id=999
+        )
+
+        only = DiscordEventFilter(allowed_authors=frozenset({100}))
+        assert only.admits_author(100, False, None)
+        assert not only.admits_author(101, False, None)
@@ -0,0 +1,153 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the buffer between the discord gateway and the InputQueue."""
+
+from __future__ import annotations
+
+import types
+from typing import Any, List
+
+import asyncio
+import logging
+
+import discord
+from mewbot.api.v1 import InputEvent
+
+from mewbot.io.discord.client import InternalMewbotDiscordClient
+from mewbot.io.discord.cursors import ChannelCursors
+from mewbot.io.discord.events import (
+    DiscordMessageCreationEvent,
+    DiscordMessageEditInputEvent,
+    DiscordUserJoinInputEvent,
+)
+from mewbot.io.discord.filters import DiscordEventFilter
+from mewbot.io.discord.ingress import IngressBuffer, OverflowPolicy
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+def join(member_id: int) -> InputEvent:
+    """An event which can not be coalesced."""
+    return DiscordUserJoinInputEvent(member=types.SimpleNamespace(id=member_id))  # type: ignore
+
+
+def edit(message_id: int, before: str, after: str) -> InputEvent:
+    """An edit of the given message."""
+    message: Any = types.SimpleNamespace(id=message_id)
+    return DiscordMessageEditInputEvent(
+        text_before=before, message_before=message, text_after=after, message_after=message
+    )
+
+
+def created(channel_id: int, message_id: int) -> InputEvent:
+    """A new message in the given channel."""
+    message: Any = types.SimpleNamespace(
+        id=message_id, channel=types.SimpleNamespace(id=channel_id)
+    )
+    return DiscordMessageCreationEvent("hello", message)
+
+
+def waiting(buffer: IngressBuffer) -> List[InputEvent]:
+    """The events waiting in the buffer - in order."""
+    return [slot[0] for slot in buffer._slots]  # pylint: disable=protected-access
+
+
+class TestIngressBuffer:
+    """Testing the buffer between the discord gateway and the InputQueue."""
+
+    async def test_drop_oldest(self) -> None:
+        """The newest events should be kept."""
+        buffer = IngressBuffer(2, OverflowPolicy.DROP_OLDEST)
+        for member_id in range(4):
+            buffer.put(join(member_id))
+
+        assert waiting(buffer) == [join(2), join(3)]
+        assert buffer.counters.dropped_oldest == 2
+        assert buffer.counters.shed == 2
+
+    async def test_drop_newest(self) -> None:
+        """The first events should be kept."""
+        buffer = IngressBuffer(2, OverflowPolicy.DROP_NEWEST)
+        for member_id in range(4):
+            buffer.put(join(member_id))
+
+        assert waiting(buffer) == [join(0), join(1)]
+        assert buffer.counters.dropped_newest == 2
+
+    async def test_coalesce_edits(self) -> None:
+        """Edits of a waiting message should be folded together - otherwise the oldest dropped."""
+        buffer = IngressBuffer(2, OverflowPolicy.COALESCE_EDITS)
+        buffer.put(edit(1, "a", "b"))
+        buffer.put(join(0))
+        buffer.put(edit(1, "b", "c"))
+
+        assert waiting(buffer) == [edit(1, "a", "c"), join(0)]
+        assert buffer.counters.coalesced == 1
+
+        buffer.put(join(1))
+        assert waiting(buffer) == [join(0), join(1)]
+        assert buffer.counters.dropped_oldest == 1
+
+    async def test_put_never_waits_on_a_full_queue(self) -> None:
+        """Events should be accepted while the queue is full - and delivered once it drains."""
+        queue: asyncio.Queue[InputEvent] = asyncio.Queue(maxsize=1)
+        buffer = IngressBuffer(10)
+        pump = asyncio.create_task(buffer.run(queue))
+
+        for member_id in range(5):
+            buffer.put(join(member_id))
+        await asyncio.sleep(0)
+
+        delivered = [await queue.get() for _ in range(5)]
+        pump.cancel()
+
+        assert delivered == [join(x) for x in range(5)]
+        assert buffer.counters.delivered == 5
+        assert buffer.counters.shed == 0
+
+    async def test_cursors_only_note_delivered(self) -> None:
+        """A message shed by the buffer does not move its channel's cursor on."""
+        client = InternalMewbotDiscordClient(intents=discord.Intents.none())
+        client._logger = logging.getLogger(__name__)  # pylint: disable=protected-access
+        cursors = client._cursors = ChannelCursors()  # pylint: disable=protected-access
+        queue: asyncio.Queue[InputEvent] = asyncio.Queue()
+        buffer = IngressBuffer(1, OverflowPolicy.DROP_NEWEST)
+
+        buffer.put(created(1, 100))
+        buffer.put(created(1, 101))
+        assert not cursors.positions()
+
+        pump = asyncio.create_task(buffer.run(queue, delivered=client.note_delivered))
+        await queue.get()
+        pump.cancel()
+
+        assert cursors.positions() == {1: 100}
+
+    async def test_gap_starts_after_waiting_messages(self) -> None:
+        """Messages still in the buffer when the connection drops are not retrieved again."""
+        # pylint: disable=protected-access
+        client = InternalMewbotDiscordClient(intents=discord.Intents.none())
+        client._logger = logging.getLogger(__name__)
+        client._cursors = ChannelCursors()
+        client._event_filter = DiscordEventFilter()
+        client._compact_events = False
+        client._clean_message_text = True
+        client._ingress = IngressBuffer(10, OverflowPolicy.DROP_NEWEST)
+        client.queue = asyncio.Queue()
+
+        for message_id in (100, 101):
+            message: Any = types.SimpleNamespace(
+                id=message_id,
+                channel=types.SimpleNamespace(id=1),
+                guild=None,
+                author=types.SimpleNamespace(id=2, bot=False),
+            )
+            await client.on_message(message)
+        await client.on_disconnect()
+
+        assert not client._cursors.positions()
+        assert client._gap_from == {0: {1: 101}}
@@ -0,0 +1,113 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing working out the gateway intents needed for the consumed events."""
+
+from __future__ import annotations
+
+from typing import Callable
+
+import pytest
+
+from mewbot.io.discord import (
+    DiscordInputEvent,
+    DiscordMessageCreationEvent,
+    DiscordUserJoinInputEvent,
+)
+from mewbot.io.discord.intents import (
+    consumed_input_events,
+    intents_for_events,
+    intents_from_names,
+    produced_input_events,
+    unproduced_input_events,
+)
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class TestIntents:
+    """Testing working out the gateway intents needed for the consumed events."""
+
+    def test_member_join_only(self) -> None:
+        """Consuming only joins should not need any message intents."""
+        intents, reasons = intents_for_events({DiscordUserJoinInputEvent})
+
+        assert intents.guilds and intents.members
+        assert not intents.guild_messages and not intents.message_content
+        assert not intents.presences and not intents.typing
+        assert reasons["members"] == ["DiscordUserJoinInputEvent"]
+
+    def test_messages(self) -> None:
+        """Consuming messages needs the message and content intents, but not members."""
+        intents, _ = intents_for_events({DiscordMessageCreationEvent})
+
+        assert intents.guild_messages and intents.dm_messages and intents.message_content
+        assert not intents.members
+
+    def test_base_class_consumes_everything(self) -> None:
+        """A consumer of a base event class consumes everything derived from it."""
+        intents, _ = intents_for_events({DiscordInputEvent})
+
+        assert intents.members and intents.guild_messages and intents.message_content
+        assert not intents.presences and not intents.voice_states
+
+    def test_history_needs_content(self) -> None:
+        """Reading history needs the content intent, even if no messages are consumed."""
+        intents, reasons = intents_for_events(set(), reads_history=True)
+
+        assert intents.message_content
+        assert reasons["message_content"] == ["reading message history"]
+
+    def test_loaded_triggers(self) -> None:
+        """Triggers which have been loaded should be found."""
+        # pylint: disable=import-outside-toplevel, unused-import
+        from examples.discord_bots import trivial_discord_bot  # noqa: F401
+
+        assert DiscordMessageCreationEvent in consumed_input_events()
+
+    def test_unknown_name(self) -> None:
+        """Unknown intent names should be rejected."""
+        assert intents_from_names(["guilds"]).guilds
+
+        with pytest.raises(ValueError):
+            intents_from_names(["not_an_intent"])
+
+
+class TestProducedEvents:
+    """Finding triggers which consume events the settings never produce."""
+
+    def test_full_events_produced(self, loaded_triggers: Callable[..., None]) -> None:
+        """By default, the full message events are produced - so the examples miss nothing."""
+        # pylint: disable=import-outside-toplevel
+        from examples.discord_bots.trivial_discord_bot import DiscordTextCommandTrigger
+
+        loaded_triggers(DiscordTextCommandTrigger)
+
+        assert not unproduced_input_events(produced_input_events(False, False, False))
+
+    def test_compact_events_replace_full(self, loaded_triggers: Callable[..., None]) -> None:
+        """Compact events stand in for the full events - which are then never produced."""
+        # pylint: disable=import-outside-toplevel
+        from examples.discord_bots.trivial_discord_bot import DiscordTextCommandTrigger
+
+        loaded_triggers(DiscordTextCommandTrigger)
+
+        assert unproduced_input_events(produced_input_events(True, False, False)) == {
+            "DiscordTextCommandTrigger": ["DiscordMessageCreationEvent"]
+        }
+
+    def test_raw_events_stand_in(self, loaded_triggers: Callable[..., None]) -> None:
+        """The examples also consume the raw edits and deletes - so miss nothing in raw mode."""
+        # pylint: disable=import-outside-toplevel
+        from examples.discord_bots.delete_warn_discord_bot import (
+            DiscordDeleteEventTrigger,
+        )
+        from examples.discord_bots.editor_warn_discord_bot import DiscordEditTrigger
+
+        loaded_triggers(DiscordDeleteEventTrigger, DiscordEditTrigger)
+
+        assert not unproduced_input_events(produced_input_events(False, True, False))
+        assert not unproduced_input_events(produced_input_events(True, True, False))
@@ -0,0 +1,152 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the metrics kept by the discord IO, and their export."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import asyncio
+import dataclasses
+import logging
+import socket
+
+import aiohttp
+import discord
+
+from mewbot.io.discord import DiscordIO
+from mewbot.io.discord.client import InternalMewbotDiscordClient
+from mewbot.io.discord.events import DiscordOutputEvent
+from mewbot.io.discord.filters import DiscordEventFilter
+from mewbot.io.discord.metrics import Counter, DiscordMetrics, Histogram, MetricsServer
+from mewbot.io.discord.output import DiscordOutput
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+# pylint: disable=protected-access
+#  The client's settings are set by the DiscordInput - which would also connect it
+
+
+@dataclasses.dataclass
+class TimedOutputEvent(DiscordOutputEvent):
+    """An output event with a handler of its own."""
+
+
+class TestExport:
+    """The Prometheus text format."""
+
+    def test_counter(self) -> None:
+        """Each series is a line - with label values escaped."""
+        counter = Counter("events_total", "Events.", "event")
+        counter.inc("message")
+        counter.inc('say "hi"', 2.5)
+
+        assert counter.render() == [
+            "# HELP events_total Events.",
+            "# TYPE events_total counter",
+            'events_total{event="message"} 1',
+            'events_total{event="say \\"hi\\""} 2.5',
+        ]
+
+    def test_histogram(self) -> None:
+        """Buckets are cumulative, and end with +Inf."""
+        histogram = Histogram("wait_seconds", "Waits.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value)
+
+        assert histogram.render()[2:] == [
+            'wait_seconds_bucket{le="0.1"} 1',
+            'wait_seconds_bucket{le="1"} 3',
+            'wait_seconds_bucket{le="+Inf"} 4',
+            "wait_seconds_sum 4.05",
+            "wait_seconds_count 4",
+        ]
+
+    def test_heartbeat_latency(self) -> None:
+        """Read from the client on rendering - shards yet to heartbeat are left out."""
+        metrics = DiscordMetrics()
+        metrics.watch_latency(lambda: {0: 0.042, 1: float("inf")})
+
+        assert 'mewbot_discord_heartbeat_latency_seconds{shard="0"} 0.042' in metrics.render()
+        assert 'shard="1"' not in metrics.render()
+
+    async def test_server(self) -> None:
+        """The metrics can be scraped over HTTP."""
+        metrics = DiscordMetrics()
+        metrics.rate_limits.inc()
+        with socket.socket() as free:
+            free.bind(("127.0.0.1", 0))
+            port = free.getsockname()[1]
+
+        server = MetricsServer(metrics, port)
+        await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                    body = await response.text()
+                    assert response.content_type == "text/plain"
+        finally:
+            await server.stop()
+
+        assert "mewbot_discord_rate_limits_total 1" in body
+
+
+class TestInstrumentation:
+    """Metrics recorded as the IO runs."""
+
+    async def test_events_received_and_filtered(self) -> None:
+        """Every dispatched event is counted - and those the filter holds back."""
+        metrics = DiscordMetrics()
+        client = InternalMewbotDiscordClient(intents=discord.Intents.none())
+        client._logger = logging.getLogger(__name__)
+        client._event_filter = DiscordEventFilter(denied_channels=frozenset({20}))
+        client._raw_message_events = True
+        client._metrics = metrics
+        client.queue = asyncio.Queue()
+
+        payload = discord.RawMessageDeleteEvent({"id": "10", "channel_id": "20"})
+        client.dispatch("raw_message_delete", payload)
+        await asyncio.sleep(0)
+
+        assert metrics.gateway_events.value("raw_message_delete") == 1
+        assert metrics.filtered_events.value("raw_message_delete") == 1
+
+    async def test_output_send_latency(self) -> None:
+        """Sending is timed by output event type."""
+        metrics = DiscordMetrics()
+
+        @DiscordOutput.register_handler(TimedOutputEvent)
+        async def send(output: DiscordOutput, event: Any) -> bool:
+            return isinstance(output, DiscordOutput) and isinstance(event, TimedOutputEvent)
+
+        try:
+            output = DiscordOutput(active_client=None, metrics=metrics)  # type: ignore
+            assert await output.output(TimedOutputEvent("text", None))
+        finally:
+            del DiscordOutput._handlers[TimedOutputEvent]
+            DiscordOutput._resolved.clear()
+
+        assert metrics.output_send_seconds.count("TimedOutputEvent") == 1
+
+    def test_rate_limits(self) -> None:
+        """Every 429 py-cord logs is counted."""
+        config = DiscordIO()
+        config.collect_metrics = True
+        metrics = config.get_metrics()
+        assert metrics is not None
+
+        logging.getLogger("discord.http").warning(
+            'We are being rate limited. Retrying in %.2f seconds. Handled under the bucket "%s"',
+            2.0,
+            "bucket",
+        )
+
+        assert metrics.rate_limits.value() == 1
+        assert metrics.rate_limit_retry_after_seconds.value() == 2.0
+
+    def test_disabled(self) -> None:
+        """No metrics are kept unless asked for."""
+        assert DiscordIO().get_metrics() is None
@@ -0,0 +1,215 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing how DiscordOutput picks the handler for each output event."""
+
+from __future__ import annotations
+
+import types
+from typing import Any, Dict, List, Set, Type
+
+import dataclasses
+
+from mewbot.api.v1 import OutputEvent
+
+from mewbot.io.discord.events import (
+    DiscordOutputEvent,
+    DiscordReplyIntoMessageChannelOutputEvent,
+    DiscordReplyToMessageOutputEvent,
+)
+from mewbot.io.discord.output import DiscordOutput
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+@dataclasses.dataclass
+class PollOutputEvent(DiscordOutputEvent):
+    """An output event from another package."""
+
+    question: str
+
+
+@dataclasses.dataclass
+class TimedPollOutputEvent(PollOutputEvent):
+    """A subclass of an output event from another package."""
+
+    seconds: int
+
+
+@dataclasses.dataclass
+class ForeignOutputEvent(OutputEvent):
+    """An output event from another package - not a DiscordOutputEvent."""
+
+
+async def unhandled(output: DiscordOutput, event: Any) -> bool:
+    """
+    Stands in for having no handler - sending nothing.
+    """
+    return output is None and event is None
+
+
+class TestOutputHandlers:
+    """Testing how DiscordOutput picks the handler for each output event."""
+
+    def test_built_in_handlers(self) -> None:
+        """Each built-in event type should have its own handler - found by the MRO."""
+        # pylint: disable=protected-access
+        assert (
+            DiscordOutput.handler_for(DiscordReplyToMessageOutputEvent)
+            is DiscordOutput._process_reply_to_message
+        )
+        assert (
+            DiscordOutput.handler_for(DiscordReplyIntoMessageChannelOutputEvent)
+            is DiscordOutput._process_reply_into_message_channel_event
+        )
+        # A subclass with no handler of its own falls back to the nearest base which has one
+        assert DiscordOutput.handler_for(PollOutputEvent) is DiscordOutput._process_bare_event
+        assert DiscordOutput.handler_for(OutputEvent) is None
+
+    async def test_third_party_handler(self) -> None:
+        """Handlers registered elsewhere should be used for their types, and subclasses."""
+        sent: List[str] = []
+        bare = DiscordOutput.handler_for(DiscordOutputEvent)
+        assert bare is not None
+
+        @DiscordOutput.register_handler(PollOutputEvent)
+        async def send_poll(output: DiscordOutput, event: Any) -> bool:
+            assert isinstance(output, DiscordOutput)
+            sent.append(event.question)
+            return True
+
+        try:
+            output = DiscordOutput(active_client=None)  # type: ignore
+            assert DiscordOutput.handler_for(TimedPollOutputEvent) is send_poll
+
+            assert await output.output(PollOutputEvent("text", None, "Lunch?"))
+            assert await output.output(TimedPollOutputEvent("text", None, "Tea?", 60))
+            assert sent == ["Lunch?", "Tea?"]
+        finally:
+            DiscordOutput.register_handler(PollOutputEvent)(bare)
+
+    def test_subclass_handler_kept_to_subclass(self) -> None:
+        """A handler registered on a subclass of DiscordOutput is not used by DiscordOutput."""
+        bare = DiscordOutput.handler_for(DiscordOutputEvent)
+
+        class PollOutput(DiscordOutput):
+            """An output which can also send polls."""
+
+        @PollOutput.register_handler(PollOutputEvent)
+        async def send_poll(output: DiscordOutput, event: Any) -> bool:
+            return output is not None and event is not None
+
+        assert PollOutput.handler_for(TimedPollOutputEvent) is send_poll
+        assert DiscordOutput.handler_for(TimedPollOutputEvent) is bare
+        assert DiscordOutput.handler_for(PollOutputEvent) is bare
+        assert DiscordOutput.consumes_outputs() == {DiscordOutputEvent}
+        # The subclass still uses the handlers of DiscordOutput for everything else
+        assert PollOutput.handler_for(DiscordReplyToMessageOutputEvent) is (
+            DiscordOutput.handler_for(DiscordReplyToMessageOutputEvent)
+        )
+
+    def test_base_handler_reaches_subclass(self) -> None:
+        """A handler registered on DiscordOutput is used by subclasses - even existing ones."""
+        bare = DiscordOutput.handler_for(DiscordOutputEvent)
+        assert bare is not None
+
+        class PollOutput(DiscordOutput):
+            """An output which sends what DiscordOutput does."""
+
+        assert PollOutput.handler_for(PollOutputEvent) is bare
+
+        @DiscordOutput.register_handler(PollOutputEvent)
+        async def send_poll(output: DiscordOutput, event: Any) -> bool:
+            return output is not None and event is not None
+
+        try:
+            assert PollOutput.handler_for(PollOutputEvent) is send_poll
+        finally:
+            DiscordOutput.register_handler(PollOutputEvent)(bare)
+
+
+class TestConsumesOutputs:
+    """The output event types the bot runner routes to DiscordOutput."""
+
+    def test_root_types(self) -> None:
+        """Only types which are not subclasses of another handled type are listed."""
+        assert DiscordOutput.consumes_outputs() == {DiscordOutputEvent}
+
+        @DiscordOutput.register_handler(ForeignOutputEvent)
+        async def send_foreign(output: DiscordOutput, event: Any) -> bool:
+            return output is not None and event is not None
+
+        try:
+            assert DiscordOutput.consumes_outputs() == {
+                DiscordOutputEvent,
+                ForeignOutputEvent,
+            }
+        finally:
+            DiscordOutput.register_handler(ForeignOutputEvent)(unhandled)
+
+    async def test_sent_once(self) -> None:
+        """A reply pushed through the bot runner's dispatch loop is sent exactly once."""
+        sent: List[OutputEvent] = []
+        original = DiscordOutput.handler_for(DiscordReplyToMessageOutputEvent)
+        assert original is not None
+
+        @DiscordOutput.register_handler(DiscordReplyToMessageOutputEvent)
+        async def send_reply(output: DiscordOutput, event: Any) -> bool:
+            assert isinstance(output, DiscordOutput)
+            sent.append(event)
+            return True
+
+        try:
+            output = DiscordOutput(active_client=None)  # type: ignore
+            # As mewbot's Bot marshals the outputs - and BotRunner.process_output_queue sends
+            outputs: Dict[Type[OutputEvent], Set[DiscordOutput]] = {}
+            for event_type in output.consumes_outputs():
+                outputs.setdefault(event_type, set()).add(output)
+
+            event = DiscordReplyToMessageOutputEvent("reply", None)  # type: ignore[arg-type]
+            for event_type, handlers in outputs.items():
+                if isinstance(event, event_type):
+                    for handler in handlers:
+                        await handler.output(event)
+        finally:
+            DiscordOutput.register_handler(DiscordReplyToMessageOutputEvent)(original)
+
+        assert sent == [event]
+
+
+class TestClose:
+    """Stopping the output."""
+
+    async def test_held_output_sent(self) -> None:
+        """Text held back to be merged is sent on closing - not lost."""
+        sent: List[str] = []
+        original = DiscordOutput.handler_for(DiscordReplyIntoMessageChannelOutputEvent)
+        assert original is not None
+
+        @DiscordOutput.register_handler(DiscordReplyIntoMessageChannelOutputEvent)
+        async def send_reply(output: DiscordOutput, event: Any) -> bool:
+            assert isinstance(output, DiscordOutput)
+            sent.append(event.text)
+            return True
+
+        message: Any = types.SimpleNamespace(id=10, channel=types.SimpleNamespace(id=1))
+        try:
+            output = DiscordOutput(active_client=None, coalesce_window=60)  # type: ignore
+            assert await output.output(
+                DiscordReplyIntoMessageChannelOutputEvent("a", message)
+            )
+            assert await output.output(
+                DiscordReplyIntoMessageChannelOutputEvent("b", message)
+            )
+            assert not sent
+
+            await output.close()
+        finally:
+            DiscordOutput.register_handler(DiscordReplyIntoMessageChannelOutputEvent)(
+                original
+            )
+
+        assert sent == ["a\nb"]
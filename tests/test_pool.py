@@ -0,0 +1,129 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the spreading of output between several bots."""
+
+from __future__ import annotations
+
+import logging
+import time
+
+import discord
+
+from mewbot.io.discord.pool import OutputPool, PoolStrategy, RateLimitWatcher
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+def make_pool(strategy: PoolStrategy = PoolStrategy.AFFINITY) -> OutputPool:
+    """A pool of three bots - with the others treated as already logged in."""
+    pool = OutputPool(
+        discord.Client(intents=discord.Intents.none()), ["second", "third"], strategy
+    )
+    for member in pool.members:
+        member.token = ""
+    return pool
+
+
+class TestChoice:
+    """Choosing the bot to send with."""
+
+    def test_affinity(self) -> None:
+        """Each channel is sent to by the same bot - even while it is limited."""
+        pool = make_pool()
+        pool.note_limited(1, 30.0)
+
+        assert [pool.choose(channel_id) for channel_id in (3, 4, 5)] == [0, 1, 2]
+
+    def test_least_limited(self) -> None:
+        """A limited bot's channels are sent to by the next bot along."""
+        pool = make_pool(PoolStrategy.LEAST_LIMITED)
+        pool.note_limited(1, 30.0)
+
+        assert pool.choose(4) == 2
+        assert pool.choose(5) == 2
+
+    def test_all_limited(self) -> None:
+        """With every bot limited, the one free soonest is used."""
+        pool = make_pool(PoolStrategy.LEAST_LIMITED)
+        for index, retry_after in enumerate((30.0, 10.0, 20.0)):
+            pool.note_limited(index, retry_after)
+
+        assert pool.choose(3) == 1
+        assert pool.members[1].limited_until > time.monotonic()
+
+
+class TestChannels:
+    """Channels, as seen by the chosen bot."""
+
+    async def test_other_bot(self) -> None:
+        """Another bot sends through a partial channel of its own."""
+        pool = make_pool()
+        home = pool.members[0].client.get_partial_messageable(
+            4, type=discord.ChannelType.text
+        )
+
+        channel = await pool.channel(home)
+
+        assert isinstance(channel, discord.PartialMessageable)
+        assert channel.id == 4
+        # pylint: disable=protected-access
+        assert channel._state is pool.members[1].client._connection
+        assert pool.members[1].sent == 1
+
+    async def test_direct_messages(self) -> None:
+        """Each bot has its own DMs - so they are always sent by the main bot."""
+        pool = make_pool()
+        home = pool.members[0].client.get_partial_messageable(
+            4, type=discord.ChannelType.private
+        )
+
+        assert await pool.channel(home) is home
+
+    async def test_chosen_sender_used(self) -> None:
+        """The bot chosen ahead of sending - e.g. by the scheduler - is the one which sends."""
+        pool = make_pool(PoolStrategy.LEAST_LIMITED)
+        home = pool.members[0].client.get_partial_messageable(
+            4, type=discord.ChannelType.text
+        )
+
+        assert pool.sender_for(4) == 1
+        # Limited after the choice - but the bot the scheduler waited for still sends
+        pool.note_limited(1, 30.0)
+        await pool.channel(home)
+
+        assert pool.members[1].sent == 1
+
+    async def test_rate_limits_reported(self) -> None:
+        """A 429 logged while sending is put down to the bot which was sending."""
+        pool = make_pool()
+        RateLimitWatcher.install()
+        home = pool.members[0].client.get_partial_messageable(
+            5, type=discord.ChannelType.text
+        )
+
+        await pool.channel(home)
+        logging.getLogger("discord.http").warning(
+            'We are being rate limited. Retrying in %.2f seconds. Handled under the bucket "%s"',
+            1.5,
+            "bucket",
+        )
+
+        assert pool.members[2].limited == 1
+        assert pool.members[2].retry_after == 1.5
+
+
+class TestClose:
+    """Closing the pool."""
+
+    async def test_other_bots_closed(self) -> None:
+        """The other bots' clients are closed - the input's bot is left to the input."""
+        pool = make_pool()
+
+        await pool.close()
+
+        assert not pool.members[0].client.is_closed()
+        assert all(member.client.is_closed() for member in pool.members[1:])
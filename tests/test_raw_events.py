@@ -0,0 +1,130 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing edit and delete events built from the raw gateway events."""
+
+from __future__ import annotations
+
+from typing import Any, Callable, List
+
+import discord
+from mewbot.api.v1 import InputEvent
+
+from mewbot.io.discord import (
+    DiscordRawMessageDeleteInputEvent,
+    DiscordRawMessageEditInputEvent,
+)
+from mewbot.io.discord.client import InternalMewbotDiscordClient
+from mewbot.io.discord.filters import DiscordEventFilter
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+MakeClient = Callable[..., InternalMewbotDiscordClient]
+
+
+def events(client: InternalMewbotDiscordClient) -> List[InputEvent]:
+    """Everything the client has put on the queue."""
+    queue: Any = client.queue
+    return [queue.get_nowait() for _ in range(queue.qsize())]
+
+
+class TestRawEdit:
+    """Edits of messages which are not in the cache."""
+
+    async def test_edit_from_payload(self, make_client: MakeClient) -> None:
+        """The ids, author and new content come from the payload."""
+        client = make_client()
+        payload = discord.RawMessageUpdateEvent(
+            {  # type: ignore[typeddict-unknown-key]
+                "id": "10",
+                "channel_id": "20",
+                "guild_id": "30",
+                "content": "after",
+                "author": {"id": "40", "username": "someone", "bot": False},
+            }
+        )
+
+        await client.on_raw_message_edit(payload)
+
+        assert events(client) == [
+            DiscordRawMessageEditInputEvent(
+                message_id=10,
+                channel_id=20,
+                guild_id=30,
+                text_after="after",
+                text_before=None,
+                author_id=40,
+            )
+        ]
+
+    async def test_embed_only_edit(self, make_client: MakeClient) -> None:
+        """Edits which do not include the content leave it unknown."""
+        client = make_client()
+        payload = discord.RawMessageUpdateEvent(
+            {"id": "10", "channel_id": "20", "embeds": []}  # type: ignore[typeddict-unknown-key]
+        )
+
+        await client.on_raw_message_edit(payload)
+
+        (event,) = events(client)
+        assert isinstance(event, DiscordRawMessageEditInputEvent)
+        assert event.text_after is None
+        assert event.author_id is None
+
+    async def test_raw_events_disabled(self, make_client: MakeClient) -> None:
+        """Without raw message events, only the cached path produces events."""
+        client = make_client(raw_message_events=False)
+        payload = discord.RawMessageUpdateEvent(
+            {  # type: ignore[typeddict-unknown-key]
+                "id": "10",
+                "channel_id": "20",
+                "content": "after",
+            }
+        )
+
+        await client.on_raw_message_edit(payload)
+
+        assert not events(client)
+
+
+class TestRawDelete:
+    """Deletes of messages which are not in the cache."""
+
+    async def test_bulk_delete(self, make_client: MakeClient) -> None:
+        """Each message removed gets an event of its own - in order."""
+        client = make_client()
+        payload = discord.RawBulkMessageDeleteEvent({"ids": ["12", "11"], "channel_id": "20"})
+
+        await client.on_raw_bulk_message_delete(payload)
+
+        assert events(client) == [
+            DiscordRawMessageDeleteInputEvent(
+                message_id=message_id,
+                channel_id=20,
+                guild_id=None,
+                text_before=None,
+                author_id=None,
+            )
+            for message_id in (11, 12)
+        ]
+
+    async def test_unknown_author_with_allow_list(self, make_client: MakeClient) -> None:
+        """An unknown author cannot be shown to be on the allow list - so is held back."""
+        client = make_client(DiscordEventFilter(allowed_authors=frozenset({40})))
+        payload = discord.RawMessageDeleteEvent({"id": "10", "channel_id": "20"})
+
+        await client.on_raw_message_delete(payload)
+
+        assert not events(client)
+
+    async def test_denied_channel(self, make_client: MakeClient) -> None:
+        """The place is always checked."""
+        client = make_client(DiscordEventFilter(denied_channels=frozenset({20})))
+        payload = discord.RawMessageDeleteEvent({"id": "10", "channel_id": "20"})
+
+        await client.on_raw_message_delete(payload)
+
+        assert not events(client)
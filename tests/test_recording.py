@@ -0,0 +1,143 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the recording of gateway dispatches, and their replay."""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import asyncio
+import contextlib
+import gzip
+import json
+import pathlib
+import time
+
+import discord
+
+from mewbot.io.discord import (
+    DiscordInput,
+    DiscordMessageCreationEvent,
+    DiscordMessageDeleteInputEvent,
+    DiscordMessageEditInputEvent,
+    DiscordReplayInput,
+)
+from mewbot.io.discord.fake_discord import FakeDiscordServer
+from mewbot.io.discord.recording import GatewayRecorder, Parser, read_log
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+INTENTS = discord.Intents(guilds=True, guild_messages=True, message_content=True)
+
+
+def summary(events: List[object]) -> List[Any]:
+    """
+    The type and text of each event - which should be the same however they were produced.
+    """
+    summaries: List[Any] = []
+    for event in events:
+        if isinstance(event, DiscordMessageCreationEvent):
+            summaries.append(("created", event.text, event.message.id))
+        elif isinstance(event, DiscordMessageEditInputEvent):
+            summaries.append(("edited", event.text_before, event.text_after))
+        elif isinstance(event, DiscordMessageDeleteInputEvent):
+            summaries.append(("deleted", event.text_before))
+        else:
+            summaries.append(type(event).__name__)
+    return summaries
+
+
+async def replay(path: pathlib.Path, speed: float = 0.0) -> List[object]:
+    """
+    Replay the log - returning every event put on the wire.
+    """
+    queue: asyncio.Queue[object] = asyncio.Queue()
+    replay_input = DiscordReplayInput(str(path), speed, intents=INTENTS)
+    replay_input.bind(queue)  # type: ignore[arg-type]
+
+    await asyncio.wait_for(replay_input.run(), 10)
+
+    return [queue.get_nowait() for _ in range(queue.qsize())]
+
+
+class TestGatewayRecorder:
+    """Writing and reading the log."""
+
+    def test_round_trip(self, tmp_path: pathlib.Path) -> None:
+        """Payloads are recorded as they were before parsing - and still parsed."""
+        path = tmp_path / "gateway.jsonl.gz"
+        parsed: List[Dict[str, Any]] = []
+
+        def parse(data: Any) -> None:
+            parsed.append(data)
+            data["changed"] = True
+
+        parsers: Dict[str, Parser] = {"MESSAGE_CREATE": parse}
+        recorder = GatewayRecorder(str(path))
+        recorder.install(parsers)
+        parsers["MESSAGE_CREATE"]({"id": "10"})
+        recorder.close()
+
+        (dispatch,) = read_log(str(path))
+        assert parsed == [{"id": "10", "changed": True}]
+        assert (dispatch.event, dispatch.data) == ("MESSAGE_CREATE", {"id": "10"})
+        assert recorder.recorded == 1
+
+    def test_cut_short(self, tmp_path: pathlib.Path) -> None:
+        """A log ending part way through a line is read up to the last whole line."""
+        path = tmp_path / "gateway.jsonl.gz"
+        with gzip.open(path, "wt", encoding="utf-8") as log:
+            log.write(json.dumps({"version": 1, "started": 0}) + "\n")
+            log.write(json.dumps({"t": 0.0, "e": "RESUMED", "d": {}}) + "\n")
+            log.write('{"t": 0.1, "e": "MESSAGE_CR')
+
+        assert [dispatch.event for dispatch in read_log(str(path))] == ["RESUMED"]
+
+
+class TestReplay:
+    """Replaying a log into the InputQueue."""
+
+    async def test_matches_live(self, tmp_path: pathlib.Path) -> None:
+        """A recorded session replays offline to the same events - every time."""
+        path = tmp_path / "gateway.jsonl.gz"
+        live: asyncio.Queue[object] = asyncio.Queue()
+
+        async with FakeDiscordServer(channels=2) as server:
+            discord_input = DiscordInput(
+                server.token, intents=INTENTS, recorder=GatewayRecorder(str(path))
+            )
+            discord_input.bind(live)  # type: ignore[arg-type]
+            running = asyncio.create_task(discord_input.run())
+            try:
+                await asyncio.wait_for(discord_input.get_client().wait_until_ready(), 5)
+                message = await server.send_message("hello", channel=1)
+                await server.edit_message(int(message["id"]), "hello again")
+                await server.send_message("another")
+                await server.delete_message(int(message["id"]))
+                await asyncio.sleep(0.2)
+            finally:
+                await discord_input.get_client().close()
+                running.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await running
+
+        expected = summary([live.get_nowait() for _ in range(live.qsize())])
+        assert [entry[0] for entry in expected] == ["created", "edited", "created", "deleted"]
+
+        assert summary(await replay(path)) == expected
+        assert summary(await replay(path)) == expected
+
+    async def test_speed(self, tmp_path: pathlib.Path) -> None:
+        """Dispatches are replayed at their recorded offsets - divided by the speed."""
+        path = tmp_path / "gateway.jsonl.gz"
+        with gzip.open(path, "wt", encoding="utf-8") as log:
+            log.write(json.dumps({"version": 1, "started": 0}) + "\n")
+            log.write(json.dumps({"t": 0.4, "e": "NOT_AN_EVENT", "d": {}}) + "\n")
+
+        start = time.monotonic()
+        assert not await replay(path, speed=4)
+        assert 0.1 <= time.monotonic() - start < 0.4
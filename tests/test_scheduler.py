@@ -0,0 +1,158 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the per-channel output scheduler."""
+
+from __future__ import annotations
+
+from typing import List, Tuple
+
+import asyncio
+import time
+
+from mewbot.io.discord.scheduler import (
+    ChannelOutputScheduler,
+    OutputAction,
+    TokenBucket,
+)
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+class Recorder:
+    """Makes output actions which record when they were taken."""
+
+    def __init__(self) -> None:
+        self.sent: List[Tuple[int, int]] = []
+        self.active = 0
+        self.peak = 0
+
+    def action(self, channel_id: int, number: int, delay: float = 0.0) -> OutputAction:
+        """An action which takes the given time to send."""
+
+        async def send() -> bool:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.active -= 1
+            self.sent.append((channel_id, number))
+            return True
+
+        return send
+
+
+def unlimited(concurrency: int) -> ChannelOutputScheduler:
+    """A scheduler whose rate limits will not be reached by the tests."""
+    return ChannelOutputScheduler(
+        concurrency, channel_burst=100, channel_rate=1000, global_burst=100, global_rate=1000
+    )
+
+
+class TestChannelOutputScheduler:
+    """Testing the per-channel output scheduler."""
+
+    async def test_order_within_channel(self) -> None:
+        """Actions in a channel should be taken in the order they were submitted."""
+        recorder = Recorder()
+        scheduler = unlimited(4)
+        for number in range(5):
+            scheduler.submit(1, recorder.action(1, number, delay=0.005 * (5 - number)))
+
+        await scheduler.join()
+
+        assert recorder.sent == [(1, x) for x in range(5)]
+        assert scheduler.pending() == 0
+
+    async def test_channels_do_not_block_each_other(self) -> None:
+        """A slow channel should not hold up output to another channel."""
+        recorder = Recorder()
+        scheduler = unlimited(4)
+        scheduler.submit(1, recorder.action(1, 0, delay=0.05))
+        scheduler.submit(2, recorder.action(2, 0))
+        scheduler.submit(2, recorder.action(2, 1))
+
+        await scheduler.join()
+
+        assert recorder.sent == [(2, 0), (2, 1), (1, 0)]
+
+    async def test_global_concurrency_cap(self) -> None:
+        """No more than the cap should be in progress at once."""
+        recorder = Recorder()
+        scheduler = unlimited(2)
+        for channel_id in range(6):
+            scheduler.submit(channel_id, recorder.action(channel_id, 0, delay=0.01))
+
+        await scheduler.join()
+
+        assert len(recorder.sent) == 6
+        assert recorder.peak == 2
+
+    async def test_failures_do_not_stop_the_channel(self) -> None:
+        """An action which raises should be logged, and the next one taken."""
+        recorder = Recorder()
+        scheduler = unlimited(1)
+
+        async def broken() -> bool:
+            raise RuntimeError("Could not send")
+
+        scheduler.submit(1, broken)
+        scheduler.submit(1, recorder.action(1, 1))
+        await scheduler.join()
+
+        assert recorder.sent == [(1, 1)]
+
+    async def test_idle_buckets_dropped(self) -> None:
+        """Buckets are only held for channels until they are idle and have refilled."""
+        recorder = Recorder()
+        scheduler = ChannelOutputScheduler(4, channel_burst=2, channel_rate=50)
+        scheduler.submit(1, recorder.action(1, 0))
+        await scheduler.join()
+        # Channel 1's bucket is still refilling - it must be kept, or the burst would be reset
+        assert scheduler.buckets_held == 1
+
+        await asyncio.sleep(0.05)
+        for channel_id in range(2, 12):
+            scheduler.submit(channel_id, recorder.action(channel_id, 0))
+        await scheduler.join()
+        await asyncio.sleep(0.05)
+        scheduler.submit(12, recorder.action(12, 0))
+        await scheduler.join()
+
+        assert scheduler.buckets_held == 1
+
+    async def test_limits_kept_per_sender(self) -> None:
+        """Each bot sending to a channel is held to its own limits - not those of the others."""
+        recorder = Recorder()
+        senders = iter([0, 1, 0, 1])
+        scheduler = ChannelOutputScheduler(
+            4, channel_burst=2, channel_rate=5, sender=lambda _: next(senders)
+        )
+        for number in range(4):
+            scheduler.submit(1, recorder.action(1, number))
+
+        start = time.monotonic()
+        await scheduler.join()
+
+        # Two bots with a burst of two each - no waiting on the rate
+        assert time.monotonic() - start < 0.1
+        assert scheduler.buckets_held == 2
+
+
+class TestTokenBucket:
+    """Testing the bucket which keeps to rate limits up front."""
+
+    async def test_waits_once_burst_is_used(self) -> None:
+        """After the burst, actions should be spaced out by the rate."""
+        bucket = TokenBucket(2, 50)
+
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+
+        # Two immediately, then two more at 50 a second
+        assert time.monotonic() - start >= 0.035
@@ -0,0 +1,173 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the auto-sharded client mode."""
+
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Dict, List
+
+import asyncio
+import logging
+
+import discord
+import pytest
+
+from mewbot.io.discord import DiscordIO
+from mewbot.io.discord.backfill import BackfillConfig, DiscordBackfill
+from mewbot.io.discord.client import (
+    InternalMewbotDiscordClient,
+    InternalMewbotShardedDiscordClient,
+    ShardConfig,
+)
+from mewbot.io.discord.cursors import ChannelCursors
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+# pylint: disable=protected-access
+#  Gap tracking is internal to the client - there is no connection to observe it through
+
+
+# One guild on each of the two shards - a guild's shard is (guild_id >> 22) % shard_count
+GUILD_CHANNELS = {2 << 22: 10, 1 << 22: 20}
+
+
+def make_client() -> InternalMewbotShardedDiscordClient:
+    """
+    A sharded client, which is never connected, with a channel seen on each shard.
+
+    Channel 10 is served by shard 0, and channel 20 by shard 1.
+    """
+    client = InternalMewbotShardedDiscordClient(intents=discord.Intents.none(), shard_count=2)
+    client._logger = logging.getLogger(__name__)
+    client._backfill_config = BackfillConfig()
+    client._cursors = ChannelCursors()
+    client.queue = asyncio.Queue()
+
+    for guild_id, channel_id in GUILD_CHANNELS.items():
+        guild: Any = {
+            "id": str(guild_id),
+            "name": "guild",
+            "channels": [{"id": str(channel_id), "type": 0, "name": "a", "position": 0}],
+        }
+        client._connection._add_guild_from_data(guild)
+        client._cursors.note(channel_id, channel_id * 10)
+    return client
+
+
+class TestShardConfig:
+    """Options passed to the auto-sharded client."""
+
+    def test_automatic(self) -> None:
+        """With nothing set, discord decides how many shards to run."""
+        assert not ShardConfig().client_options()
+
+    def test_shard_ids(self) -> None:
+        """Shard ids are passed as a list, with the count."""
+        options = ShardConfig(shard_count=4, shard_ids=(0, 2)).client_options()
+        assert options == {"shard_count": 4, "shard_ids": [0, 2]}
+
+    def test_shard_ids_need_count(self) -> None:
+        """Shard ids without the count they are out of cannot be run."""
+        with pytest.raises(AssertionError):
+            ShardConfig(shard_ids=(0,)).client_options()
+
+
+class TestShardedGaps:
+    """Gaps are kept per shard - and only filled for shards which identified again."""
+
+    async def test_one_shard_resumed(self) -> None:
+        """Another shard is still disconnected - so its gap is kept."""
+        client = make_client()
+
+        await client.on_shard_disconnect(0)
+        await client.on_shard_disconnect(1)
+        await client.on_shard_resumed(0)
+
+        assert client._gap_from == {1: {20: 200}}
+
+    async def test_all_shards_resumed(self) -> None:
+        """Every shard has resumed - so nothing was missed."""
+        client = make_client()
+
+        await client.on_shard_disconnect(0)
+        await client.on_shard_disconnect(1)
+        await client.on_shard_resumed(1)
+        await client.on_shard_resumed(0)
+
+        assert not client._gap_from
+
+    async def test_combined_events_ignored(self) -> None:
+        """The combined resume is sent for any shard - so must not clear the gap."""
+        client = make_client()
+
+        await client.on_shard_disconnect(0)
+        await client.on_resumed()
+
+        assert client._gap_from == {0: {10: 100}}
+
+    async def test_connected_floors_kept(self) -> None:
+        """Channels on a shard which stayed connected are still live - so keep their floors."""
+        client = make_client()
+        client._live_floor.update({10: 101, 20: 201})
+
+        await client.on_shard_disconnect(1)
+
+        assert client._live_floor == {10: 101}
+
+    async def test_resumed_and_identified(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """One shard resumes, the other identifies again - only the latter's channels are filled."""
+        client = make_client()
+        client._backfilled = True
+        filled: List[Dict[int, int]] = []
+
+        async def gap_fill(
+            _: DiscordBackfill, channels: List[Any], positions: Dict[int, int]
+        ) -> AsyncIterator[discord.Message]:
+            filled.append({channel.id: positions[channel.id] for channel in channels})
+            missed: List[discord.Message] = []
+            for message in missed:
+                yield message
+
+        monkeypatch.setattr(DiscordBackfill, "gap_fill", gap_fill)
+
+        await client.on_shard_disconnect(0)
+        await client.on_shard_disconnect(1)
+        await client.on_shard_connect(1)
+        await client.on_ready()
+
+        assert filled == [{20: 200}]
+        assert client._gap_from == {0: {10: 100}}
+
+        await client.on_shard_resumed(0)
+        await client.on_ready()
+
+        assert filled == [{20: 200}]
+        assert not client._gap_from
+
+
+class TestShardedIO:
+    """Choosing the client from the IOConfig."""
+
+    def test_unsharded_by_default(self) -> None:
+        """No sharding settings - the plain client."""
+        config = DiscordIO()
+        config.token = "token"
+
+        client = config.get_inputs()[0]._client  # type: ignore[attr-defined]
+
+        assert not isinstance(client, InternalMewbotShardedDiscordClient)
+        assert isinstance(client, InternalMewbotDiscordClient)
+
+    def test_shard_count_enables_sharding(self) -> None:
+        """Setting the shard count runs the sharded client."""
+        config = DiscordIO()
+        config.token = "token"
+        config.shard_count = 3
+
+        client = config.get_inputs()[0]._client  # type: ignore[attr-defined]
+
+        assert isinstance(client, InternalMewbotShardedDiscordClient)
+        assert client.shard_count == 3
@@ -0,0 +1,123 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the tracing of replies from the gateway to discord."""
+
+from __future__ import annotations
+
+import types
+from typing import Any
+
+import asyncio
+import json
+import logging
+import pathlib
+
+import discord
+
+from mewbot.io.discord.client import InternalMewbotDiscordClient
+from mewbot.io.discord.events import (
+    DiscordMessageEditInputEvent,
+    DiscordReplyToMessageOutputEvent,
+)
+from mewbot.io.discord.filters import DiscordEventFilter
+from mewbot.io.discord.metrics import DiscordMetrics
+from mewbot.io.discord.output import DiscordOutput
+from mewbot.io.discord.tracing import EventTracer
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+# pylint: disable=protected-access
+#  The client's settings are set by the DiscordInput - which would also connect it
+
+
+def edit(message_id: int) -> DiscordMessageEditInputEvent:
+    """An edit of the given message."""
+    message: Any = types.SimpleNamespace(id=message_id)
+    return DiscordMessageEditInputEvent(
+        text_before="a", message_before=message, text_after="b", message_after=message
+    )
+
+
+def reply(message_id: int) -> DiscordReplyToMessageOutputEvent:
+    """A reply to the given message."""
+    message: Any = types.SimpleNamespace(id=message_id)
+    return DiscordReplyToMessageOutputEvent(text="reply", message=message)
+
+
+class TestEventTracer:
+    """Stamping messages, and completing their traces."""
+
+    def test_span_written(self, tmp_path: pathlib.Path) -> None:
+        """A reply to a traced message writes its span - with the stages in order."""
+        sink = tmp_path / "traces.jsonl"
+        tracer = EventTracer(str(sink))
+
+        tracer.received(10)
+        tracer.enqueued(edit(10))
+        total = tracer.sent(reply(10), 1e12, 1e12 + 0.25)
+        tracer.close()
+
+        (line,) = sink.read_text(encoding="utf-8").splitlines()
+        span = json.loads(line)
+        assert span["message_id"] == 10
+        assert span["input"] == "DiscordMessageEditInputEvent"
+        assert span["output"] == "DiscordReplyToMessageOutputEvent"
+        assert span["send"] == 0.25
+        assert total == span["total"]
+
+    def test_untraced(self, tmp_path: pathlib.Path) -> None:
+        """Messages never received from the gateway, or forgotten, are not traced."""
+        sink = tmp_path / "traces.jsonl"
+        tracer = EventTracer(str(sink), capacity=1)
+
+        tracer.enqueued(edit(9))
+        tracer.received(10)
+        tracer.enqueued(edit(10))
+        tracer.received(11)
+
+        assert tracer.sent(reply(9), 0.0, 1.0) is None
+        assert tracer.sent(reply(10), 0.0, 1.0) is None
+        assert not sink.exists()
+
+
+class TestEndToEnd:
+    """A message traced through the client and output."""
+
+    async def test_reply_latency(self) -> None:
+        """The reply's whole latency is recorded against the message it replies to."""
+        metrics = DiscordMetrics()
+        tracer = EventTracer()
+        client = InternalMewbotDiscordClient(intents=discord.Intents.none())
+        client._logger = logging.getLogger(__name__)
+        client._event_filter = DiscordEventFilter()
+        client._compact_events = False
+        client._raw_message_events = True
+        client._tracer = tracer
+        client.queue = asyncio.Queue()
+
+        payload = discord.RawMessageUpdateEvent(
+            {"id": "10", "channel_id": "20", "content": "b"}  # type: ignore[typeddict-unknown-key]
+        )
+        client.dispatch("raw_message_edit", payload)
+        await asyncio.sleep(0)
+        assert not client.queue.empty()
+
+        @DiscordOutput.register_handler(DiscordReplyToMessageOutputEvent)
+        async def send(output: DiscordOutput, event: Any) -> bool:
+            return output is not None and event is not None
+
+        try:
+            output = DiscordOutput(
+                active_client=None, metrics=metrics, tracer=tracer  # type: ignore
+            )
+            assert await output.output(reply(10))
+        finally:
+            DiscordOutput._handlers[DiscordReplyToMessageOutputEvent] = (
+                DiscordOutput._process_reply_to_message
+            )
+            DiscordOutput._resolved.clear()
+
+        assert metrics.reply_latency_seconds.count() == 1
@@ -0,0 +1,237 @@
+# SPDX-FileCopyrightText: 2023 Mewbot Developers <mewbot@quicksilver.london>
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+"""Testing the forwarding of events from shard worker processes."""
+
+from __future__ import annotations
+
+import types
+from typing import Any, Callable, List, Optional, Tuple
+
+import asyncio
+import dataclasses
+import logging
+import pickle
+import queue
+
+import discord
+import pytest
+from mewbot.api.v1 import InputEvent
+
+from mewbot.io.discord import DiscordIO, DiscordUserJoinInputEvent
+from mewbot.io.discord.events import (
+    DiscordCompactMessageCreationEvent,
+    DiscordCompactMessageDeleteInputEvent,
+    DiscordMessageSnapshot,
+)
+from mewbot.io.discord.workers import (
+    EXIT_LOGIN_FAILURE,
+    MAX_RESTARTS,
+    ShardWorkerPool,
+    ShardWorkerSpec,
+    _forward,
+    _Worker,
+    attach_client,
+    divide_depth,
+    divide_shards,
+)
+
+# pylint: disable=R0903
+#  Disable "too few public methods" for test cases - most test files will be classes used for
+#  grouping and then individual tests alongside these
+
+
+def make_snapshot(message_id: int = 10) -> DiscordMessageSnapshot:
+    """A snapshot of a message in a guild text channel."""
+    return DiscordMessageSnapshot(
+        message_id=message_id,
+        channel_id=2,
+        channel_type=discord.ChannelType.text.value,
+        guild_id=3,
+        author_id=4,
+        content="hello",
+        created_at=0.0,
+        edited_at=None,
+    )
+
+
+class FakeProcess:
+    """Stands in for a worker process - which is alive until given an exit code."""
+
+    exitcode: Optional[int]
+
+    def __init__(self, **_: Any) -> None:
+        self.exitcode = None
+
+    def start(self) -> None:
+        """Nothing is run."""
+
+    def is_alive(self) -> bool:
+        """Alive until it has exited."""
+        return self.exitcode is None
+
+
+def supervised() -> Tuple[ShardWorkerPool, Any, _Worker, List[FakeProcess]]:
+    """A pool, a context to start processes with, a worker, and the processes started for it."""
+    spec = ShardWorkerSpec(token="token", intents=discord.Intents.none(), shard_count=1)
+    started: List[FakeProcess] = []
+
+    def process(**kwargs: Any) -> FakeProcess:
+        started.append(FakeProcess(**kwargs))
+        return started[-1]
+
+    return (
+        ShardWorkerPool(spec, 1, logging.getLogger(__name__)),
+        types.SimpleNamespace(Process=process),
+        _Worker(0, dataclasses.replace(spec, shard_ids=(0,))),
+        started,
+    )
+
+
+class TestDivideShards:
+    """Dealing the shards out between the workers."""
+
+    def test_even_spread(self) -> None:
+        """Each worker gets every n-th shard."""
+        assert divide_shards(6, 3) == [(0, 3), (1, 4), (2, 5)]
+
+    def test_more_workers_than_shards(self) -> None:
+        """No worker is left without a shard."""
+        assert divide_shards(2, 4) == [(0,), (1,)]
+
+
+class TestDivideDepth:
+    """Sharing the startup_queue_depth between the workers."""
+
+    def test_shares_add_up(self) -> None:
+        """Between them, the workers retrieve the depth - no more."""
+        assert divide_depth(100, [(0, 3), (1, 4), (2, 5)]) == [34, 33, 33]
+        assert divide_depth(0, [(0,), (1,)]) == [0, 0]
+
+    def test_in_proportion_to_shards(self) -> None:
+        """A worker with more shards has more channels - so takes more of the depth."""
+        assert divide_depth(90, divide_shards(5, 3)) == [36, 36, 18]
+
+
+class TestForwarding:
+    """Events on their way out of a worker, and into the main process."""
+
+    def test_events_survive_pickling(self) -> None:
+        """Compact events, with their client detached, can be sent between processes."""
+        client: Any = object()
+        event = DiscordCompactMessageCreationEvent("hello", make_snapshot(), client)
+
+        sent = pickle.loads(pickle.dumps([attach_client(event, None)]))
+        received = attach_client(sent[0], client)
+
+        assert received == DiscordCompactMessageCreationEvent("hello", make_snapshot())
+        assert received.client is client
+
+    def test_events_without_client(self) -> None:
+        """Events which do not hold the client are left alone."""
+        event = DiscordCompactMessageDeleteInputEvent("gone", make_snapshot())
+
+        assert attach_client(event, None) is event
+
+    async def test_batches_waiting_events(self) -> None:
+        """Everything waiting is sent as one batch - events which cannot be sent are dropped."""
+        events: asyncio.Queue[InputEvent] = asyncio.Queue()
+        member: Any = object()
+        for message_id in (1, 2):
+            events.put_nowait(
+                DiscordCompactMessageCreationEvent("hello", make_snapshot(message_id))
+            )
+        events.put_nowait(DiscordUserJoinInputEvent(member))
+
+        channel: queue.Queue[List[InputEvent]] = queue.Queue()
+        forwarder = asyncio.create_task(_forward(events, channel))  # type: ignore[arg-type]
+        batch = await asyncio.get_running_loop().run_in_executor(None, channel.get)
+        forwarder.cancel()
+
+        assert [event.snapshot.message_id for event in batch] == [1, 2]  # type: ignore
+
+
+class TestWorkerIO:
+    """Choosing worker mode from the IOConfig."""
+
+    def test_workers_imply_compact_events(self, loaded_triggers: Callable[..., None]) -> None:
+        """The workers can only send compact events - and run the shards themselves."""
+        loaded_triggers()
+        config = DiscordIO()
+        config.token = "token"
+        config.intents = ["guilds"]
+        config.shard_workers = 2
+
+        discord_input: Any = config.get_inputs()[0]
+        # pylint: disable=protected-access
+        spec: ShardWorkerSpec = discord_input._workers._spec
+
+        assert discord_input._client._compact_events
+        assert spec.intents == discord.Intents(guilds=True)
+        assert not spec.shard_count
+
+    def test_example_trigger_refused(self, loaded_triggers: Callable[..., None]) -> None:
+        """A trigger for the full message events would never fire - so is refused loudly."""
+        # pylint: disable=import-outside-toplevel
+        from examples.discord_bots.trivial_discord_bot import DiscordTextCommandTrigger
+
+        loaded_triggers(DiscordTextCommandTrigger)
+        config = DiscordIO()
+        config.token = "token"
+        config.intents = ["guilds"]
+        config.shard_workers = 2
+
+        with pytest.raises(ValueError, match="DiscordTextCommandTrigger"):
+            config.get_inputs()
+
+
+class TestSupervision:
+    """Restarting workers which die."""
+
+    # pylint: disable=protected-access
+    # The supervision is driven one check at a time - with the clock under the test's control
+
+    def test_restarts_back_off(self) -> None:
+        """Each restart in a row waits twice as long as the last."""
+        pool, context, worker, started = supervised()
+        channel: Any = None
+
+        pool._supervise(context, worker, channel, 0.0)
+        waits = []
+        for now in (10.0, 20.0, 30.0):
+            started[-1].exitcode = 1
+            pool._supervise(context, worker, channel, now)
+            # Not restarted until the delay has passed
+            assert not worker.process
+            waits.append(worker.restart_at - now)
+            pool._supervise(context, worker, channel, worker.restart_at)
+
+        assert waits == [1.0, 2.0, 4.0]
+        assert len(started) == 4
+
+    def test_gives_up(self) -> None:
+        """A worker which keeps dying stops the pool."""
+        pool, context, worker, started = supervised()
+        channel: Any = None
+
+        pool._supervise(context, worker, channel, 0.0)
+        with pytest.raises(RuntimeError):
+            for _ in range(MAX_RESTARTS + 1):
+                started[-1].exitcode = 1
+                pool._supervise(context, worker, channel, worker.restart_at)
+                pool._supervise(context, worker, channel, worker.restart_at)
+
+        assert len(started) == MAX_RESTARTS + 1
+
+    def test_login_failure_not_restarted(self) -> None:
+        """A worker which could not log in would not do better on a restart."""
+        pool, context, worker, started = supervised()
+        channel: Any = None
+
+        pool._supervise(context, worker, channel, 0.0)
+        started[-1].exitcode = EXIT_LOGIN_FAILURE
+
+        with pytest.raises(discord.LoginFailure):
+            pool._supervise(context, worker, channel, 10.0)
+        assert len(started) == 1